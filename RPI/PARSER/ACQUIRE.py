@@ -0,0 +1,151 @@
+# Project Sentinel: asyncio acquisition engine
+# Harris M
+# March 13, 2020
+
+# Standard library imports
+import time
+import asyncio
+
+# Libraries
+import sentinel_reference as s
+import DECODER as decoder
+from ALIGN import EncoderTrack
+from RING import timestamp_string
+
+class AcquisitionEngine:
+    """ Runs the LIDAR and Arduino readers as asyncio tasks feeding one fusion stage """
+
+    def __init__(self, sentinel):
+        """Sets up the engine around an initialised SENTINEL
+
+            Args:
+                sentinel (SENTINEL): Provides the IMU sampler, the Arduino serial link,
+                                     the telegram parser and the Kalman state
+            Return:
+                None
+        """
+        self.sentinel = sentinel
+        self.running = False
+
+    async def run(self, count):
+        """Acquires scans until count of them have been fused
+
+            Args:
+                count (int): How many scans we want
+            Return:
+                List of scan dictionaries
+        """
+        # (timestamp, item) queues, one per source
+        self.lidar = asyncio.Queue()
+        self.arduino = asyncio.Queue()
+        self.running = True
+
+        tasks = [asyncio.ensure_future(self.lidar_task()),
+                 asyncio.ensure_future(self.arduino_task())]
+        try:
+            scans = await self.fuse(count)
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return scans
+
+    async def lidar_task(self):
+        """Collects scan telegrams from the LIDAR session as they arrive
+
+            Args:
+                None
+            Return:
+                None
+        """
+        loop = asyncio.get_event_loop()
+        session = self.sentinel.session
+
+        def received(frame):
+            # Runs on the session's reader thread. The view is only valid during
+            # the callback, so a copy is queued.
+            if decoder.is_scan(frame):
+                loop.call_soon_threadsafe(self.lidar.put_nowait, (time.time(), bytes(frame)))
+
+        # subscribe and unsubscribe wait for the sensor to answer, so they run on
+        # an executor thread to keep the loop going. The session re-subscribes
+        # by itself if the connection drops.
+        subscribed = loop.run_in_executor(None, session.subscribe, b'LMDscandata', received)
+        try:
+            await asyncio.shield(subscribed)
+            # Nothing to do here until the engine cancels the task
+            await loop.create_future()
+        finally:
+            # Even when cancelled part way through subscribing, let it finish so
+            # the unsubscribe cannot overtake it
+            await asyncio.wait([subscribed])
+            await loop.run_in_executor(None, session.unsubscribe, b'LMDscandata', received)
+
+    async def arduino_task(self):
+        """Collects messages from the Arduino serial link as they arrive
+
+            Args:
+                None
+            Return:
+                None
+        """
+        loop = asyncio.get_event_loop()
+        link = self.sentinel.link
+
+        def received(msg):
+            # Runs on the link's reader thread
+            loop.call_soon_threadsafe(self.arduino.put_nowait, (time.time(), msg))
+
+        link.subscribe(received)
+        try:
+            # Nothing to do here until the engine cancels the task
+            await loop.create_future()
+        finally:
+            link.unsubscribe(received)
+
+    async def fuse(self, count):
+        """Combines every scan with the IMU state and motor position at its arrival
+
+            Args:
+                count (int): How many scans we want
+            Return:
+                List of scan dictionaries
+        """
+        sentinel = self.sentinel
+        scans = []
+        last = None         # Time the orientation was last integrated up to
+        track = EncoderTrack()
+
+        while len(scans) < count:
+            stamp, frame = await self.lidar.get()
+
+            # Integrate the gyroscope up to the moment the scan arrived
+            if last is not None:
+                sentinel.x = sentinel.imu.integrate(sentinel.x, last, stamp)
+            last = stamp
+            sentinel.A = sentinel.imu.state_at(stamp)
+
+            while not self.arduino.empty():
+                arrived, msg = self.arduino.get_nowait()
+                parse = msg.split(" ")
+                if len(parse) != 1 and parse[0] == 'D':
+                    try:
+                        track.add(arrived, float(parse[1]))
+                    except ValueError:
+                        print("Bad encoder reading from the Arduino: " + msg)
+            # Reading nearest in time to the scan, not just the latest one
+            encoder = track.at(stamp) if len(track) > 0 else 0
+
+            scan = sentinel.telegram_parse(frame, timestamp_string(stamp), sentinel.A)
+            if scan['Quantity'] == '':
+                continue
+            scan['Motor encoder'] = encoder
+            scan['Rk'] = sentinel.Rk
+            scan['Qk'] = sentinel.Qk
+            scan['P'] = sentinel.P
+            scan['euler'] = sentinel.x
+            scans.append(scan)
+
+        return scans
@@ -0,0 +1,151 @@
+# Project Sentinel: Timestamp alignment of encoder angles and LIDAR scans
+# Harris M
+# March 23, 2020
+
+# Standard library imports
+import threading
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+
+METHODS = ('nearest', 'linear')
+
+def parse_angles(lines):
+    """Converts time:angle lines from the encoder log into arrays in one pass
+
+        Args:
+            lines (list): Strings of the form 'milliseconds:angle'
+        Return:
+            Array of times in seconds and array of angles, both in log order.
+            Lines that are not time:angle pairs are skipped.
+    """
+    pairs = [line.strip().split(':') for line in lines]
+    pairs = [pair for pair in pairs if len(pair) == 2]
+    if len(pairs) == 0:
+        return np.zeros(0), np.zeros(0)
+
+    try:
+        table = np.array(pairs, dtype=np.float64)
+    except ValueError:
+        # Only fall back to checking each line when the log is damaged
+        table = []
+        for pair in pairs:
+            try:
+                table.append([float(pair[0]), float(pair[1])])
+            except ValueError:
+                continue
+        table = np.array(table, dtype=np.float64).reshape(-1, 2)
+
+    return table[:, 0] * s.ENCODER_TIME_SCALE, table[:, 1]
+
+def align(stamps, times, values, method='nearest', period=None):
+    """Looks up the value of a sampled signal at many times at once
+
+        Args:
+            stamps (array): Times to look up
+            times (array): Sample times, in increasing order
+            values (array): Sample values
+            method (string): 'nearest' sample, or 'linear' interpolation between the
+                             two samples either side
+            period (float): Values wrap at this period, e.g. 360 for degrees.
+                            Interpolation then takes the short way round.
+        Return:
+            Array of values, one per stamp. Stamps outside the samples get the
+            first or last sample, and samples sharing a time give the first of them.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown alignment method: " + str(method))
+    stamps = np.asarray(stamps, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(times) == 0:
+        return np.full(stamps.shape, np.nan)
+
+    if len(times) == 1:
+        return np.full(stamps.shape, values[0])
+    right = np.clip(np.searchsorted(times, stamps), 1, len(times) - 1)
+    # Readings that share a time are represented by the first of them, on both sides
+    left = np.searchsorted(times, times[right - 1], side='left')
+
+    if method == 'nearest':
+        # Ties go to the earlier sample
+        later = np.abs(times[right] - stamps) < np.abs(stamps - times[left])
+        return np.where(later, values[right], values[left])
+
+    low = values[left]
+    step = values[right] - low
+    if period is not None:
+        step = (step + period / 2.0) % period - period / 2.0
+    span = times[right] - times[left]
+    weight = np.clip((stamps - times[left]) / np.where(span > 0, span, 1.0), 0.0, 1.0)
+    result = low + weight * step
+    if period is not None:
+        result = result % period
+    return result
+
+class EncoderTrack:
+    """ Ring of timestamped encoder angles that live scans can be aligned against """
+
+    def __init__(self, capacity=s.ENCODER_CAPACITY, period=360.0):
+        """Sets up an empty track
+
+            Args:
+                capacity (int): Number of readings kept before the oldest is overwritten
+                period (float): Angle the encoder wraps at
+            Return:
+                None
+        """
+        self.capacity = capacity
+        self.period = period
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, stamp, angle):
+        """Records one encoder reading. Readings must arrive in time order.
+
+            Args:
+                stamp (float): Time of the reading
+                angle (float): Encoder angle
+            Return:
+                None
+        """
+        with self.lock:
+            row = self.count % self.capacity
+            self.times[row] = stamp
+            self.values[row] = angle
+            self.count += 1
+
+    def history(self):
+        """Copies the readings currently held, oldest first
+
+            Args:
+                None
+            Return:
+                Array of times and array of angles
+        """
+        with self.lock:
+            held = min(self.count, self.capacity)
+            rows = np.arange(self.count - held, self.count) % self.capacity
+            return self.times[rows], self.values[rows]
+
+    def at(self, stamps, method='nearest'):
+        """Encoder angle at one or more times
+
+            Args:
+                stamps (float or array): Times to look up
+                method (string): 'nearest' or 'linear'
+            Return:
+                Angle, or array of angles when given an array
+        """
+        times, values = self.history()
+        result = align(np.atleast_1d(stamps), times, values, method, self.period)
+        if np.isscalar(stamps):
+            return float(result[0])
+        return result
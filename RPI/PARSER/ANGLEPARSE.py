@@ -7,6 +7,8 @@ import re
 import numpy as np
 import sys
 import PARSER as lidar_parser  
+import ALIGN as align
+import CACHE as cache
 
 # EXTERNAL PATHS
 sys.path.append('../SLAM/RANSAC')
@@ -22,9 +24,9 @@ angle_5 = '../../sample_logs/attempt-5.log'
 lidar_6 = '../../sample_logs/attempt-6-lidar.log'
 angle_6 = '../../sample_logs/attempt-6.log'
 
-lidar_p4 = lidar_parser.parser(lidar_4)
-lidar_p5 = lidar_parser.parser(lidar_5)
-lidar_p6 = lidar_parser.parser(lidar_6)
+lidar_p4 = cache.load_scans(lidar_4)
+lidar_p5 = cache.load_scans(lidar_5)
+lidar_p6 = cache.load_scans(lidar_6)
 
 # Function: Angle parser 
 # Description: Goes through the PUTTY log files and returns a dict
@@ -39,28 +41,22 @@ def angle_parser(file):
     return init_parse
 
 # Function: Angle/LIDAR merger
-# Description: Appropriately truncates and then merges angle data and a LIDAR scan
-def merge(angles, lidar):
-    angles = angles[1:]
-    start_angle = angles[0]
-    start_angle = start_angle.split(':')
-    start_a = start_angle[0]
-    lidar_init = lidar[0]
-    start_l = float(lidar_init['Time since start-up'])
+# Description: Appropriately truncates and then merges angle data and a LIDAR scan.
+#              The angle log is parsed once and every scan is matched in one
+#              searchsorted pass, by nearest reading or linear interpolation.
+def merge(angles, lidar, method='nearest'):
+    times, values = align.parse_angles(angles[1:])
+    if len(times) == 0 or len(lidar) == 0:
+        return lidar
+    start_l = float(lidar[0]['Time since start-up'])
 
-    for message in lidar:
-        curr_lidar_time = float(message['Time since start-up']) - start_l
-        curr_min = 99999
-        min_angle = 99999
-        for angle in angles: 
-            curr_angle = angle.split(':')
-            curr_angle_time = (float(curr_angle[0]) - float(start_a)) * (10**(-3))
-            calc = abs(curr_lidar_time - curr_angle_time)
-            if (calc < curr_min):
-                curr_min = calc
-                min_angle = curr_angle[1]
-            
-        message['Motor encoder'] = float(min_angle)
+    order = np.argsort(times, kind='stable')
+    angle_times = times[order] - times[0]
+    lidar_times = np.array([float(message['Time since start-up']) for message in lidar]) - start_l
+
+    encoder = align.align(lidar_times, angle_times, values[order], method)
+    for message, angle in zip(lidar, encoder):
+        message['Motor encoder'] = float(angle)
         
     return lidar
     
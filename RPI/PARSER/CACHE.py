@@ -0,0 +1,152 @@
+# Project Sentinel: Cache of parsed logs
+# Harris M
+# March 26, 2020
+
+# A parsed log is kept as one .npy file per field in
+#   <log directory>/.sentinel_cache/<log name>-<content hash>-v<parser version>/
+# with a manifest naming the file of each field. Numeric fields load as memory
+# maps, so a cached log opens almost instantly. Editing the log changes its hash
+# and bumping s.PARSER_VERSION retires every entry, so stale results are never used.
+
+# Standard library imports
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+import INGEST as ingest
+
+MANIFEST = 'manifest.json'
+
+def file_hash(path):
+    """Hashes the contents of a file a block at a time
+
+        Args:
+            path (string): File to hash
+        Return:
+            Hex digest of the contents
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(s.CACHE_BLOCK_SIZE)
+        while block:
+            digest.update(block)
+            block = f.read(s.CACHE_BLOCK_SIZE)
+    return digest.hexdigest()
+
+def cache_path(path, cache_dir=None):
+    """Where the parsed form of a log is kept
+
+        Args:
+            path (string): Log file
+            cache_dir (string): Cache directory. Next to the log if None.
+        Return:
+            Path of the cache entry
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), s.CACHE_DIR)
+    name = os.path.basename(path) + '-' + file_hash(path)[:16] + '-v' + str(s.PARSER_VERSION)
+    return os.path.join(cache_dir, name)
+
+def save(entry, columns):
+    """Writes parsed columns as a cache entry. The entry only appears once it is
+    complete, so an interrupted save is never mistaken for a good one.
+
+        Args:
+            entry (string): Path of the cache entry
+            columns (dict): Arrays, as INGEST.to_arrays lays them out
+        Return:
+            None
+    """
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+
+    manifest = {}
+    for number, (key, column) in enumerate(columns.items()):
+        name = 'field' + str(number) + '.npy'
+        np.save(os.path.join(staging, name), column, allow_pickle=column.dtype == object)
+        manifest[key] = name
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+    try:
+        os.rename(staging, entry)
+    except OSError:
+        # Another run cached the same log first
+        shutil.rmtree(staging, ignore_errors=True)
+
+def load_entry(entry):
+    """Opens a cache entry
+
+        Args:
+            entry (string): Path of the cache entry
+        Return:
+            Dictionary of arrays. Numeric ones are read-only memory maps.
+    """
+    with open(os.path.join(entry, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    columns = {}
+    for key, name in manifest.items():
+        path = os.path.join(entry, name)
+        try:
+            columns[key] = np.load(path, mmap_mode='r')
+        except ValueError:
+            # Object arrays (text, nested lists) cannot be mapped
+            columns[key] = np.load(path, allow_pickle=True)
+    return columns
+
+def load(path, workers=1, cache_dir=None):
+    """Parses a log, or loads the result of parsing it before
+
+        Args:
+            path (string): PuTTY hex log or str(dict) text log
+            workers (int): Processes to parse with on a cache miss. All cores if None.
+            cache_dir (string): Cache directory. Next to the log if None.
+        Return:
+            Dictionary of arrays, one row per scan, as INGEST.to_arrays lays them out
+    """
+    entry = cache_path(path, cache_dir)
+    if os.path.isfile(os.path.join(entry, MANIFEST)):
+        return load_entry(entry)
+
+    columns = ingest.ingest(path, workers)
+    try:
+        save(entry, columns)
+    except OSError:
+        print("Could not cache the parsed log in " + entry)
+        return columns
+    return load_entry(entry)
+
+def load_scans(path, workers=1, cache_dir=None):
+    """Same as load(), as a list of scan dictionaries like PARSER.parser returns
+
+        Args:
+            path (string): PuTTY hex log or str(dict) text log
+            workers (int): Processes to parse with on a cache miss. All cores if None.
+            cache_dir (string): Cache directory. Next to the log if None.
+        Return:
+            List of scan dictionaries
+    """
+    columns = load(path, workers, cache_dir)
+    keys = [key for key in columns if key != 'Measurement']
+
+    scans = []
+    for row in range(len(columns.get('Measurement', []))):
+        scan = {}
+        for key in keys:
+            value = columns[key][row]
+            scan[key] = value.item() if isinstance(value, np.generic) else value
+        quantity = scan.get('Quantity')
+        ranges = columns['Measurement'][row]
+        if isinstance(quantity, int):
+            ranges = ranges[:quantity]
+        scan['Measurement'] = np.array(ranges)
+        scans.append(scan)
+    return scans
@@ -0,0 +1,156 @@
+# Project Sentinel: Compact coding of range arrays
+# Harris M
+# March 25, 2020
+
+# Ranges are coded as
+#   mode (u8) | flags (u8) | beams (u16) | scans (u32) | residuals
+# Residuals are what is left after taking differences along the beams, and
+# for MODE_SCAN also across consecutive scans. They are zig-zag mapped to
+# unsigned values and written as little-endian base-128 varints, then
+# optionally deflated.
+
+# Standard library imports
+import zlib
+import struct
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+
+HEADER = struct.Struct('<BBHI')
+
+MODE_BEAM = 0       # differences along the beams of each scan
+MODE_SCAN = 1       # differences across scans, then along the beams
+
+FLAG_DEFLATE = 0x01
+
+def zigzag(values):
+    """Maps signed values to unsigned ones, small magnitudes to small numbers
+
+        Args:
+            values (array): int32 values
+        Return:
+            uint32 array: 0, -1, 1, -2, 2 ... become 0, 1, 2, 3, 4 ...
+    """
+    values = values.astype(np.int32)
+    return ((values << 1) ^ (values >> 31)).astype(np.uint32)
+
+def unzigzag(values):
+    """Undoes zigzag()
+
+        Args:
+            values (array): uint32 values
+        Return:
+            int32 array
+    """
+    values = values.astype(np.uint32)
+    return ((values >> 1).astype(np.int32) ^ -(values & 1).astype(np.int32))
+
+def pack_varints(values):
+    """Writes unsigned values as base-128 varints, seven bits per byte
+
+        Args:
+            values (array): uint32 values below 2**21
+        Return:
+            bytes
+    """
+    values = values.astype(np.uint32)
+    lengths = 1 + (values >= 1 << 7).astype(np.int64) + (values >= 1 << 14).astype(np.int64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    out = np.zeros(int(ends[-1]) if len(ends) > 0 else 0, dtype=np.uint8)
+    for place in range(3):
+        present = lengths > place
+        digit = (values[present] >> (7 * place)) & 0x7F
+        more = (lengths[present] > place + 1).astype(np.uint32) << 7
+        out[starts[present] + place] = digit | more
+    return out.tobytes()
+
+def unpack_varints(data, count):
+    """Reads count base-128 varints
+
+        Args:
+            data (bytes): Varints written by pack_varints
+            count (int): Number of values
+        Return:
+            uint32 array
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    last = (raw & 0x80) == 0
+    # Which value each byte belongs to, and its place within that value
+    owner = np.concatenate(([0], np.cumsum(last)[:-1]))
+    firsts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    place = np.arange(len(raw)) - firsts[owner]
+
+    values = np.zeros(count, dtype=np.uint32)
+    digits = (raw & 0x7F).astype(np.uint32)
+    for position in range(3):
+        # Each value has at most one byte in each place, so no index repeats
+        mask = place == position
+        values[owner[mask]] |= digits[mask] << (7 * position)
+    return values
+
+def residuals(ranges, mode):
+    """Differences that are left to code for a block of scans
+
+        Args:
+            ranges (array): (scans, beams) uint16 ranges
+            mode (int): MODE_BEAM or MODE_SCAN
+        Return:
+            (scans, beams) int32 array
+    """
+    values = ranges.astype(np.int32)
+    if mode == MODE_SCAN:
+        values = np.diff(values, axis=0, prepend=0)
+    return np.diff(values, axis=1, prepend=0)
+
+def encode_ranges(ranges, deflate=s.CODEC_DEFLATE):
+    """Codes a block of scans
+
+        Args:
+            ranges (array): (scans, beams) ranges, or one scan of beams
+            deflate (bool): Deflate the varints with zlib as well
+        Return:
+            bytes
+    """
+    ranges = np.asarray(ranges, dtype=np.uint16)
+    if ranges.ndim == 1:
+        ranges = ranges.reshape(1, -1)
+    scans, beams = ranges.shape
+
+    mode = MODE_BEAM
+    coded = residuals(ranges, MODE_BEAM)
+    if scans > 1:
+        # Keep whichever differences are smaller; consecutive scans only look
+        # alike while the mechanism is still
+        across = residuals(ranges, MODE_SCAN)
+        if np.abs(across).sum() < np.abs(coded).sum():
+            mode, coded = MODE_SCAN, across
+
+    payload = pack_varints(zigzag(coded.ravel()))
+    flags = 0
+    if deflate:
+        payload = zlib.compress(payload, s.CODEC_LEVEL)
+        flags |= FLAG_DEFLATE
+    return HEADER.pack(mode, flags, beams, scans) + payload
+
+def decode_ranges(data):
+    """Undoes encode_ranges()
+
+        Args:
+            data (bytes): Coded block
+        Return:
+            (scans, beams) uint16 array
+    """
+    mode, flags, beams, scans = HEADER.unpack_from(data, 0)
+    payload = bytes(data[HEADER.size:])
+    if flags & FLAG_DEFLATE:
+        payload = zlib.decompress(payload)
+
+    values = unzigzag(unpack_varints(payload, scans * beams)).reshape(scans, beams)
+    values = np.cumsum(values, axis=1, dtype=np.int32)
+    if mode == MODE_SCAN:
+        values = np.cumsum(values, axis=0, dtype=np.int32)
+    return values.astype(np.uint16)
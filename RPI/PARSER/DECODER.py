@@ -0,0 +1,280 @@
+# Project Sentinel: Shared LMDscandata telegram decoder
+# Harris M
+# March 10, 2020
+
+# Libraries
+import struct
+import numpy as np
+
+import sentinel_reference as s
+
+# Value of every ASCII hex digit, indexed by its byte value
+HEX_TABLE = np.zeros(256, dtype=np.uint32)
+for value, digit in enumerate(b'0123456789ABCDEF'):
+    HEX_TABLE[digit] = value
+for value, digit in enumerate(b'abcdef'):
+    HEX_TABLE[digit] = value + 10
+
+# Header of an LMDscandata telegram: (key, token index, type, divisor)
+# 'time' fields count microseconds. The device status and the digital input
+# and output statuses are two bytes each; only the second (low) byte is kept.
+HEADER_FIELDS = [('Version Number', 2, 'u16', None),
+                 ('Device Number', 3, 'u16', None),
+                 ('Serial Number', 4, 'u32', None),
+                 ('Device Status', 6, 'u8', None),
+                 ('Telegram Counter', 7, 'u16', None),
+                 ('Scan Counter', 8, 'u16', None),
+                 ('Time since start-up', 9, 'time', None),
+                 ('Time of transmission', 10, 'time', None),
+                 ('Status of digital inputs', 12, 'u8', None),
+                 ('Status of digital outputs', 14, 'u8', None),
+                 ('Layer Angle', 15, 'u16', None),
+                 ('Scan Frequency', 16, 'u32', None),
+                 ('Measurement Frequency', 17, 'u32', None),
+                 ('Amount of Encoder', 18, 'u32', None),
+                 ('16-bit Channels', 19, 'u32', None),
+                 ('Scale Factor', 21, 'scale', None),
+                 ('Scale Factor Offset', 22, 'u32', None),
+                 ('Start Angle', 23, 's32', s.ANGLE_STOP),
+                 ('Angular Increment', 24, 'u16', s.ANGLE_STOP),
+                 ('Quantity', 25, 'u16', None)]
+
+# Token index of the first range value
+MEASUREMENT_INDEX = 26
+
+# Prefixes of telegrams that carry scan data, as opposed to acknowledgements
+SCAN_PREFIXES = (b'sRA LMDscandata ', b'sSN LMDscandata ')
+
+# Binary (CoLa-B) header that follows the scan prefix. Only the low byte of the
+# device status and of the digital input and output statuses is kept, as in the
+# ASCII table.
+BINARY_HEADER = np.dtype({'names': ['Version Number', 'Device Number', 'Serial Number',
+                                    'Device Status', 'Telegram Counter', 'Scan Counter',
+                                    'Time since start-up', 'Time of transmission',
+                                    'Status of digital inputs', 'Status of digital outputs',
+                                    'Layer Angle', 'Scan Frequency', 'Measurement Frequency',
+                                    'Amount of Encoder'],
+                          'formats': ['>u2', '>u2', '>u4', 'u1', '>u2', '>u2', '>u4', '>u4',
+                                      'u1', 'u1', '>u2', '>u4', '>u4', '>u2'],
+                          'offsets': [0, 2, 4, 9, 10, 12, 14, 18, 23, 25, 26, 28, 32, 36],
+                          'itemsize': 38})
+
+# Size of one encoder block (position and speed) in a binary telegram
+BINARY_ENCODER_SIZE = 6
+
+# Binary header of a 16-bit channel, followed by Quantity big-endian uint16 values
+BINARY_CHANNEL = np.dtype([('Content', 'S5'),
+                           ('Scale Factor', '>u4'),
+                           ('Scale Factor Offset', '>u4'),
+                           ('Start Angle', '>i4'),
+                           ('Angular Increment', '>u2'),
+                           ('Quantity', '>u2')])
+
+def type_conv(num, base):
+    """Convert a string to an integer with the proper representation
+
+        Args:
+            num (string): String representation of number we wish to convert
+            base (string): Specifies the base we would like to convert to. Format is 'xy',
+                        where x designates sign (u for unsigned, s for signed) and y is
+                        number of bits the number is.
+        Return:
+            The converted number.
+    """
+    initial = int(num, 16)
+    if base[0] not in ('u', 's'):
+        return initial
+
+    bits = int(base[1:])
+    if base[0] == 's':
+        return (initial + 2**(bits - 1)) % 2**bits - 2**(bits - 1)
+    return initial % 2**bits
+
+def empty_telegram():
+    """Builds the dictionary a decoded telegram is stored in
+
+        Args:
+            None
+        Return:
+            Dictionary with every header field blank and no measurements
+    """
+    telegram = {}
+    for key, index, base, divisor in HEADER_FIELDS:
+        telegram[key] = ''
+    telegram['Measurement'] = []
+    return telegram
+
+def is_scan(frame):
+    """Checks whether a telegram carries scan data
+
+        Args:
+            frame (bytes): Telegram without the STX/ETX bytes
+        Return:
+            True for a scan reply or scan event, False otherwise
+    """
+    return bytes(frame[:len(SCAN_PREFIXES[0])]) in SCAN_PREFIXES
+
+def header_times(frame, binary=False):
+    """Reads the two sensor clock fields without decoding the rest of the telegram
+
+        Args:
+            frame (bytes): Scan telegram without the framing bytes
+            binary (bool): The telegram is a CoLa-B payload
+        Return:
+            (Time since start-up, Time of transmission) in microseconds on the
+            sensor's clock, or None if the header is cut short
+    """
+    if binary:
+        offset = len(SCAN_PREFIXES[0]) + BINARY_HEADER.fields['Time since start-up'][1]
+        if len(frame) < offset + 8:
+            return None
+        return struct.unpack_from('>II', frame, offset)
+
+    # Only split as far as the two fields
+    tokens = bytes(frame[:s.SESSION_PEEK * 2]).split(b' ', 11)
+    if len(tokens) < 12:
+        return None
+    return int(tokens[9], 16), int(tokens[10], 16)
+
+def hex_array(section, quantity):
+    """Converts the first quantity space separated hex numbers in one pass
+
+        Args:
+            section (bytes): Space separated ASCII hex numbers
+            quantity (int): How many numbers to convert
+        Return:
+            A uint32 numpy array of the numbers, and the offset in section
+            just past the last number that was converted. A truncated
+            section gives back fewer than quantity numbers.
+    """
+    if quantity == 0 or len(section) == 0:
+        return np.zeros(0, dtype=np.uint32), 0
+
+    raw = np.frombuffer(section, dtype=np.uint8)
+    # Numbers are found from where their digits start and stop, so repeated
+    # spaces (empty tokens) are skipped rather than counted as numbers
+    space = raw == ord(' ')
+    digit = ~space
+    starts = np.flatnonzero(digit & np.append(True, space[:-1]))[:quantity]
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.uint32), 0
+    # One past the last digit of each number. A truncated telegram gives back
+    # fewer values than asked for.
+    ends = np.flatnonzero(digit & np.append(space[1:], True))[:quantity] + 1
+
+    first = starts[0]
+    raw = raw[first:ends[-1]]
+    starts = starts - first
+
+    # Every digit is shifted by its distance from the end of its own number.
+    # Separators are worth zero, so they drop out of the sum.
+    lengths = np.append(starts[1:], len(raw)) - starts
+    token_end = np.repeat(ends - first, lengths)
+    shift = np.maximum(token_end - np.arange(len(raw)) - 1, 0) * 4
+    digits = HEX_TABLE[raw] << shift.astype(np.uint32)
+
+    return np.add.reduceat(digits, starts, dtype=np.uint32), int(ends[-1]) + 1
+
+def decode_header(tokens, telegram):
+    """Fills in the header fields of a telegram from the field table
+
+        Args:
+            tokens (list): The first MEASUREMENT_INDEX tokens of the telegram as strings
+            telegram (dict): Dictionary to fill in
+        Return:
+            None
+    """
+    for key, index, base, divisor in HEADER_FIELDS:
+        if base == 'scale':
+            telegram[key] = s.SCALE_FACTOR[tokens[index]]
+        elif base == 'time':
+            telegram[key] = type_conv(tokens[index], 'u32') * s.MICROSECOND
+        elif divisor is None:
+            telegram[key] = type_conv(tokens[index], base)
+        else:
+            telegram[key] = type_conv(tokens[index], base) / divisor
+
+def decode_telegram(frame, remission=False):
+    """Converts a raw LMDscandata telegram into a neat dictionary
+
+        Args:
+            frame (bytes): Telegram without the STX/ETX bytes
+            remission (bool): Also decode the RSSI1 channel into 'Remission'
+        Return:
+            Dictionary of parsed values. Measurement (and Remission) are
+            uint16 numpy arrays.
+    """
+    telegram = empty_telegram()
+    tokens = bytes(frame).split(b' ', MEASUREMENT_INDEX)
+
+    if len(tokens) <= MEASUREMENT_INDEX or tokens[1] != b'LMDscandata':
+        print("There is something wrong with the scan data")
+        return telegram
+
+    decode_header([token.decode('ascii') for token in tokens[:MEASUREMENT_INDEX]], telegram)
+
+    section = tokens[MEASUREMENT_INDEX]
+    measurement, offset = hex_array(section, telegram['Quantity'])
+    telegram['Measurement'] = measurement.astype(np.uint16)
+
+    if remission:
+        # Number of 8-bit channels, then the RSSI1 block laid out like DIST1
+        rssi = section[offset:].split(b' ', 7)
+        if len(rssi) < 8 or rssi[1] != b'RSSI1':
+            print("RSSI1 value not in the correct location.")
+            telegram['Remission'] = []
+        else:
+            quantity = type_conv(rssi[6], 'u16')
+            values, offset = hex_array(rssi[7], quantity)
+            telegram['Remission'] = values.astype(np.uint16)
+
+    return telegram
+
+def decode_binary(frame):
+    """Converts a binary (CoLa-B) LMDscandata payload into a neat dictionary
+
+        Args:
+            frame (bytes): Frame payload, without the length and checksum
+        Return:
+            Dictionary of parsed values, laid out exactly like decode_telegram.
+            Measurement is a uint16 numpy array.
+    """
+    telegram = empty_telegram()
+    offset = len(SCAN_PREFIXES[0])
+    minimum = offset + BINARY_HEADER.itemsize + 2 + BINARY_CHANNEL.itemsize
+
+    if len(frame) < minimum or bytes(frame[:offset]) not in SCAN_PREFIXES:
+        print("There is something wrong with the scan data")
+        return telegram
+
+    header = np.frombuffer(frame, dtype=BINARY_HEADER, count=1, offset=offset)[0]
+    offset += BINARY_HEADER.itemsize + BINARY_ENCODER_SIZE * int(header['Amount of Encoder'])
+    channels = struct.unpack_from('>H', frame, offset)[0]
+    offset += 2
+    channel = np.frombuffer(frame, dtype=BINARY_CHANNEL, count=1, offset=offset)[0]
+    offset += BINARY_CHANNEL.itemsize
+
+    if channel['Content'] != b'DIST1':
+        print("DIST1 value not in the correct location.")
+        return telegram
+
+    raw = {'16-bit Channels': channels}
+    for name in BINARY_HEADER.names:
+        raw[name] = int(header[name])
+    for name in BINARY_CHANNEL.names[1:]:
+        raw[name] = int(channel[name])
+
+    for key, index, base, divisor in HEADER_FIELDS:
+        if base == 'scale':
+            telegram[key] = s.SCALE_FACTOR['%08X' % raw[key]]
+        elif base == 'time':
+            telegram[key] = raw[key] * s.MICROSECOND
+        elif divisor is None:
+            telegram[key] = raw[key]
+        else:
+            telegram[key] = raw[key] / divisor
+
+    quantity = min(telegram['Quantity'], (len(frame) - offset) // 2)
+    telegram['Measurement'] = np.frombuffer(frame, dtype='>u2', count=quantity, offset=offset).astype(np.uint16)
+
+    return telegram
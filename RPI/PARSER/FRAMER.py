@@ -0,0 +1,167 @@
+# Project Sentinel: Buffered telegram framer for the TiM781
+# Harris M
+# March 9, 2020
+
+# Libraries
+import struct
+import numpy as np
+
+import sentinel_reference as s
+
+class TelegramFramer:
+    """ Reassembles STX/ETX framed CoLa-A telegrams from a TCP socket """
+
+    def __init__(self, sock, size=s.FRAMER_BUFFER_SIZE):
+        """Sets up the receive buffer for a connected socket
+
+            Args:
+                sock (socket): Connected socket to the sensor
+                size (int): Initial size of the receive buffer in bytes
+            Return:
+                None
+        """
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0      # First byte that has not been framed yet
+        self.end = 0        # One past the last byte received
+
+    def room(self):
+        """Makes space at the end of the buffer for the next receive
+
+            Args:
+                None
+            Return:
+                A memoryview of the free part of the buffer
+        """
+        if self.end == len(self.buf):
+            pending = self.end - self.start
+            if pending == len(self.buf):
+                # A single telegram is bigger than the buffer. Views handed out
+                # earlier still point at the old buffer, so copy instead of resizing.
+                grown = bytearray(2 * len(self.buf))
+                grown[:pending] = self.buf
+                self.buf = grown
+                self.view = memoryview(self.buf)
+            else:
+                self.view[:pending] = self.view[self.start:self.end]
+            self.start = 0
+            self.end = pending
+
+        return self.view[self.end:]
+
+    def received(self, count):
+        """Records bytes that were received into the view returned by room()
+
+            Args:
+                count (int): Number of bytes received
+            Return:
+                Number of bytes received
+        """
+        if count == 0:
+            raise ConnectionError("Sensor closed the connection")
+        self.end += count
+        return count
+
+    def fill(self):
+        """Receives as many bytes as the socket has ready into the buffer
+
+            Args:
+                None
+            Return:
+                Number of bytes received
+        """
+        return self.received(self.sock.recv_into(self.room()))
+
+    def next_frame(self):
+        """Pulls the next complete telegram out of the buffer, if there is one
+
+            Args:
+                None
+            Return:
+                A memoryview of the telegram without the STX/ETX bytes, or None
+                if no complete telegram has been received yet. The view is only
+                valid until the next call to fill().
+        """
+        stx = self.buf.find(s.STX, self.start, self.end)
+        if stx == -1:
+            # Anything outside an STX/ETX frame is thrown away
+            self.start = self.end
+            return None
+
+        etx = self.buf.find(s.ETX, stx + 1, self.end)
+        if etx == -1:
+            self.start = stx
+            return None
+
+        self.start = etx + 1
+        return self.view[stx + 1:etx]
+
+    def read(self):
+        """Blocks until a whole telegram has been received
+
+            Args:
+                None
+            Return:
+                A memoryview of the telegram without the STX/ETX bytes
+        """
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return frame
+            self.fill()
+
+    def __iter__(self):
+        """Yields telegrams for as long as the socket stays open
+
+            Args:
+                None
+            Return:
+                Memoryviews of consecutive telegrams
+        """
+        while True:
+            yield self.read()
+
+class BinaryFramer(TelegramFramer):
+    """ Reassembles length-prefixed CoLa-B frames from a TCP socket """
+
+    def next_frame(self):
+        """Pulls the next complete frame out of the buffer, if there is one
+
+            Args:
+                None
+            Return:
+                A memoryview of the frame payload, or None if no complete frame
+                has been received yet. Frames with a bad checksum are dropped.
+                The view is only valid until the next call to fill().
+        """
+        while True:
+            stx = self.buf.find(s.BINARY_STX, self.start, self.end)
+            if stx == -1:
+                # Keep a partial STX run that may be completed by the next receive
+                self.start = max(self.start, self.end - len(s.BINARY_STX) + 1)
+                return None
+
+            if self.end - stx < 8:
+                self.start = stx
+                return None
+
+            length = struct.unpack_from('>I', self.buf, stx + 4)[0]
+            if length > s.BINARY_MAX_LENGTH:
+                self.start = stx + 1
+                continue
+
+            stop = stx + 8 + length
+            if stop >= self.end:
+                self.start = stx
+                return None
+
+            payload = self.view[stx + 8:stop]
+            checksum = np.bitwise_xor.reduce(np.frombuffer(payload, dtype=np.uint8))
+            if checksum != self.buf[stop]:
+                print("Checksum mismatch in binary telegram, dropping it")
+                self.start = stx + 1
+                continue
+
+            self.start = stop + 1
+            return payload
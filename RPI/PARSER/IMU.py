@@ -0,0 +1,281 @@
+# Project Sentinel: Background MPU-6050 sampler
+# Harris M
+# March 15, 2020
+
+# Standard library imports
+import sys
+import time
+import threading
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+
+sys.path.append("../SLAM")
+
+import KALMAN as kalman
+
+# Scale of each column of a sample: Ax, Ay, Az in g, Gx, Gy, Gz in degrees/s
+SAMPLE_SCALE = np.array([s.ACCEL_CONSTANT] * 3 + [s.GYRO_CONSTANT] * 3)
+
+class IMUSampler:
+    """ Samples the MPU-6050 at a fixed rate on its own thread into a ring of timestamped samples """
+
+    def __init__(self, bus, rate=s.IMU_RATE, capacity=s.IMU_CAPACITY, fifo=False):
+        """Sets up the sample ring. Sampling starts with start().
+
+            Args:
+                bus (SMBus): I2C bus the MPU-6050 is on, already initialised by accel_init
+                rate (int): Samples per second
+                capacity (int): Number of samples kept before the oldest is overwritten
+                fifo (bool): Drain the on-chip FIFO instead of reading the data registers
+            Return:
+                None
+        """
+        self.bus = bus
+        self.rate = rate
+        self.capacity = capacity
+        self.fifo = fifo
+
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.samples = np.zeros((capacity, 6), dtype=np.float64)
+        self.count = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def read(self):
+        """Reads one sample from the data registers in a single block transfer
+
+            Args:
+                None
+            Return:
+                Acceleration and Gyroscope data in all 3 axes, as accel_read returns them
+        """
+        block = self.bus.read_i2c_block_data(s.ACCEL_ADDRESS, s.ACCEL_XOUT_H, s.IMU_BLOCK_SIZE)
+        raw = np.frombuffer(bytes(block), dtype='>i2')
+        # Skip the temperature between the accelerometer and the gyroscope
+        return tuple((raw[[0, 1, 2, 4, 5, 6]] / SAMPLE_SCALE).tolist())
+
+    def fifo_init(self):
+        """Points the sample rate divider at self.rate and starts the FIFO collecting
+        accelerometer and gyroscope data
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.bus.write_byte_data(s.ACCEL_ADDRESS, s.SMPLRT_DIV, int(s.GYRO_OUTPUT_RATE / self.rate) - 1)
+        self.bus.write_byte_data(s.ACCEL_ADDRESS, s.FIFO_EN, s.FIFO_ACCEL_GYRO)
+        self.bus.write_byte_data(s.ACCEL_ADDRESS, s.USER_CTRL, s.USER_CTRL_FIFO_RESET)
+        self.bus.write_byte_data(s.ACCEL_ADDRESS, s.USER_CTRL, s.USER_CTRL_FIFO_EN)
+
+    def fifo_drain(self):
+        """Reads every complete sample waiting in the FIFO
+
+            Args:
+                None
+            Return:
+                (n, 6) array of scaled samples, oldest first
+        """
+        status = self.bus.read_byte_data(s.ACCEL_ADDRESS, s.INT_STATUS)
+        if status & s.INT_STATUS_FIFO_OFLOW:
+            print("IMU FIFO overflowed, samples were lost")
+            self.bus.write_byte_data(s.ACCEL_ADDRESS, s.USER_CTRL, s.USER_CTRL_FIFO_RESET | s.USER_CTRL_FIFO_EN)
+            return np.zeros((0, 6))
+
+        high, low = self.bus.read_i2c_block_data(s.ACCEL_ADDRESS, s.FIFO_COUNT_H, 2)
+        waiting = ((high << 8) | low) // s.FIFO_SAMPLE_SIZE * s.FIFO_SAMPLE_SIZE
+
+        data = bytearray()
+        while len(data) < waiting:
+            # SMBus block reads are limited in size, so read whole samples at a time
+            chunk = min(waiting - len(data), s.I2C_BLOCK_MAX // s.FIFO_SAMPLE_SIZE * s.FIFO_SAMPLE_SIZE)
+            data += bytes(self.bus.read_i2c_block_data(s.ACCEL_ADDRESS, s.FIFO_R_W, chunk))
+
+        raw = np.frombuffer(bytes(data), dtype='>i2').reshape(-1, 6)
+        return raw / SAMPLE_SCALE
+
+    def store(self, times, samples):
+        """Appends samples to the ring
+
+            Args:
+                times (array): Time of each sample, in seconds since the epoch
+                samples (array): (n, 6) array of scaled samples
+            Return:
+                None
+        """
+        with self.lock:
+            for stamp, sample in zip(times, samples):
+                row = self.count % self.capacity
+                self.times[row] = stamp
+                self.samples[row] = sample
+                self.count += 1
+
+    def start(self):
+        """Starts the sampling thread
+
+            Args:
+                None
+            Return:
+                None
+        """
+        if self.running:
+            return
+        if self.fifo:
+            self.fifo_init()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample_loop, name='imu_sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the sampling thread
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def sample_loop(self):
+        """Sampling thread: reads at a fixed rate for as long as the sampler runs
+
+            Args:
+                None
+            Return:
+                None
+        """
+        period = 1.0 / self.rate
+        if self.fifo:
+            # The FIFO buffers samples, so it only has to be emptied now and then
+            period = s.IMU_FIFO_PERIOD
+        deadline = time.time()
+
+        while self.running:
+            if self.fifo:
+                samples = self.fifo_drain()
+                now = time.time()
+                # The newest sample was taken just now, the rest one sample period apart
+                times = now - np.arange(len(samples) - 1, -1, -1) / self.rate
+                self.store(times, samples)
+            else:
+                sample = self.read()
+                self.store([time.time()], [sample])
+
+            deadline += period
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind, so do not try to catch up with a burst of reads
+                deadline = time.time()
+
+    def history(self):
+        """Copies the samples currently held, oldest first
+
+            Args:
+                None
+            Return:
+                Array of times and (n, 6) array of samples
+        """
+        with self.lock:
+            held = min(self.count, self.capacity)
+            rows = np.arange(self.count - held, self.count) % self.capacity
+            return self.times[rows], self.samples[rows]
+
+    def latest(self):
+        """Gives the newest sample without touching the bus while the sampling
+        thread owns it
+
+            Args:
+                None
+            Return:
+                Acceleration and Gyroscope data in all 3 axes, like accel_read. Read
+                straight from the bus only when the sampler is not running.
+        """
+        while self.thread is not None and self.thread.is_alive():
+            with self.lock:
+                if self.count > 0:
+                    return tuple(self.samples[(self.count - 1) % self.capacity].tolist())
+            # Just started, wait for the first sample
+            time.sleep(1.0 / self.rate)
+        return self.read()
+
+    def state_at(self, stamp):
+        """Interpolates the IMU state at any time covered by the ring
+
+            Args:
+                stamp (float): Time in seconds since the epoch
+            Return:
+                Acceleration and Gyroscope data in all 3 axes, like accel_read. Times
+                outside the ring get the nearest sample.
+        """
+        times, samples = self.history()
+        if len(times) == 0:
+            return self.latest()
+
+        index = np.searchsorted(times, stamp)
+        if index == 0:
+            return tuple(samples[0].tolist())
+        if index == len(times):
+            return tuple(samples[-1].tolist())
+
+        weight = (stamp - times[index - 1]) / (times[index] - times[index - 1])
+        return tuple((samples[index - 1] + weight * (samples[index] - samples[index - 1])).tolist())
+
+    def recent(self, seconds):
+        """Copies the samples taken in the last few seconds
+
+            Args:
+                seconds (float): How far back to look
+            Return:
+                Array of times and (n, 6) array of samples, oldest first
+        """
+        times, samples = self.history()
+        first = np.searchsorted(times, time.time() - seconds)
+        return times[first:], samples[first:]
+
+    def rates(self, start, stop):
+        """Splits the time between start and stop into one step per sample
+
+            Args:
+                start (float): Start time, in seconds since the epoch
+                stop (float): End time
+            Return:
+                List of (dt, sample) pairs covering start to stop. Each step uses
+                the sample taken at its end, and the newest sample is carried up
+                to stop.
+        """
+        times, samples = self.history()
+        first = np.searchsorted(times, start, side='right')
+        last = np.searchsorted(times, stop, side='right')
+
+        steps = []
+        previous = start
+        for index in range(first, last):
+            steps.append((times[index] - previous, samples[index]))
+            previous = times[index]
+        if last > 0 and stop > previous:
+            steps.append((stop - previous, samples[last - 1]))
+        return steps
+
+    def integrate(self, x, start, stop):
+        """Integrates the gyroscope over every sample between two times
+
+            Args:
+                x (array): 3x1 orientation at time start
+                start (float): Time x was last updated, in seconds since the epoch
+                stop (float): Time to integrate up to
+            Return:
+                3x1 orientation at time stop
+        """
+        for dt, A in self.rates(start, stop):
+            # Same axis convention as contbutnot
+            x = kalman.GyroIntegrate(x, [[-np.deg2rad(A[3])], [np.deg2rad(A[4])], [-np.deg2rad(A[5])]], dt)
+        return x
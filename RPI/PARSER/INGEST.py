@@ -0,0 +1,195 @@
+# Project Sentinel: Parallel log ingester
+# Harris M
+# March 22, 2020
+
+# Usage:
+#   python INGEST.py <log file> [workers]
+
+# Standard library imports
+import os
+import re
+import sys
+import ast
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+import PARSER as lidar_parser
+
+# The range list of a scan saved with str(dict), which is most of the line
+MEASUREMENT_PATTERN = re.compile(rb"'Measurement': \[([^\]]*)\]")
+
+def log_kind(mm):
+    """Works out which kind of log a file is from its first line
+
+        Args:
+            mm (mmap): The log file
+        Return:
+            'dict' for scans saved with str(dict), 'putty' for PuTTY hex logs
+    """
+    newline = mm.find(b'\n')
+    first = mm[:newline] if newline != -1 else mm[:]
+    if first.lstrip().startswith(b'{'):
+        return 'dict'
+    return 'putty'
+
+def chunk_bounds(mm, count):
+    """Splits a file into byte ranges that start and end on line boundaries.
+    Both log kinds hold one telegram per line, so no telegram is ever split.
+
+        Args:
+            mm (mmap): The log file
+            count (int): Number of ranges wanted
+        Return:
+            List of (start, stop) byte offsets covering the whole file
+    """
+    size = len(mm)
+    bounds = []
+    start = 0
+    for index in range(1, count + 1):
+        stop = size * index // count
+        if stop < size:
+            newline = mm.find(b'\n', stop)
+            stop = size if newline == -1 else newline + 1
+        if stop > start:
+            bounds.append((start, stop))
+            start = stop
+        if start >= size:
+            break
+    return bounds
+
+def parse_dict_line(line):
+    """Rebuilds a scan saved with str(dict)
+
+        Args:
+            line (bytes): One line of the log
+        Return:
+            The scan dictionary, with Measurement as a numpy array
+    """
+    match = MEASUREMENT_PATTERN.search(line)
+    if match is None or not match.group(1).strip():
+        return ast.literal_eval(line.decode('latin-1'))
+
+    # literal_eval is slow on long lists, so the ranges are converted separately
+    try:
+        ranges = np.array(match.group(1).split(b','), dtype=np.int64)
+    except ValueError:
+        return ast.literal_eval(line.decode('latin-1'))
+    scan = ast.literal_eval((line[:match.start(1)] + line[match.end(1):]).decode('latin-1'))
+    scan['Measurement'] = ranges
+    return scan
+
+def parse_chunk(path, start, stop, kind):
+    """Parses one byte range of a log. Runs in a worker process.
+
+        Args:
+            path (string): Log file
+            start (int): First byte of the range
+            stop (int): One past the last byte of the range
+            kind (string): 'dict' or 'putty'
+        Return:
+            List of scan dictionaries in file order
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            lines = mm[start:stop].splitlines()
+        finally:
+            mm.close()
+
+    if kind == 'putty':
+        return list(lidar_parser.parse_stream(lines, verbose=False))
+
+    scans = []
+    for line in lines:
+        if line.strip():
+            scans.append(parse_dict_line(line))
+    return scans
+
+def to_arrays(scans):
+    """Turns a list of scans into one array per field
+
+        Args:
+            scans (list): Scan dictionaries
+        Return:
+            Dictionary of arrays, one row per scan. Measurement is a 2D array padded
+            with zeros past each scan's Quantity.
+    """
+    keys = []
+    for scan in scans:
+        for key in scan:
+            if key not in keys:
+                keys.append(key)
+
+    arrays = {}
+    for key in keys:
+        values = [scan.get(key) for scan in scans]
+        if key == 'Measurement':
+            width = max([len(value) for value in values if value is not None] + [0])
+            ranges = np.zeros((len(values), width), dtype=np.int64)
+            for row, value in enumerate(values):
+                if value is not None:
+                    ranges[row, :len(value)] = value
+            arrays[key] = ranges
+        elif all(np.isscalar(value) for value in values):
+            arrays[key] = np.array(values)
+        else:
+            column = np.empty(len(values), dtype=object)
+            column[:] = values
+            arrays[key] = column
+    return arrays
+
+def ingest(path, workers=None, arrays=True):
+    """Parses a log on every core
+
+        Args:
+            path (string): Log file, PuTTY hex or str(dict) lines
+            workers (int): Worker processes. One per core if None.
+            arrays (bool): Return one array per field instead of a list of scans
+        Return:
+            The scans in file order, as to_arrays() lays them out or as a list of
+            dictionaries
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return to_arrays([]) if arrays else []
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            kind = log_kind(mm)
+            bounds = chunk_bounds(mm, workers * s.INGEST_CHUNKS_PER_WORKER)
+        finally:
+            mm.close()
+
+    scans = []
+    if workers == 1:
+        # Not worth starting a process for, and safe to call from scripts
+        # that have no __main__ guard
+        for start, stop in bounds:
+            scans.extend(parse_chunk(path, start, stop, kind))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(parse_chunk, path, start, stop, kind) for start, stop in bounds]
+            # Chunks were submitted in file order, so collecting them in order keeps it
+            for future in futures:
+                scans.extend(future.result())
+
+    if arrays:
+        return to_arrays(scans)
+    return scans
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python INGEST.py <log file> [workers]")
+        sys.exit(1)
+
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    start = time.time()
+    result = ingest(sys.argv[1], workers)
+    print("Parsed " + str(len(result.get('Measurement', []))) + " scans in " + str(round(time.time() - start, 2)) + " s")
@@ -0,0 +1,136 @@
+# Project Sentinel: Bounded queue between the sensor reader and live processing
+# Harris M
+# March 20, 2020
+
+# Standard library imports
+import time
+import threading
+import collections
+
+import sentinel_reference as s
+
+POLICIES = ('drop', 'decimate', 'slow')
+
+class LiveQueue:
+    """ Bounded queue of timestamped scans with an explicit policy for when the
+    processor falls behind the sensor
+
+    drop     - a full queue throws away its oldest scan to make room
+    decimate - only every Nth scan is queued, and a full queue drops its oldest
+    slow     - on_slow is called once the queue reaches the high water mark and
+               on_resume once it drains to the low water mark. Scans that come
+               in between are dropped, since a paused mechanism only repeats
+               what the queued scans already cover.
+    """
+
+    def __init__(self, capacity=s.LIVE_QUEUE_SIZE, policy=s.LIVE_POLICY, decimate=s.LIVE_DECIMATE,
+                 on_slow=None, on_resume=None, high=s.LIVE_HIGH_WATER, low=s.LIVE_LOW_WATER):
+        """Sets up an empty queue
+
+            Args:
+                capacity (int): Most scans held at once
+                policy (string): One of POLICIES
+                decimate (int): Keep every Nth scan with the 'decimate' policy
+                on_slow (function): Called with no arguments when the queue gets too long,
+                                    on the thread that calls put()
+                on_resume (function): Called with no arguments when it has caught up again,
+                                      on the thread that calls get()
+                high (int): Queue length that calls on_slow
+                low (int): Queue length that calls on_resume
+            Return:
+                None
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown live policy: " + str(policy))
+        self.capacity = capacity
+        self.policy = policy
+        self.decimate = max(int(decimate), 1)
+        self.on_slow = on_slow
+        self.on_resume = on_resume
+        self.high = min(high, capacity)
+        self.low = low
+
+        self.items = collections.deque()
+        self.ready = threading.Condition()
+        self.slowed = False
+
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.decimated = 0
+
+    def __len__(self):
+        with self.ready:
+            return len(self.items)
+
+    def put(self, item, stamp=None):
+        """Queues a scan. Never blocks, so it is safe on the sensor reader thread.
+
+            Args:
+                item: Scan to queue, copied out of any buffer that will be reused
+                stamp (float): Arrival time, defaults to now
+            Return:
+                True if the scan was queued, False if it was skipped
+        """
+        if stamp is None:
+            stamp = time.time()
+
+        slow = False
+        with self.ready:
+            self.received += 1
+            if self.policy == 'decimate' and (self.received - 1) % self.decimate != 0:
+                self.decimated += 1
+                return False
+            if self.slowed:
+                self.dropped += 1
+                return False
+
+            if len(self.items) >= self.capacity:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append((stamp, item))
+            self.ready.notify()
+
+            if self.policy == 'slow' and not self.slowed and len(self.items) >= self.high:
+                self.slowed = slow = True
+
+        # Keep callbacks outside the lock so they cannot hold up get()
+        if slow and self.on_slow is not None:
+            self.on_slow()
+        return True
+
+    def get(self, timeout=None):
+        """Takes the oldest waiting scan
+
+            Args:
+                timeout (float): Seconds to wait for one, forever when None
+            Return:
+                (arrival time, scan), or None if nothing arrived in time
+        """
+        resume = False
+        with self.ready:
+            if not self.ready.wait_for(lambda: len(self.items) > 0, timeout):
+                return None
+            item = self.items.popleft()
+            self.delivered += 1
+
+            if self.slowed and len(self.items) <= self.low:
+                self.slowed = False
+                resume = True
+
+        if resume and self.on_resume is not None:
+            self.on_resume()
+        return item
+
+    def summary(self):
+        """Describes what happened to every scan that came in
+
+            Args:
+                None
+            Return:
+                String with the received, delivered, dropped and decimated counts
+        """
+        with self.ready:
+            return ("Live queue (" + self.policy + "): " + str(self.received) + " received, "
+                    + str(self.delivered) + " processed, " + str(self.dropped) + " dropped, "
+                    + str(self.decimated) + " decimated, " + str(len(self.items)) + " waiting")
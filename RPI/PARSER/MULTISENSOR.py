@@ -0,0 +1,315 @@
+# Project Sentinel: Several TiM781s read by one selectors loop
+# Harris M
+# March 21, 2020
+
+# Standard library imports
+import time
+import heapq
+import errno
+import socket
+import selectors
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+import DECODER as decoder
+from FRAMER import TelegramFramer, BinaryFramer
+
+class SensorStream:
+    """ One sensor's continuous scan stream, tagged with its ID and mounting """
+
+    def __init__(self, sensor_id, ip=s.IP_ADDRESS, port=None, binary=False, transform=None):
+        """Describes the sensor. Nothing is connected until connect().
+
+            Args:
+                sensor_id (string): Name every scan from this sensor is tagged with
+                ip (string): IP address of the sensor
+                port (int): Port of the sensor. The standard port for the protocol if None.
+                binary (bool): Stream binary (CoLa-B) instead of ASCII (CoLa-A) telegrams
+                transform (array): 4x4 transform from the sensor's frame to the rig's.
+                                   The identity if None.
+            Return:
+                None
+        """
+        self.sensor_id = sensor_id
+        self.ip = ip
+        self.binary = binary
+        if port is None:
+            port = s.BINARY_PORT if binary else s.PORT
+        self.port = port
+        if transform is None:
+            transform = np.eye(4)
+        self.transform = np.asarray(transform, dtype=np.float64)
+
+        self.sock = None
+        self.framer = None      # Set once the connection is up and streaming
+        self.deadline = 0.0     # Time to give up on a connection still being made
+        self.retry = 0.0        # Earliest time to try connecting again
+        self.offset = None      # Host time minus sensor time, in seconds
+        self.wraps = 0          # Times the sensor's microsecond clock has rolled over
+        self.last_clock = 0
+        self.latest = 0.0       # Time of the newest scan read from this sensor
+
+    def connect(self):
+        """Starts connecting without waiting for the sensor to answer. The stream
+        starts in connected() once the socket becomes writable.
+
+            Args:
+                None
+            Return:
+                The non-blocking socket
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        error = sock.connect_ex((self.ip, self.port))
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            raise OSError(error, "Could not connect to " + self.ip)
+        self.sock = sock
+        self.deadline = time.time() + s.SESSION_TIMEOUT
+        return sock
+
+    def connected(self):
+        """Finishes a connection started by connect() and starts the scan stream
+
+            Args:
+                None
+            Return:
+                None. Raises OSError if the connection failed.
+        """
+        error = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error != 0:
+            raise OSError(error, "Could not connect to " + self.ip)
+        # Far smaller than the send buffer of a fresh socket, so this cannot block
+        self.sock.sendall(s.REQUEST_CONT_SCAN_BINARY if self.binary else s.REQUEST_CONT_SCAN)
+        self.framer = (BinaryFramer if self.binary else TelegramFramer)(self.sock)
+
+    def close(self):
+        """Stops the scan stream and closes the connection
+
+            Args:
+                None
+            Return:
+                None
+        """
+        if self.sock is None:
+            return
+        try:
+            self.sock.send(s.STOP_CONT_SCAN_BINARY if self.binary else s.STOP_CONT_SCAN)
+        except OSError:
+            pass
+        self.sock.close()
+        self.sock = None
+        self.framer = None
+
+    def clock(self, frame, arrival):
+        """Puts a scan on the host's clock using the sensor's own timestamps
+
+        The smallest gap seen between a telegram's transmission time and its
+        arrival is the sensor's clock offset plus the quickest network delay, so
+        scans are stamped with when the sensor started them rather than when the
+        select loop got round to them.
+
+            Args:
+                frame (bytes): Scan telegram without the framing bytes
+                arrival (float): Host time the telegram was read
+            Return:
+                Host time the scan started
+        """
+        times = decoder.header_times(frame, self.binary)
+        if times is None:
+            return arrival
+        started, sent = times
+
+        if sent < self.last_clock:
+            if self.last_clock >= s.SENSOR_CLOCK_WRAP - s.SENSOR_CLOCK_SLACK:
+                self.wraps += 1
+            else:
+                # Not a rollover, the sensor restarted its clock, so start over
+                self.wraps = 0
+                self.offset = None
+        self.last_clock = sent
+        sent = (self.wraps * s.SENSOR_CLOCK_WRAP + sent) * s.MICROSECOND
+        # The scan started shortly before it was sent, even if the clock rolled over in between
+        started = sent - ((times[1] - times[0]) % s.SENSOR_CLOCK_WRAP) * s.MICROSECOND
+
+        offset = arrival - sent
+        if self.offset is None or offset < self.offset:
+            self.offset = offset
+        return self.offset + started
+
+    def read(self):
+        """Receives whatever the socket has ready and frames the scans in it
+
+            Args:
+                None
+            Return:
+                List of (timestamp, telegram bytes) for every complete scan
+        """
+        self.framer.fill()
+        arrival = time.time()
+
+        scans = []
+        frame = self.framer.next_frame()
+        while frame is not None:
+            if decoder.is_scan(frame):
+                # The view is only valid until the next fill, so copy it
+                frame = bytes(frame)
+                scans.append((self.clock(frame, arrival), frame))
+            frame = self.framer.next_frame()
+        return scans
+
+class MultiSensorReader:
+    """ Streams scans from any number of sensors on one thread and merges them into time order """
+
+    def __init__(self, streams):
+        """Sets up the selector for a list of sensors
+
+            Args:
+                streams (list): SensorStream for each sensor
+            Return:
+                None
+        """
+        self.streams = streams
+        self.selector = selectors.DefaultSelector()
+        self.pending = []       # Heap of (timestamp, arrival order, scan)
+        self.order = 0
+        self.received = dict((stream.sensor_id, 0) for stream in streams)
+
+    def open(self, stream):
+        """Starts connecting a sensor and waits for it in the selector, retrying later
+        if it is not there
+
+            Args:
+                stream (SensorStream): Sensor to connect
+            Return:
+                None
+        """
+        try:
+            sock = stream.connect()
+        except OSError:
+            print("Could not connect to sensor " + stream.sensor_id + ", retrying")
+            stream.retry = time.time() + s.RECONNECT_DELAY
+            return
+        # Writable once the connection is made or has failed
+        self.selector.register(sock, selectors.EVENT_WRITE, stream)
+
+    def start(self, stream):
+        """Starts a sensor's stream once its connection is made
+
+            Args:
+                stream (SensorStream): Sensor whose socket became writable
+            Return:
+                None
+        """
+        try:
+            stream.connected()
+        except OSError:
+            self.drop(stream, "Could not connect to sensor ")
+            return
+        self.selector.modify(stream.sock, selectors.EVENT_READ, stream)
+
+    def drop(self, stream, reason="Lost the connection to sensor "):
+        """Removes a sensor whose connection failed, to be reconnected later
+
+            Args:
+                stream (SensorStream): Sensor to drop
+                reason (string): Start of the message printed before the sensor ID
+            Return:
+                None
+        """
+        print(reason + stream.sensor_id + ", retrying")
+        self.selector.unregister(stream.sock)
+        stream.close()
+        stream.retry = time.time() + s.RECONNECT_DELAY
+
+    def close(self):
+        """Stops every sensor's stream
+
+            Args:
+                None
+            Return:
+                None
+        """
+        for stream in self.streams:
+            if stream.sock is not None:
+                self.selector.unregister(stream.sock)
+                stream.close()
+
+    def poll(self, timeout=s.MULTI_SELECT_TIMEOUT):
+        """Waits for data on any sensor and queues the scans it completes
+
+            Args:
+                timeout (float): Longest time to wait for data, in seconds
+            Return:
+                None
+        """
+        now = time.time()
+        for stream in self.streams:
+            if stream.sock is None and now >= stream.retry:
+                self.open(stream)
+            elif stream.framer is None and stream.sock is not None and now >= stream.deadline:
+                self.drop(stream, "Timed out connecting to sensor ")
+
+        if len(self.selector.get_map()) == 0:
+            time.sleep(timeout)
+            return
+
+        for key, events in self.selector.select(timeout):
+            stream = key.data
+            if stream.framer is None:
+                self.start(stream)
+                continue
+            try:
+                scans = stream.read()
+            except BlockingIOError:
+                continue
+            except OSError:
+                self.drop(stream)
+                continue
+
+            for stamp, frame in scans:
+                scan = {'Sensor': stream.sensor_id,
+                        'Transform': stream.transform,
+                        'Time': stamp,
+                        'Frame': frame}
+                heapq.heappush(self.pending, (stamp, self.order, scan))
+                self.order += 1
+                stream.latest = max(stream.latest, stamp)
+                self.received[stream.sensor_id] += 1
+
+    def ready(self):
+        """Takes the queued scans that no sensor can still send anything older than
+
+            Args:
+                None
+            Return:
+                List of scan dictionaries in time order
+        """
+        # Wait for every connected sensor to get past a scan before releasing it,
+        # but only for so long, so a sensor that goes quiet cannot hold the rest up
+        connected = [stream.latest for stream in self.streams if stream.framer is not None]
+        release = time.time() - s.MULTI_MERGE_DELAY
+        if len(connected) > 0:
+            release = max(min(connected), release)
+
+        scans = []
+        while len(self.pending) > 0 and self.pending[0][0] <= release:
+            scans.append(heapq.heappop(self.pending)[2])
+        return scans
+
+    def __iter__(self):
+        """Yields scans from every sensor in time order, for as long as it is iterated
+
+            Args:
+                None
+            Return:
+                Dictionaries with the sensor ID, its transform, the scan time and
+                the raw telegram
+        """
+        while True:
+            self.poll()
+            for scan in self.ready():
+                yield scan
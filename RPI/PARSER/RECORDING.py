@@ -0,0 +1,503 @@
+# Project Sentinel: Indexed binary recordings of scan sessions
+# Harris M
+# March 24, 2020
+
+# Usage:
+#   python RECORDING.py <text or PuTTY log> <recording>
+
+# A recording is a header followed by records, each of them
+#   tag (4 bytes) | payload length (u32) | CRC-32 of the payload (u32) | payload
+# 'DEVC' holds the device fields as JSON and comes before the first scans.
+# 'SCAN' holds a chunk of scans: the scan count (u32), the ranges as an
+#   (n, beams) uint16 array and then every RING.SCAN_COLUMNS column in order.
+# 'SCNZ' is the same with the ranges coded by CODEC: the scan count (u32),
+#   the length of the coded ranges (u32), the coded ranges, then the columns.
+# 'INDX' is written on close: first scan number, scan count, first and last
+#   time and file offset of every SCAN record, followed by a trailer pointing
+#   at it. A recording without a trailer (the program died) is still read
+#   by walking the records, and reopening it for append repairs it.
+
+# Standard library imports
+import os
+import sys
+import json
+import mmap
+import zlib
+import struct
+import collections
+from datetime import datetime
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+import PARSER as lidar_parser
+import INGEST as ingest
+import CODEC as codec
+from RING import ScanRing, SCAN_COLUMNS, DEVICE_KEYS, STATUS_KEYS, IMU_KEYS, timestamp_string
+
+HEADER = struct.Struct('<8sHH')             # magic, version, beams
+RECORD = struct.Struct('<4sII')             # tag, payload length, CRC-32
+TRAILER = struct.Struct('<Q8s')             # offset of the INDX record, magic
+INDEX = np.dtype([('first', '<u8'), ('count', '<u4'), ('start', '<f8'),
+                  ('stop', '<f8'), ('offset', '<u8')])
+
+def chunk_layout(beams):
+    """Byte layout of the columns in a SCAN record holding one scan
+
+        Args:
+            beams (int): Range values per scan
+        Return:
+            List of (key, dtype, shape of one entry, bytes per scan), ranges first
+    """
+    layout = [('Measurement', np.dtype('<u2'), (beams,), 2 * beams)]
+    for key, dtype, shape in SCAN_COLUMNS:
+        dtype = np.dtype(dtype).newbyteorder('<')
+        layout.append((key, dtype, shape, dtype.itemsize * int(np.prod(shape))))
+    return layout
+
+def device_json(device):
+    """Makes the device fields JSON friendly """
+    fields = {}
+    for key, value in device.items():
+        if isinstance(value, np.ndarray):
+            value = value.tolist()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        fields[key] = value
+    return fields
+
+def scan_records(mm, start, limit=None):
+    """Walks the records of a recording, stopping at the first damaged one
+
+        Args:
+            mm (mmap): The recording
+            start (int): Offset of the first record
+            limit (int): Most records to read, all of them if None
+        Return:
+            List of (tag, payload offset, payload length) and the offset just
+            past the last intact record
+    """
+    records = []
+    offset = start
+    while offset + RECORD.size <= len(mm) and (limit is None or len(records) < limit):
+        tag, length, crc = RECORD.unpack_from(mm, offset)
+        payload = offset + RECORD.size
+        if payload + length > len(mm) or zlib.crc32(mm[payload:payload + length]) != crc:
+            break
+        records.append((tag, payload, length))
+        offset = payload + length
+    return records, offset
+
+class RecordingWriter:
+    """ Appends scans to a recording a chunk at a time """
+
+    def __init__(self, path, beams=s.RING_BEAMS, chunk=s.RECORDING_CHUNK, sync=True, compress=s.RECORDING_COMPRESS):
+        """Creates a recording, or reopens one to append to it
+
+            Args:
+                path (string): Recording file
+                beams (int): Range values per scan, for a new recording
+                chunk (int): Scans per SCAN record
+                sync (bool): fsync every record, so a crash loses at most the
+                             scans that had not been written yet
+                compress (bool): Code the ranges with CODEC
+            Return:
+                None
+        """
+        self.path = path
+        self.chunk = chunk
+        self.sync = sync
+        self.compress = compress
+        self.index = []
+        self.device = None
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = RecordingReader(path)
+            beams = reader.beams
+            self.index = [tuple(entry) for entry in reader.index]
+            self.device = reader.device
+            end = reader.end
+            reader.close()
+            self.file = open(path, 'r+b')
+            # Drop the old index (or a half written record) and carry on after the scans
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(s.RECORDING_MAGIC, s.RECORDING_VERSION, beams))
+
+        self.beams = beams
+        self.layout = chunk_layout(beams)
+        self.ring = ScanRing(chunk, beams)
+        self.count = sum(entry[1] for entry in self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write_record(self, tag, payload):
+        """Writes one record and makes sure it is on disk
+
+            Args:
+                tag (bytes): Four byte record type
+                payload (bytes): Record contents
+            Return:
+                File offset of the record
+        """
+        offset = self.file.tell()
+        self.file.write(RECORD.pack(tag, len(payload), zlib.crc32(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        return offset
+
+    def append(self, telegram, stamp):
+        """Adds one scan, writing a SCAN record whenever a chunk fills up
+
+            Args:
+                telegram (dict): Parsed telegram, as built by telegram_parse
+                stamp (float): Time the scan was received, in seconds since the epoch
+            Return:
+                Scan number in the recording
+        """
+        if self.device is None:
+            self.device = device_json(dict((key, telegram.get(key, '')) for key in DEVICE_KEYS))
+            self.write_record(b'DEVC', json.dumps(self.device).encode('utf-8'))
+
+        self.ring.append(telegram, stamp)
+        self.count += 1
+        if len(self.ring) == self.chunk:
+            self.flush()
+        return self.count - 1
+
+    def flush(self):
+        """Writes the scans waiting in the current chunk
+
+            Args:
+                None
+            Return:
+                None
+        """
+        held = len(self.ring)
+        if held == 0:
+            return
+        window = self.ring.window(self.ring.oldest(), self.ring.count)
+
+        parts = [struct.pack('<I', held)]
+        layout = self.layout
+        if self.compress:
+            ranges = codec.encode_ranges(window['Measurement'])
+            parts.append(struct.pack('<I', len(ranges)) + ranges)
+            layout = layout[1:]
+        for key, dtype, shape, size in layout:
+            parts.append(np.ascontiguousarray(window[key], dtype=dtype).tobytes())
+        offset = self.write_record(b'SCNZ' if self.compress else b'SCAN', b''.join(parts))
+
+        times = window['Time']
+        self.index.append((self.count - held, held, float(times[0]), float(times[-1]), offset))
+        self.ring = ScanRing(self.chunk, self.beams)
+
+    def close(self):
+        """Writes the last chunk and the index, then closes the file
+
+            Args:
+                None
+            Return:
+                None
+        """
+        if self.file is None:
+            return
+        self.flush()
+        index = np.array(self.index, dtype=INDEX)
+        offset = self.write_record(b'INDX', index.tobytes())
+        self.file.write(TRAILER.pack(offset, s.RECORDING_MAGIC))
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+
+class RecordingReader:
+    """ Random access to the scans of a recording, straight from a memory map """
+
+    def __init__(self, path):
+        """Opens a recording and loads its index
+
+            Args:
+                path (string): Recording file
+            Return:
+                None
+        """
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, beams = HEADER.unpack_from(self.mm, 0)
+        if magic != s.RECORDING_MAGIC:
+            raise ValueError(path + " is not a Sentinel recording")
+        if version != s.RECORDING_VERSION:
+            # The columns of a SCAN record depend on the version
+            raise ValueError(path + " is a version " + str(version) + " recording, this reader needs version " + str(s.RECORDING_VERSION))
+        self.beams = beams
+        self.layout = chunk_layout(beams)
+        self.device = {}
+        # Decoding the ranges of an SCNZ chunk is the slow part of reading it, so
+        # the most recently used chunks keep their decoded ranges
+        self.decoded = collections.OrderedDict()
+
+        self.index = None
+        self.end = len(self.mm)
+        if self.end >= HEADER.size + TRAILER.size:
+            offset, magic = TRAILER.unpack_from(self.mm, self.end - TRAILER.size)
+            if magic == s.RECORDING_MAGIC and offset < self.end:
+                # Closed properly, so only the device fields and the index are read
+                records, stop = scan_records(self.mm, offset, 1)
+                if len(records) == 1 and records[0][0] == b'INDX':
+                    tag, payload, length = records[0]
+                    self.index = np.frombuffer(self.mm, dtype=INDEX, count=length // INDEX.itemsize, offset=payload).copy()
+                    self.end = offset
+                    records, stop = scan_records(self.mm, HEADER.size, 1)
+                    if len(records) == 1 and records[0][0] == b'DEVC':
+                        self.read_device(records[0])
+
+        if self.index is None:
+            # No index, so the recording was not closed. Rebuild it from the records.
+            records, self.end = scan_records(self.mm, HEADER.size)
+            chunks = []
+            for record in records:
+                if record[0] == b'DEVC':
+                    self.read_device(record)
+                elif record[0] in (b'SCAN', b'SCNZ'):
+                    chunks.append(record[1] - RECORD.size)
+                elif record[0] == b'INDX':
+                    # Died while closing, after the index but before the trailer
+                    self.end = record[1] - RECORD.size
+                    break
+
+            rebuilt = []
+            first = 0
+            for offset in chunks:
+                times = self.chunk(offset)['Time']
+                rebuilt.append((first, len(times), times[0], times[-1], offset))
+                first += len(times)
+            self.index = np.array(rebuilt, dtype=INDEX)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        if len(self.index) == 0:
+            return 0
+        return int(self.index['first'][-1] + self.index['count'][-1])
+
+    def read_device(self, record):
+        """Loads the device fields from a DEVC record """
+        tag, payload, length = record
+        self.device = json.loads(bytes(self.mm[payload:payload + length]).decode('utf-8'))
+
+    def close(self):
+        """Closes the recording
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.decoded.clear()
+        self.mm.close()
+        self.file.close()
+
+    def chunk(self, offset):
+        """Maps the columns of one SCAN or SCNZ record without copying them
+
+            Args:
+                offset (int): File offset of the record
+            Return:
+                Dictionary of column arrays, read only. Coded ranges are decoded
+                once and kept for the next few calls.
+        """
+        tag = RECORD.unpack_from(self.mm, offset)[0]
+        position = offset + RECORD.size
+        count = struct.unpack_from('<I', self.mm, position)[0]
+        position += 4
+
+        columns = {}
+        layout = self.layout
+        if tag == b'SCNZ':
+            length = struct.unpack_from('<I', self.mm, position)[0]
+            position += 4
+            columns['Measurement'] = self.decode(offset, position, length)
+            position += length
+            layout = layout[1:]
+        for key, dtype, shape, size in layout:
+            columns[key] = np.frombuffer(self.mm, dtype=dtype, count=count * size // dtype.itemsize,
+                                         offset=position).reshape((count,) + shape)
+            position += count * size
+        return columns
+
+    def decode(self, offset, position, length):
+        """Decodes the coded ranges of an SCNZ record, or reuses them if they were
+        decoded recently
+
+            Args:
+                offset (int): File offset of the record
+                position (int): File offset of the coded ranges
+                length (int): Length of the coded ranges
+            Return:
+                (n, beams) array of ranges, read only
+        """
+        ranges = self.decoded.pop(offset, None)
+        if ranges is None:
+            ranges = codec.decode_ranges(self.mm[position:position + length])
+            ranges.setflags(write=False)
+        self.decoded[offset] = ranges
+        if len(self.decoded) > s.RECORDING_DECODED:
+            self.decoded.popitem(last=False)
+        return ranges
+
+    def locate(self, sequence):
+        """Finds the chunk a scan is in
+
+            Args:
+                sequence (int): Scan number
+            Return:
+                Position of the chunk in the index
+        """
+        if sequence < 0 or sequence >= len(self):
+            raise IndexError("Scan " + str(sequence) + " is not in the recording")
+        return int(np.searchsorted(self.index['first'], sequence, side='right')) - 1
+
+    def window(self, start, stop):
+        """Gives the scans with numbers start up to (not including) stop
+
+            Args:
+                start (int): Number of the first scan
+                stop (int): One past the number of the last scan
+            Return:
+                Dictionary of column arrays, laid out like ScanRing.window. Views
+                into the file when the scans are in one chunk, copies otherwise.
+        """
+        if start == stop:
+            return dict((key, np.zeros((0,) + shape, dtype=dtype)) for key, dtype, shape, size in self.layout)
+        first = self.locate(start)
+        last = self.locate(stop - 1)
+
+        parts = []
+        for position in range(first, last + 1):
+            entry = self.index[position]
+            columns = self.chunk(int(entry['offset']))
+            low = max(start - int(entry['first']), 0)
+            high = min(stop - int(entry['first']), int(entry['count']))
+            parts.append(dict((key, value[low:high]) for key, value in columns.items()))
+
+        if len(parts) == 1:
+            return parts[0]
+        return dict((key, np.concatenate([part[key] for part in parts])) for key in parts[0])
+
+    def scan(self, sequence):
+        """Rebuilds the dictionary form of one scan
+
+            Args:
+                sequence (int): Scan number
+            Return:
+                Dictionary laid out like the one telegram_parse returns
+        """
+        row = self.window(sequence, sequence + 1)
+        telegram = dict(self.device)
+        for key in ['Telegram Counter', 'Scan Counter', 'Quantity'] + STATUS_KEYS:
+            telegram[key] = int(row[key][0])
+        for key in ['Time since start-up', 'Time of transmission', 'Start Angle', 'Angular Increment', 'Motor encoder']:
+            telegram[key] = float(row[key][0])
+        for index, key in enumerate(IMU_KEYS):
+            telegram[key] = float(row['imu'][0, index])
+        telegram['Timestamp'] = timestamp_string(row['Time'][0])
+        telegram['euler'] = row['euler'][0].copy()
+        telegram['P'] = row['P'][0].copy()
+        telegram['Measurement'] = row['Measurement'][0, :telegram['Quantity']].copy()
+        return telegram
+
+    def find_time(self, stamp):
+        """Finds the first scan taken at or after a time
+
+            Args:
+                stamp (float): Time in seconds since the epoch
+            Return:
+                Scan number, len(self) if every scan is older
+        """
+        position = int(np.searchsorted(self.index['stop'], stamp, side='left'))
+        if position == len(self.index):
+            return len(self)
+        entry = self.index[position]
+        times = self.chunk(int(entry['offset']))['Time']
+        return int(entry['first']) + int(np.searchsorted(times, stamp, side='left'))
+
+    def __iter__(self):
+        """Yields every scan as a dictionary, in order """
+        for sequence in range(len(self)):
+            yield self.scan(sequence)
+
+def legacy_array(value, shape):
+    """Reads a numpy array that was saved as str(array) in a text log
+
+        Args:
+            value: List, array or string form of the array
+            shape (tuple): Shape of the array
+        Return:
+            Array of that shape, zeros if it cannot be read
+    """
+    if isinstance(value, str):
+        value = np.array(value.replace('[', ' ').replace(']', ' ').split(), dtype=np.float64)
+    value = np.asarray(value, dtype=np.float64)
+    if value.size != int(np.prod(shape)):
+        return np.zeros(shape)
+    return value.reshape(shape)
+
+def legacy_stamp(telegram):
+    """Time a scan from a text log was taken, in seconds since the epoch """
+    try:
+        return datetime.strptime(telegram['Timestamp'], '%Y-%m-%d_%H-%M-%S').timestamp()
+    except (KeyError, TypeError, ValueError):
+        return float(telegram.get('Time since start-up') or 0)
+
+def convert(source, path, beams=s.RING_BEAMS):
+    """Converts a str(dict) text log or a PuTTY hex log into a recording
+
+        Args:
+            source (string): Log file
+            path (string): Recording to write
+            beams (int): Range values kept per scan
+        Return:
+            Number of scans converted
+    """
+    with open(source, 'rb') as f:
+        first = f.readline()
+        f.seek(0)
+        with RecordingWriter(path, beams) as writer:
+            if first.lstrip().startswith(b'{'):
+                scans = (ingest.parse_dict_line(line) for line in f if line.strip())
+            else:
+                scans = lidar_parser.parse_stream(f, verbose=False)
+            for telegram in scans:
+                if telegram.get('Quantity', '') == '':
+                    continue
+                for key, shape in [('euler', (3, 1)), ('P', (3, 3))]:
+                    if key in telegram:
+                        telegram[key] = legacy_array(telegram[key], shape)
+                for key in ['Rk', 'Qk']:
+                    if isinstance(telegram.get(key), str):
+                        telegram[key] = legacy_array(telegram[key], (3, 3))
+                writer.append(telegram, legacy_stamp(telegram))
+            return writer.count
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python RECORDING.py <text or PuTTY log> <recording>")
+        sys.exit(1)
+
+    print("Converted " + str(convert(sys.argv[1], sys.argv[2])) + " scans")
@@ -0,0 +1,179 @@
+# Project Sentinel: Preallocated ring buffer of scans
+# Harris M
+# March 14, 2020
+
+# Libraries
+from datetime import datetime
+import numpy as np
+
+import sentinel_reference as s
+
+# Per-scan columns besides the ranges: (key, dtype, shape of one entry)
+SCAN_COLUMNS = [('Time', np.float64, ()),
+                ('Telegram Counter', np.uint16, ()),
+                ('Scan Counter', np.uint16, ()),
+                ('Device Status', np.uint8, ()),
+                ('Status of digital inputs', np.uint8, ()),
+                ('Status of digital outputs', np.uint8, ()),
+                ('Time since start-up', np.float64, ()),
+                ('Time of transmission', np.float64, ()),
+                ('Start Angle', np.float64, ()),
+                ('Angular Increment', np.float64, ()),
+                ('Quantity', np.uint16, ()),
+                ('Motor encoder', np.float64, ()),
+                ('euler', np.float64, (3, 1)),
+                ('P', np.float64, (3, 3)),
+                ('imu', np.float64, (6,))]
+
+# Keys of the IMU sample, in the order they are stored in the 'imu' column
+IMU_KEYS = ['Ax', 'Ay', 'Az', 'Gx', 'Gy', 'Gz']
+
+# Status bytes that can change from one scan to the next, kept per scan
+STATUS_KEYS = ['Device Status', 'Status of digital inputs', 'Status of digital outputs']
+
+# Fields that do not change between scans of one device. They are kept once
+# for the whole buffer instead of once per scan.
+DEVICE_KEYS = ['Version Number', 'Device Number', 'Serial Number', 'Layer Angle',
+               'Scan Frequency', 'Measurement Frequency', 'Amount of Encoder',
+               '16-bit Channels', 'Scale Factor', 'Scale Factor Offset', 'Rk', 'Qk']
+
+def status_byte(value):
+    """Reads a status field as a byte, 0 when the telegram did not have it """
+    try:
+        return int(value) & 0xFF
+    except (TypeError, ValueError):
+        return 0
+
+def timestamp_string(stamp):
+    """Formats a time the way scans are named in the database
+
+        Args:
+            stamp (float): Seconds since the epoch
+        Return:
+            String of the form year-month-day_hour-minute-second
+    """
+    curr = datetime.fromtimestamp(stamp)
+    return str(curr.year) + "-" + str(curr.month) + "-" + str(curr.day) + "_" + str(curr.hour) + "-" + str(curr.minute) + "-" + str(curr.second)
+
+class ScanRing:
+    """ Fixed-capacity ring of scans, stored as one NumPy array per field """
+
+    def __init__(self, capacity=s.RING_CAPACITY, beams=s.RING_BEAMS):
+        """Allocates every column up front
+
+            Args:
+                capacity (int): Number of scans kept before the oldest is overwritten
+                beams (int): Number of range values per scan
+            Return:
+                None
+        """
+        self.capacity = capacity
+        self.beams = beams
+        self.count = 0          # Scans appended so far. Scan n lives in row n % capacity.
+        self.device = {}
+
+        self.ranges = np.zeros((capacity, beams), dtype=np.uint16)
+        self.columns = {}
+        for key, dtype, shape in SCAN_COLUMNS:
+            self.columns[key] = np.zeros((capacity,) + shape, dtype=dtype)
+
+    def __len__(self):
+        """Number of scans currently held """
+        return min(self.count, self.capacity)
+
+    def oldest(self):
+        """Sequence number of the oldest scan still held """
+        return self.count - len(self)
+
+    def append(self, telegram, stamp):
+        """Copies a parsed telegram into the next row, overwriting the oldest if full
+
+            Args:
+                telegram (dict): Parsed telegram, as built by telegram_parse
+                stamp (float): Time the scan was received, in seconds since the epoch
+            Return:
+                Sequence number of the stored scan
+        """
+        if len(self.device) == 0:
+            for key in DEVICE_KEYS:
+                self.device[key] = telegram.get(key, '')
+
+        row = self.count % self.capacity
+        measurement = np.asarray(telegram['Measurement'])[:self.beams]
+        self.ranges[row, :len(measurement)] = measurement
+        self.ranges[row, len(measurement):] = 0
+
+        columns = self.columns
+        columns['Time'][row] = stamp
+        for key in ['Telegram Counter', 'Scan Counter', 'Time since start-up', 'Time of transmission',
+                    'Start Angle', 'Angular Increment', 'Quantity']:
+            columns[key][row] = telegram[key]
+        for key in STATUS_KEYS:
+            columns[key][row] = status_byte(telegram.get(key))
+        columns['Motor encoder'][row] = float(telegram.get('Motor encoder') or 0)
+        columns['euler'][row] = telegram.get('euler', 0)
+        columns['P'][row] = telegram.get('P', 0)
+        for index, key in enumerate(IMU_KEYS):
+            columns['imu'][row, index] = telegram.get(key) or 0
+
+        self.count += 1
+        return self.count - 1
+
+    def window(self, start, stop):
+        """Gives the scans with sequence numbers start up to (not including) stop
+
+            Args:
+                start (int): Sequence number of the first scan
+                stop (int): One past the sequence number of the last scan
+            Return:
+                Dictionary of column arrays with 'Measurement' holding the ranges.
+                These are views into the buffer (no copy) unless the window wraps
+                around the end, in which case they are copies. Views are
+                overwritten once the ring comes back around to them.
+        """
+        if start < self.oldest() or stop > self.count or start > stop:
+            raise IndexError("Scans " + str(start) + " to " + str(stop) + " are not in the buffer")
+
+        first = start % self.capacity
+        last = first + (stop - start)
+        if last <= self.capacity:
+            rows = slice(first, last)
+        else:
+            rows = np.arange(first, last) % self.capacity
+
+        window = {'Measurement': self.ranges[rows]}
+        for key in self.columns:
+            window[key] = self.columns[key][rows]
+        return window
+
+    def latest(self, count):
+        """Gives the most recent count scans, oldest first
+
+            Args:
+                count (int): Number of scans
+            Return:
+                Same as window()
+        """
+        return self.window(self.count - count, self.count)
+
+    def scan(self, sequence):
+        """Rebuilds the dictionary form of one scan, e.g. for uploadToAWS
+
+            Args:
+                sequence (int): Sequence number returned by append()
+            Return:
+                Dictionary laid out like the one telegram_parse returns
+        """
+        row = self.window(sequence, sequence + 1)
+        telegram = dict(self.device)
+        for key in ['Telegram Counter', 'Scan Counter', 'Quantity'] + STATUS_KEYS:
+            telegram[key] = int(row[key][0])
+        for key in ['Time since start-up', 'Time of transmission', 'Start Angle', 'Angular Increment', 'Motor encoder']:
+            telegram[key] = float(row[key][0])
+        for index, key in enumerate(IMU_KEYS):
+            telegram[key] = float(row['imu'][0, index])
+        telegram['Timestamp'] = timestamp_string(row['Time'][0])
+        telegram['euler'] = row['euler'][0].copy()
+        telegram['P'] = row['P'][0].copy()
+        telegram['Measurement'] = row['Measurement'][0, :telegram['Quantity']].copy()
+        return telegram
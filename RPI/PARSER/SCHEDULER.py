@@ -0,0 +1,176 @@
+# Project Sentinel: Pipelined stop and go scheduler
+# Harris M
+# March 17, 2020
+
+# Standard library imports
+import sys
+import time
+import queue
+import threading
+
+# Libraries
+import numpy as np
+
+import sentinel_reference as s
+from RING import timestamp_string
+
+sys.path.append("../SLAM")
+
+import KALMAN as kalman
+
+class StopAndGoScheduler:
+    """ Runs stop and go as three stages so the motor moves while earlier scans are processed
+
+    1. The calling thread waits for the Arduino to stop, waits for the IMU to settle,
+       takes the scan and sends the motor on straight away.
+    2. A processing thread parses the scan and runs the Kalman filter over the gyro
+       samples taken since the last stop.
+    3. An upload thread sends finished scans to AWS.
+    """
+
+    def __init__(self, sentinel):
+        """Sets up the stages around an initialised SENTINEL
+
+            Args:
+                sentinel (SENTINEL): Provides the sensor session, the Arduino link,
+                                     the IMU sampler and the Kalman state
+            Return:
+                None
+        """
+        self.sentinel = sentinel
+        self.scans = []
+        self.error = None
+
+    def run(self, count, scan_name):
+        """Takes count scans, uploading them under scan_name as they are finished
+
+            Args:
+                count (int): How many scans we want
+                scan_name (string): Name the scans are stored under
+            Return:
+                List of scans
+        """
+        sentinel = self.sentinel
+        sentinel.P = np.eye(3)
+        sentinel.Qk = np.diag([s.QK_VAL, s.QK_VAL, s.QK_VAL])
+        sentinel.Rk = np.diag([1, 1, 1])
+        sentinel.counter = 0
+        self.scans = []
+        self.error = None
+
+        captured = queue.Queue()
+        processed = queue.Queue()
+        stages = [threading.Thread(target=self.process, args=(captured, processed), name='stop_and_go_process'),
+                  threading.Thread(target=self.upload, args=(processed, scan_name), name='stop_and_go_upload')]
+        for stage in stages:
+            stage.start()
+
+        try:
+            sentinel.sendToArduino('g')
+            # Stop capturing if the processing stage has died, nothing would use the scans
+            while sentinel.counter < count and self.error is None:
+                msg = sentinel.link.receive(s.SCHEDULER_TIMEOUT)
+                if msg is None:
+                    continue
+                parse = msg.split(" ")
+                if len(parse) == 1 or parse[0] != 'D':
+                    continue
+
+                if not self.wait_until_settled():
+                    print("The IMU did not settle, scanning anyway")
+                frame = sentinel.session.request(s.REQUEST_SINGLE_SCAN)
+                stamp = time.time()
+                # The scan is in, so the motor can move while it is processed
+                sentinel.sendToArduino('g')
+                if frame is None:
+                    print("No scan from the LIDAR, skipping this stop")
+                    continue
+
+                sentinel.counter = sentinel.counter + 1
+                captured.put((stamp, frame, parse[1]))
+                print("Took a scan!")
+        finally:
+            captured.put(None)
+            for stage in stages:
+                stage.join()
+
+        if self.error is not None:
+            raise self.error
+        return self.scans
+
+    def wait_until_settled(self):
+        """Waits until the gyroscope shows the platform has stopped moving
+
+            Args:
+                None
+            Return:
+                True once settled, False if s.SETTLE_TIMEOUT passed first
+        """
+        deadline = time.time() + s.SETTLE_TIMEOUT
+        while time.time() < deadline:
+            times, samples = self.sentinel.imu.recent(s.SETTLE_WINDOW)
+            # Require a full window of quiet samples, not just the last one
+            if len(times) > 0 and times[-1] - times[0] >= s.SETTLE_WINDOW / 2:
+                if np.abs(samples[:, 3:]).max() < s.SETTLE_RATE:
+                    return True
+            time.sleep(s.SETTLE_POLL)
+        return False
+
+    def process(self, captured, processed):
+        """Processing stage: parses scans and keeps the Kalman filter up to date
+
+            Args:
+                captured (Queue): (timestamp, frame, motor encoder) from the capture stage,
+                                  ending with None
+                processed (Queue): Finished scans for the upload stage
+            Return:
+                None. An error is kept in self.error for run() to raise.
+        """
+        sentinel = self.sentinel
+        imu = sentinel.imu
+        last = time.time()
+
+        try:
+            while True:
+                item = captured.get()
+                if item is None:
+                    return
+                stamp, frame, encoder = item
+
+                # Predict with every gyro sample taken since the last scan
+                for dt, A in imu.rates(last, stamp):
+                    sentinel.x, sentinel.P = kalman.Predict(sentinel.x, sentinel.P, [[np.deg2rad(A[3])], [np.deg2rad(A[4])], [np.deg2rad(A[5])]], dt, sentinel.Qk)
+                last = stamp
+
+                sentinel.A = imu.state_at(stamp)
+                scan = sentinel.telegram_parse(frame, timestamp_string(stamp), sentinel.A)
+                scan['Motor encoder'] = encoder
+                sentinel.x, sentinel.P = kalman.Correct(sentinel.x, sentinel.P, [[sentinel.A[0]], [sentinel.A[1]], [sentinel.A[2]]], sentinel.Rk)
+                scan['Rk'] = sentinel.Rk
+                scan['Qk'] = sentinel.Qk
+                scan['P'] = sentinel.P
+                scan['euler'] = sentinel.x
+
+                self.scans.append(scan)
+                processed.put(scan)
+        except Exception as error:
+            self.error = error
+        finally:
+            # Always let the upload stage finish
+            processed.put(None)
+
+    def upload(self, processed, scan_name):
+        """Upload stage: stores scans in AWS as soon as they are processed
+
+            Args:
+                processed (Queue): Finished scans, ending with None
+                scan_name (string): Name the scans are stored under
+            Return:
+                None
+        """
+        self.sentinel.replaceAWSName(scan_name)
+        while True:
+            scan = processed.get()
+            if scan is None:
+                return
+            self.sentinel.uploadToAWS(scan, scan_name)
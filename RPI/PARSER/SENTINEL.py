@@ -17,13 +17,29 @@ import sys
 import socket
 import time
 import struct
+import queue
+import asyncio
 from numpy import array
 import numpy as np
 
 # RPI specific imports
-import smbus 
+try:
+    import smbus
+except ImportError:
+    # Only available on the Raspberry Pi. Elsewhere pass a bus to SENTINEL.
+    smbus = None
 import serial 
 import sentinel_reference as s
+from SESSION import SensorSession
+from ACQUIRE import AcquisitionEngine
+from RING import ScanRing, timestamp_string
+from IMU import IMUSampler
+from SERIALLINK import ArduinoLink
+from SCHEDULER import StopAndGoScheduler
+from LIVEQUEUE import LiveQueue
+from MULTISENSOR import SensorStream, MultiSensorReader
+import DECODER as decoder
+import CODEC as codec
 
 sys.path.append("../SLAM")
 
@@ -33,22 +49,32 @@ import KALMAN as kalman
 class SENTINEL:
     """ Function declarations for the SENTINEL class """
       
-    def __init__(self):
+    def __init__(self, binary=False, bus=None, serialPortName=s.ARDUINO_PORT, ip=s.IP_ADDRESS, port=None, table=None):
         """Initializes neccesary constants and communication busses
 
         Args:
-            None
+            binary (bool): Talk to the LIDAR in binary (CoLa-B) instead of ASCII (CoLa-A)
+            bus (SMBus): I2C bus of the MPU-6050. Bus 3 of the Raspberry Pi if None.
+            serialPortName (string): Serial port of the Arduino
+            ip (string): IP address of the LIDAR
+            port (int): Port of the LIDAR. The standard port for the protocol if None.
+            table (Table): DynamoDB table to store scans in. The AWS table if None.
         Return:
             None
         """
-        self.dynamodb = boto3.resource(s.DB, region_name=s.REGION_NAME, endpoint_url=s.ENDPOINT_URL)
-        self.table = self.dynamodb.Table(s.TABLE_NAME)
-        self.dataStarted = False 
-        self.dataBuf = ""
-        self.messageComplete = False
-        self.setupSerial()
-        self.bus = smbus.SMBus(3)
+        self.binary = binary
+        self.session = SensorSession(ip=ip, binary=binary, port=port)
+        if table is None:
+            self.dynamodb = boto3.resource(s.DB, region_name=s.REGION_NAME, endpoint_url=s.ENDPOINT_URL)
+            table = self.dynamodb.Table(s.TABLE_NAME)
+        self.table = table
+        self.setupSerial(serialPortName=serialPortName)
+        if bus is None:
+            bus = smbus.SMBus(s.ACCEL_BUS_ADDRESS)
+        self.bus = bus
         self.accel_init()
+        self.imu = IMUSampler(self.bus)
+        self.imu.start()
         self.A = self.accel_read()
         self.x = kalman.Gravity([[self.A[0]], [self.A[1]], [self.A[2]]])
 
@@ -62,7 +88,8 @@ class SENTINEL:
                 None
         """
         # global serialPort
-        self.serialPort = serial.Serial(port=serialPortName, baudrate=baudRate, timeout=0, rtscts=True)
+        self.serialPort = serial.Serial(port=serialPortName, baudrate=baudRate, timeout=s.SERIAL_READ_TIMEOUT, rtscts=True)
+        self.link = ArduinoLink(self.serialPort)
         print("Serial port " + serialPortName + " opened Baudrate " + str(baudRate))
         self.waitForArduino()
 
@@ -75,39 +102,20 @@ class SENTINEL:
                 None
         """
         print("Waiting for Arduino to reset")
-        msg = ""
-        while msg.find("Arduino is ready") == -1:
-            msg = self.recvLikeArduino() 
-            if not (msg == 'XXX'):
-                print(msg)
+        print(self.link.wait_for("Arduino is ready"))
 
-    def recvLikeArduino(self):
-        """Handles received serial messages on the serial port
+    def recvLikeArduino(self, timeout=0):
+        """Takes the next message the serial link has received from the Arduino
 
             Args:
-                None
+                timeout (float): Seconds to wait for a message, 0 to not wait
             Return:
-                Either the data buffer, or XXX to indicate failure
+                Either the message, or XXX to indicate failure
         """
-
-        if self.serialPort.inWaiting() > 0 and self.messageComplete == False:
-            x = self.serialPort.read().decode("utf-8") 
-        
-            if self.dataStarted == True:
-                if x != s.endSentinel:
-                    self.dataBuf = self.dataBuf + x 
-                else:
-                    self.dataStarted = False 
-                    self.messageComplete = True 
-            elif x == s.startSentinel:
-                self.dataBuf = ''
-                self.dataStarted = True 
-
-        if (self.messageComplete == True):
-            self.messageComplete = False 
-            return self.dataBuf 
-        else: 
+        msg = self.link.receive(timeout)
+        if msg is None:
             return "XXX"
+        return msg
 
     def sendToArduino(self, stringToSend):
         """Sends a properly encoded string to the Arduino
@@ -117,12 +125,7 @@ class SENTINEL:
             Return:
                 None
         """
-
-        stringWithMarkers = (s.startSentinel)
-        stringWithMarkers += stringToSend 
-        stringWithMarkers += (s.endSentinel)
-
-        self.serialPort.write(stringWithMarkers.encode('utf-8'))
+        self.link.send(stringToSend)
 
     def accel_init(self):
         """Instantiates the MPU-6050 module 
@@ -138,6 +141,19 @@ class SENTINEL:
         self.bus.write_byte_data(s.ACCEL_ADDRESS, s.GYRO_CONFIG, 24)
         self.bus.write_byte_data(s.ACCEL_ADDRESS, s.INT_ENABLE, 1)
 
+    def lidar_command(self, message):
+        """Sends a command over the sensor session and splits up the reply
+
+        Args:
+            message (bytes): Framed command, e.g. s.READ_FOR_ANGLE_FREQ
+        Return:
+            List of reply tokens, empty if the sensor did not answer
+        """
+        reply = self.session.request(message)
+        if reply is None:
+            return []
+        return reply.decode('latin-1').split(' ')
+
     def singleScanPretty(self):
         """Takes a single scan and prints it for debugging
 
@@ -174,91 +190,31 @@ class SENTINEL:
             Return:
                 The converted number.
         """
-        initial = int(num, 16)
-        if base == 's8':
-            conv = (initial + 2**7) % 2**8 - 2**7
-        elif base == 'u8':
-            conv = initial % 2**8 
-        elif base == 's16':
-            conv = (initial + 2**15) % 2**16 - 2**15
-        elif base == 'u16':
-            conv = initial % 2**16 
-        elif base == 's32':
-            conv = (initial + 2**31) % 2**32 - 2**31
-        elif base == 'u32':
-            conv = initial % 2**32
-        elif base == 's64':
-            conv = (initial + 2**63) % 2**64 - 2**63
-        elif base == 'u64':
-            conv = initial % 2**64
-        else:
-            return initial
-        
-        return conv
+        return decoder.type_conv(num, base)
 
-
-    def telegram_parse(self, scan):
+    def telegram_parse(self, frame, timestamp, imu=None):
         """ Converts a raw scan into a neat dictionary  
 
             Args:
-                scan (array): Raw scan data 
+                frame (bytes): Raw telegram, without the framing bytes
+                timestamp (string): When the telegram was received
+                imu (tuple): IMU sample taken with the scan. Read from the bus if None.
             Return:
                 Dictionary of parsed values
         """
-        telegram = {'Version Number': '',
-                    'Device Number': '',
-                    'Serial Number': '',
-                    'Device Status': '',
-                    'Telegram Counter': '',
-                    'Scan Counter': '',
-                    'Time since start-up': '',
-                    'Time of transmission': '',
-                    'Scan Frequency': '',
-                    'Measurement Frequency': '',
-                    'Amount of Encoder': '',
-                    '16-bit Channels': '',
-                    'Scale Factor': '',
-                    'Scale Factor Offset': '',
-                    'Start Angle': '',
-                    'Angular Increment': '', 
-                    'Quantity': '',
-                    'Motor encoder': '',
-                    'Timestamp': '',
-                    'Ax': '',
-                    'Ay': '',
-                    'Az': '',
-                    'Gx': '',
-                    'Gy': '',
-                    'Gz': '',
-                    'Measurement': [] }
-
-        if (scan[1] != 'LMDscandata'):
-            print("There is something wrong with the scan data")
+        if self.binary:
+            telegram = decoder.decode_binary(frame)
         else:
-            telegram['Version Number'] = self.type_conv(scan[2], 'u16')
-            telegram['Device Number'] = self.type_conv(scan[3], 'u16')
-            telegram['Serial Number'] = self.type_conv(scan[4], 'u32')
-            telegram['Device Status'] = self.type_conv(scan[6], 'u8')
-            telegram['Telegram Counter'] = self.type_conv(scan[7], 'u16')
-            telegram['Scan Counter'] = self.type_conv(scan[8], 'u16')
-            telegram['Time since start-up'] = self.type_conv(scan[9], 'u32') * s.MICROSECOND
-            telegram['Time of transmission'] = self.type_conv(scan[10], 'u32') * s.MICROSECOND
-            telegram['Scan Frequency'] = self.type_conv(scan[16], 'u32') 
-            telegram['Measurement Frequency'] = self.type_conv(scan[17], 'u32') 
-            telegram['Amount of Encoder'] = self.type_conv(scan[18], 'u32')
-            telegram['16-bit Channels'] = self.type_conv(scan[19], 'u32')
-            telegram['Scale Factor'] = s.SCALE_FACTOR[scan[21]]
-            telegram['Scale Factor Offset'] = self.type_conv(scan[22], 'u32')
-            telegram['Start Angle'] = self.type_conv(scan[23], 's32') / s.ANGLE_STOP
-            telegram['Angular Increment'] = self.type_conv(scan[24], 'u16') / s.ANGLE_STOP
-            telegram['Quantity'] = self.type_conv(scan[25], 'u16')
-
-            for message in range(26, 26 + telegram['Quantity']):
-                telegram['Measurement'].append(self.type_conv(scan[message], 'u16'))
-            
-            telegram['Timestamp'] = scan[-1]
+            telegram = decoder.decode_telegram(frame)
+        for key in ['Motor encoder', 'Timestamp', 'Ax', 'Ay', 'Az', 'Gx', 'Gy', 'Gz']:
+            telegram[key] = ''
+
+        if telegram['Quantity'] != '':
+            telegram['Timestamp'] = timestamp
             
-            Ax, Ay, Az, Gx, Gy, Gz = self.accel_read()
+            if imu is None:
+                imu = self.accel_read()
+            Ax, Ay, Az, Gx, Gy, Gz = imu
             telegram['Ax'] = Ax
             telegram['Ay'] = Ay
             telegram['Az'] = Az
@@ -268,89 +224,124 @@ class SENTINEL:
 
         return telegram 
 
-    def live_parse(self, count):
+    def live_parse(self, count, policy=s.LIVE_POLICY):
         """ Scans as many consecutive scans as necessary  
 
             Args:
-                scan (array): Raw scan data 
+                count (int): How many scans we want
+                policy (string): What to do when processing falls behind the sensor:
+                                 'drop' the oldest waiting scan, 'decimate' to every
+                                 s.LIVE_DECIMATE-th scan, or 'slow' the mechanism
             Return:
-                Dictionary of parsed values
+                Ring of parsed scans
         """
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((s.IP_ADDRESS, s.PORT))
-        sock.send(s.REQUEST_CONT_SCAN)
-
         self.P = np.eye(3)
         self.Qk = np.diag([s.QK_VAL, s.QK_VAL, s.QK_VAL])
         self.Rk = np.diag([s.RK_VAL, s.RK_VAL, s.RK_VAL])
 
+        # The firmware only knows go and stop, so slowing the mechanism means
+        # pausing it until the backlog is worked off. on_slow runs on the session
+        # reader thread, so the commands are queued for this loop to send over
+        # the serial link.
+        commands = queue.Queue()
+        frames = LiveQueue(policy=policy, on_slow=lambda: commands.put('s'), on_resume=lambda: commands.put('g'))
+
         self.sendToArduino('g') #Tell Arduino to start spinning
 
         time.sleep(20)
-        actualTime = time.time()
-        
-        scans = []
-        while 1:
-            scan = []
-            curr = ''
-            while 1:
-                startTime = time.time()
-                msg_orig = sock.recv(1)
-                msg = msg_orig.decode('utf-8')  
-                actualTime = time.time()
 
-                if msg_orig == b'\x03': 
-                    scan.append(curr)
-                    break
-                elif msg == ' ':
-                    scan.append(curr)
-                    curr = ''
-                else:
-                    curr += msg
-            
-            if (len(scan) < 4):
-                continue
-            
-            currentTrack = (time.time() - startTime) 
-            startTime = time.time()
-
-            curr = datetime.now()
-            nice_timestamp = str(curr.year) + "-" + str(curr.month) + "-" + str(curr.day) + "_" + str(curr.hour) + "-" + str(curr.minute) + "-" + str(curr.second)
-
-            scan.append(nice_timestamp)
-
-            initial_parse = self.telegram_parse(scan)
-
-            actualTime = time.time()
-            self.A = self.accel_read()
-            self.x, self.P = kalman.Predict(self.x , self.P, [[np.deg2rad(self.A[3])], [np.deg2rad(self.A[4])], [np.deg2rad(self.A[5])]], time.time() - actualTime, self.Qk) #This line should read the gyroscope while the motor is spinning
-            self.x, self.P = kalman.Correct(self.x , self.P, [[self.A[0]], [self.A[1]], [self.A[2]]], self.Rk) #When the scan is about to be taken, this line should be executed.
-            initial_parse['Rk'] = self.Rk
-            initial_parse['Qk'] = self.Qk 
-            initial_parse['P'] = self.P
-            initial_parse['euler'] = self.x
-            initial_parse['Motor encoder'] = 0
-
-            scans.append(initial_parse)
-            currentTrack = (time.time() - startTime)
-
-            print(len(scans)) 
-            if len(scans) == count:
-                sock.send(s.STOP_CONT_SCAN)
-                self.sendToArduino('s') #Tell Arduino to stop
-                scan_name = input("What is the scan name?\n")
-                for scan in scans:
-                    sentinel.uploadToAWS(scan, scan_name)
-
-                # Update the list of scan names
-                currentNameHold = self.readFromAWS('NAMES')
-                currentNames = currentNameHold[0]['list']
-                self.deleteFromAWS('NAMES', '-1')
-                currentNames.append(scan_name)
-                break
+        # Telegrams arrive on the session's reader thread. The view is only valid
+        # during the callback, so a copy is queued for this loop.
+        callback = lambda frame: frames.put(bytes(frame))
+        self.session.subscribe(b'LMDscandata', callback)
+
+        scans = ScanRing(count)
+        try:
+            while scans.count < count:
+                item = frames.get(s.LIVE_TIMEOUT)
+                while not commands.empty():
+                    self.sendToArduino(commands.get_nowait())
+                if item is None:
+                    print("No scans from the LIDAR. " + frames.summary())
+                    continue
+                actualTime, frame = item
+
+                initial_parse = self.telegram_parse(frame, timestamp_string(actualTime))
+
+                predictTime = time.time()
+                self.A = self.accel_read()
+                self.x, self.P = kalman.Predict(self.x , self.P, [[np.deg2rad(self.A[3])], [np.deg2rad(self.A[4])], [np.deg2rad(self.A[5])]], time.time() - predictTime, self.Qk) #This line should read the gyroscope while the motor is spinning
+                self.x, self.P = kalman.Correct(self.x , self.P, [[self.A[0]], [self.A[1]], [self.A[2]]], self.Rk) #When the scan is about to be taken, this line should be executed.
+                initial_parse['Rk'] = self.Rk
+                initial_parse['Qk'] = self.Qk 
+                initial_parse['P'] = self.P
+                initial_parse['euler'] = self.x
+                initial_parse['Motor encoder'] = 0
+
+                if initial_parse['Quantity'] != '':
+                    scans.append(initial_parse, actualTime)
+        finally:
+            self.session.unsubscribe(b'LMDscandata', callback)
+            self.sendToArduino('s') #Tell Arduino to stop
+
+        print(frames.summary())
+        scan_name = input("What is the scan name?\n")
+        for sequence in range(scans.oldest(), scans.count):
+            self.uploadToAWS(scans.scan(sequence), scan_name)
+
+        # Update the list of scan names
+        currentNameHold = self.readFromAWS('NAMES')
+        currentNames = currentNameHold[0]['list']
+        self.deleteFromAWS('NAMES', '-1')
+        currentNames.append(scan_name)
 
         return(scans)
     
+    def multi_parse(self, count, sensors=s.SENSORS):
+        """ Streams scans from several sensors at once, in the order they were taken
+
+            Args:
+                count (int): How many scans we want, from all sensors together
+                sensors (list): (sensor ID, IP address, 4x4 transform) for each sensor,
+                                or SensorStreams
+            Return:
+                List of parsed scans, each with its 'Sensor' ID and 'Transform'
+        """
+        streams = []
+        for sensor in sensors:
+            if not isinstance(sensor, SensorStream):
+                sensor_id, ip, transform = sensor
+                sensor = SensorStream(sensor_id, ip, binary=self.binary, transform=transform)
+            streams.append(sensor)
+        reader = MultiSensorReader(streams)
+
+        scans = []
+        last = None         # Time the orientation was last integrated up to
+        try:
+            for item in reader:
+                stamp = item['Time']
+                # Scans come out in time order, so the orientation only moves forward
+                if last is not None:
+                    self.x = self.imu.integrate(self.x, last, stamp)
+                last = stamp
+                self.A = self.imu.state_at(stamp)
+
+                scan = self.telegram_parse(item['Frame'], timestamp_string(stamp), self.A)
+                if scan['Quantity'] == '':
+                    continue
+                scan['Sensor'] = item['Sensor']
+                scan['Transform'] = item['Transform']
+                scan['Motor encoder'] = 0
+                scan['euler'] = self.x
+                scans.append(scan)
+                if len(scans) == count:
+                    break
+        finally:
+            reader.close()
+
+        print(str(reader.received) + " scans received per sensor")
+        return scans
+
     def replaceAWSName(self, names):
         """ Specialized upload to AWS function that updates names 
 
@@ -391,33 +382,14 @@ class SENTINEL:
             Return:
                 Dictionary of parsed values
         """
-        insideTelegram = False 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((s.IP_ADDRESS, s.PORT))
-        sock.send(s.REQUEST_SINGLE_SCAN)
-
-        scan = []
-        curr = ''
-        while 1:
-            msg_orig = sock.recv(1)
-            msg = msg_orig.decode('utf-8')
-            if msg_orig == b'\x02':
-                insideTelegram = True 
-            elif msg_orig == b'\x03':
-                insideTelegram = False 
-                break
-            elif msg == ' ':
-                scan.append(curr)
-                curr = ''
-            else:
-                curr += msg
+        frame = self.session.request(s.REQUEST_SINGLE_SCAN)
+        if frame is None:
+            frame = b''
         
         curr = datetime.now()
         nice_timestamp = str(curr.year) + "-" + str(curr.month) + "-" + str(curr.day) + "_" + str(curr.hour) + "-" + str(curr.minute) + "-" + str(curr.second)
 
-        scan.append(nice_timestamp)
-
-        initial_parse = self.telegram_parse(scan)
+        initial_parse = self.telegram_parse(frame, nice_timestamp)
         return initial_parse
 
     def uploadToAWS(self, telegram, name):
@@ -431,43 +403,47 @@ class SENTINEL:
         if name == "":
             name = str("Unnamed_" + telegram['Timestamp'])
         
-        response = self.table.put_item(
-            Item={
-                # 'Time-stamp': str(telegram['Timestamp']),
-                'Name': name,
-                'Count': str(telegram['Telegram Counter']),
-                'Version Number': str(telegram['Version Number']),
-                'Device Number': str(telegram['Device Number']),
-                'Serial Number': str(telegram['Serial Number']),
-                'Device Status': str(telegram['Device Status']),
-                # 'Telegram Counter': str(telegram['Telegram Counter']),
-                'Scan Counter': str(telegram['Scan Counter']),
-                'Time since start-up': str(telegram['Time since start-up']),
-                'Time of transmission': str(telegram['Time of transmission']),
-                'Scan Frequency': str(telegram['Scan Frequency']),
-                'Measurement Frequency': str(telegram['Measurement Frequency']),
-                'Amount of Encoder': str(telegram['Amount of Encoder']),
-                '16-bit Channels': str(telegram['16-bit Channels']),
-                'Scale Factor': str(telegram['Scale Factor']),
-                'Scale Factor Offset': str(telegram['Scale Factor Offset']),
-                'Start Angle': str(telegram['Start Angle']),
-                'Angular Increment': str(telegram['Angular Increment']),
-                'Quantity': str(telegram['Quantity']),
-                'Motor encoder': telegram['Motor encoder'],
-                'Timestamp': str(telegram['Timestamp']),
-                'Rk': (telegram['Rk']).__repr__(),
-                'Qk': (telegram['Qk']).__repr__(), 
-                'P':  (telegram['P']).__repr__(),
-                'euler': (telegram['euler']).__repr__(),
-                'Ax': str(telegram['Ax']),
-                'Ay': str(telegram['Ay']),
-                'Az': str(telegram['Az']),
-                'Gx': str(telegram['Gx']),
-                'Gy': str(telegram['Gy']),
-                'Gz': str(telegram['Gz']),
-                'Measurement': str(telegram['Measurement'])
-            }
-        )
+        item = {
+            # 'Time-stamp': str(telegram['Timestamp']),
+            'Name': name,
+            'Count': str(telegram['Telegram Counter']),
+            'Version Number': str(telegram['Version Number']),
+            'Device Number': str(telegram['Device Number']),
+            'Serial Number': str(telegram['Serial Number']),
+            'Device Status': str(telegram['Device Status']),
+            # 'Telegram Counter': str(telegram['Telegram Counter']),
+            'Scan Counter': str(telegram['Scan Counter']),
+            'Time since start-up': str(telegram['Time since start-up']),
+            'Time of transmission': str(telegram['Time of transmission']),
+            'Scan Frequency': str(telegram['Scan Frequency']),
+            'Measurement Frequency': str(telegram['Measurement Frequency']),
+            'Amount of Encoder': str(telegram['Amount of Encoder']),
+            '16-bit Channels': str(telegram['16-bit Channels']),
+            'Scale Factor': str(telegram['Scale Factor']),
+            'Scale Factor Offset': str(telegram['Scale Factor Offset']),
+            'Start Angle': str(telegram['Start Angle']),
+            'Angular Increment': str(telegram['Angular Increment']),
+            'Quantity': str(telegram['Quantity']),
+            'Motor encoder': str(telegram['Motor encoder']),
+            'Timestamp': str(telegram['Timestamp']),
+            'Rk': (telegram['Rk']).__repr__(),
+            'Qk': (telegram['Qk']).__repr__(), 
+            'P':  (telegram['P']).__repr__(),
+            'euler': (telegram['euler']).__repr__(),
+            'Ax': str(telegram['Ax']),
+            'Ay': str(telegram['Ay']),
+            'Az': str(telegram['Az']),
+            'Gx': str(telegram['Gx']),
+            'Gy': str(telegram['Gy']),
+            'Gz': str(telegram['Gz']),
+            'Measurement': str(np.asarray(telegram['Measurement']).tolist())
+        }
+        if s.UPLOAD_COMPRESSED:
+            # About 6x smaller than the text, readFromAWS turns it back into Measurement
+            del item['Measurement']
+            item['Ranges'] = codec.encode_ranges(telegram['Measurement'])
+
+        response = self.table.put_item(Item=item)
 
     def readFromAWS(self, name):
         """ Grabs all scans associated with a certain name
@@ -483,6 +459,9 @@ class SENTINEL:
         response = self.table.query(KeyConditionExpression=Key('Name').eq(name))
 
         for scan in response['Items']:
+            if 'Ranges' in scan:
+                ranges = scan.pop('Ranges')
+                scan['Measurement'] = codec.decode_ranges(bytes(getattr(ranges, 'value', ranges)))[0].tolist()
             output.append(scan)
 
         return output 
@@ -501,9 +480,7 @@ class SENTINEL:
         message = input("Enter the custom message here:")
         custom = start + message + end 
         custom = str.encode(custom)
-        sock = connect()
-        sock.send(custom)
-        scan = message_collect(sock)
+        scan = self.lidar_command(custom)
 
         print("Output: ", scan)
 
@@ -516,9 +493,7 @@ class SENTINEL:
         Return:
             None
         """
-        sock = connect()
-        sock.send(READ_FOR_ANGLE_FREQ)
-        scan = message_collect(sock)
+        scan = self.lidar_command(s.READ_FOR_ANGLE_FREQ)
         
         if (len(scan) != 7) or (scan[1] != 'LMPscancfg'):
             print("Something went wrong with the read")
@@ -543,10 +518,7 @@ class SENTINEL:
         Return:
             None
         """
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((s.IP_ADDRESS, s.PORT))
-        sock.send(LOAD_FACTORY_DEFAULTS)
-        scan = message_collect(sock)
+        scan = self.lidar_command(s.LOAD_FACTORY_DEFAULTS)
 
         if (len(scan) != 2) or (scan[1] != 'mSCloadfacdef'):
             print("Something went wrong with the factory reset.")
@@ -561,10 +533,7 @@ class SENTINEL:
         Return:
             None
         """
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((s.IP_ADDRESS, s.PORT))
-        sock.send(REBOOT_TEST)
-        scan = message_collect(sock)
+        scan = self.lidar_command(s.REBOOT_TEST)
 
         if (len(scan) != 2) or (scan[1] != 'mSCreboot'):
             print("Something went wrong with the reboot.")
@@ -580,34 +549,13 @@ class SENTINEL:
             None
         """
 
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((s.IP_ADDRESS, s.PORT))
-        sock.send(s.SAVE_PARAMETERS_PERMANENT)
-        scan = message_collect(sock)
+        scan = self.lidar_command(s.SAVE_PARAMETERS_PERMANENT)
         
         if (len(scan) != 3) or (scan[1] != 'mEEwriteall'):
             print("Something went wrong with the save parameters command")
         else: 
             print("The parameters were written successfully.")
 
-    def read_raw_data(self, addr):
-        """Instantiates the MPU-6050 module 
-
-            Args:
-                None
-            Return:
-                None
-        """
-        high = self.bus.read_byte_data(s.ACCEL_ADDRESS, addr)
-        low = self.bus.read_byte_data(s.ACCEL_ADDRESS, addr + 1)
-
-        value = ((high << 8) | low)
-
-        if (value > 32768):
-            value = value - 65536
-        
-        return value         
-
     def accel_read(self):
         """Reads data from the MPU-6050 module  
 
@@ -618,23 +566,8 @@ class SENTINEL:
                 all 3 axes. Acceleration is in m/s, 
                 gyro is in degrees/s
         """
-        acc_x = self.read_raw_data(s.ACCEL_XOUT_H)
-        acc_y = self.read_raw_data(s.ACCEL_YOUT_H)
-        acc_z = self.read_raw_data(s.ACCEL_ZOUT_H)
-
-        gyro_x = self.read_raw_data(s.GYRO_XOUT_H)
-        gyro_y = self.read_raw_data(s.GYRO_YOUT_H)
-        gyro_z = self.read_raw_data(s.GYRO_ZOUT_H)
-
-        Ax = acc_x / s.ACCEL_CONSTANT
-        Ay = acc_y / s.ACCEL_CONSTANT
-        Az = acc_z / s.ACCEL_CONSTANT
-
-        Gx = gyro_x / s.GYRO_CONSTANT
-        Gy = gyro_y / s.GYRO_CONSTANT
-        Gz = gyro_z / s.GYRO_CONSTANT
-        
-        return Ax, Ay, Az, Gx, Gy, Gz
+        # The sampler thread owns the bus while it runs, so take its newest sample
+        return self.imu.latest()
 
     def manualControl(self): 
         """Enters manual control mode
@@ -660,69 +593,28 @@ class SENTINEL:
             elif (curr == 'q'):
                 break 
 
-    def stopAndGo(self, count):
+    def stopAndGo(self, count, scan_name=None):
         """Runs the stop and go algorithm of Sentinel
 
         Args:
             count: How many scans we want
+            scan_name: Name to store the scans under. Asked for if None, before
+                       scanning starts so scans can be uploaded as they are taken.
         Return:
-            None
+            List of scans
         """
+        if scan_name is None:
+            scan_name = input("Enter the name for the scan: ")
+        return StopAndGoScheduler(self).run(count, scan_name)
 
-        scans = []
-        actualTime = time.time() 
-
-        self.P = np.eye(3)
-        self.Qk = np.diag([s.QK_VAL, s.QK_VAL, s.QK_VAL])
-        self.Rk = np.diag([1, 1, 1])
-        self.counter = 0
-        self.sendToArduino('g')
-        
-        while True:
-            self.A = self.accel_read()
-            self.x, self.P = kalman.Predict(self.x , self.P, [[np.deg2rad(self.A[3])], [np.deg2rad(self.A[4])], [np.deg2rad(self.A[5])]], time.time() - actualTime, self.Qk) #This line should read the gyroscope while the motor is spinning
-            actualTime = time.time()
-            
-            arduinoReply = self.recvLikeArduino()
-            parse = arduinoReply.split(" ")
-
-            if len(parse) != 1 and parse[0] == 'D':
-                time.sleep(0.3)
-                actualTime = time.time()
-                self.counter = self.counter + 1 
-                scan = self.single_parse()
-                scan['Motor encoder'] = parse[1]
-                # theta_motor = (np.pi * (float(scan['Motor encoder']))) / 180.00 #This line needs to be the value from the motor encoder that the arduino sends to the RPi.
-                self.x, self.P = kalman.Correct(self.x , self.P, [[self.A[0]], [self.A[1]], [self.A[2]]], self.Rk) #When the scan is about to be taken, this line should be executed.
-                scan['Rk'] = self.Rk
-                scan['Qk'] = self.Qk 
-                scan['P'] = self.P
-                scan['euler'] = self.x
-                scans.append(scan)
-                self.sendToArduino('g')
-                print("Took a scan!")
-                if (self.counter == count):
-                    # Update the list of scan names
-                    # currentNameHold = self.readFromAWS('NAMES')
-                    # currentNames = currentNameHold[0]['list']
-                    # self.deleteFromAWS('NAMES', '-1')
-                    # currentNames.append(scan_name)
-                    # self.replaceAWSName(scan_name)
-                    scan_name = input("Enter the name for the scan: ")
-                    self.replaceAWSName(scan_name)
-                    # Upload the AWS scans here 
-                    for scan in scans: 
-                        self.uploadToAWS(scan, scan_name)
-                    break
-
-
-    def contbutnot(self, count):
+    def contbutnot(self, count, scan_name=None):
         """Runs the stop and go algorithm of Sentinel
 
         Args:
             count: How many scans we want
+            scan_name: Name to store the scans under. Asked for at the end if None.
         Return:
-            None
+            List of scans
         """
 
         scans = []
@@ -738,13 +630,16 @@ class SENTINEL:
         self.sendToArduino('g')
         
         while True:
-            self.A = self.accel_read()
-            self.x = kalman.GyroIntegrate(self.x ,[[-np.deg2rad(self.A[3])], [np.deg2rad(self.A[4])], [-np.deg2rad(self.A[5])]], time.time() - OuterloopTime) #This line should read the gyroscope while the motor is spinning
-            OuterloopTime = time.time()
+            # The sampler keeps reading the gyroscope, so wait for the next scan instead of spinning
+            time.sleep(max(0, dt - (time.time() - actualTime)))
+            now = time.time()
+            self.x = self.imu.integrate(self.x, OuterloopTime, now) #Integrates every gyro sample taken while the motor was spinning
+            OuterloopTime = now
+            self.A = self.imu.state_at(now)
             
             # arduinoReply = self.recvLikeArduino()
             # parse = arduinoReply.split(" ")
-            if time.time() - actualTime > dt:
+            if now - actualTime >= dt:
                 # time.sleep(0.3)
                 actualTime = time.time()
                 self.counter = self.counter + 1
@@ -780,16 +675,46 @@ class SENTINEL:
                     # currentNames.append(scan_name)
                     # self.replaceAWSName(scan_name)
                     self.sendToArduino('s')
-                    print("About to ask for input")
-                    scan_name = input("Enter the name for the scan: ")
+                    if scan_name is None:
+                        print("About to ask for input")
+                        scan_name = input("Enter the name for the scan: ")
                     self.replaceAWSName(scan_name)
                     # Upload the AWS scans here 
                     for scan in scans: 
                         self.uploadToAWS(scan, scan_name)
                     break
 
-sentinel = SENTINEL()
-# scans = sentinel.live_parse(60)
-# scans = sentinel.stopAndGo(20)
-scans = sentinel.contbutnot(40)
+        return scans
+
+    def acquire(self, count, scan_name=None):
+        """Runs continuous mode with the LIDAR, IMU and Arduino read concurrently
+
+        Args:
+            count: How many scans we want
+            scan_name: Name to store the scans under. Asked for at the end if None.
+        Return:
+            List of scans
+        """
+        self.P = np.eye(3)
+        self.Qk = np.diag([s.QK_VAL, s.QK_VAL, s.QK_VAL])
+        self.Rk = np.diag([s.RK_VAL, s.RK_VAL, s.RK_VAL])
+        self.sendToArduino('g')
+
+        scans = asyncio.run(AcquisitionEngine(self).run(count))
+
+        self.sendToArduino('s')
+        if scan_name is None:
+            scan_name = input("Enter the name for the scan: ")
+        self.replaceAWSName(scan_name)
+        for scan in scans:
+            self.uploadToAWS(scan, scan_name)
+
+        return scans
+
+if __name__ == "__main__":
+    sentinel = SENTINEL()
+    # scans = sentinel.live_parse(60)
+    # scans = sentinel.stopAndGo(20)
+    # scans = sentinel.contbutnot(40)
+    scans = sentinel.acquire(40)
 
@@ -0,0 +1,172 @@
+# Project Sentinel: Framed serial link to the Arduino
+# Harris M
+# March 16, 2020
+
+# Standard library imports
+import time
+import threading
+from collections import deque
+
+import sentinel_reference as s
+
+class FrameParser:
+    """ Pulls <...> framed messages out of a byte stream """
+
+    def __init__(self):
+        """Sets up an empty buffer
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.buf = bytearray()
+        self.start = s.startSentinel.encode('utf-8')
+        self.end = s.endSentinel.encode('utf-8')
+
+    def feed(self, data):
+        """Adds received bytes and returns every message they complete
+
+            Args:
+                data (bytes): Bytes read from the serial port
+            Return:
+                List of message strings without the markers
+        """
+        self.buf += data
+        messages = []
+        while True:
+            first = self.buf.find(self.start)
+            if first == -1:
+                # Anything outside the markers is thrown away
+                del self.buf[:]
+                break
+            last = self.buf.find(self.end, first)
+            if last == -1:
+                del self.buf[:first]
+                break
+            messages.append(self.buf[first + 1:last].decode('utf-8', 'replace'))
+            del self.buf[:last + 1]
+        return messages
+
+class ArduinoLink:
+    """ Reads the Arduino serial port on its own thread and queues complete messages """
+
+    def __init__(self, port):
+        """Starts reading from an open serial port
+
+            Args:
+                port (Serial): Serial port to the Arduino. A read timeout should be
+                               set so the reader thread can notice close().
+            Return:
+                None
+        """
+        self.port = port
+        self.parser = FrameParser()
+        self.messages = deque(maxlen=s.SERIAL_QUEUE_SIZE)
+        self.ready = threading.Condition()
+        self.callbacks = []
+        self.running = True
+        self.reader = threading.Thread(target=self.read_loop, name='arduino_link', daemon=True)
+        self.reader.start()
+
+    def close(self):
+        """Stops the reader thread
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.running = False
+        self.reader.join()
+
+    def send(self, stringToSend):
+        """Sends a string to the Arduino wrapped in the start and end markers
+
+            Args:
+                stringToSend (string): The string we want to send
+            Return:
+                None
+        """
+        self.port.write((s.startSentinel + stringToSend + s.endSentinel).encode('utf-8'))
+
+    def subscribe(self, callback):
+        """Calls back with every message as soon as it is received. Messages handed
+        to a callback are not queued for receive().
+
+            Args:
+                callback (function): Called from the reader thread with the message
+            Return:
+                None
+        """
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stops calling a callback
+
+            Args:
+                callback (function): Callback passed to subscribe()
+            Return:
+                None
+        """
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def receive(self, timeout=None):
+        """Takes the oldest queued message, waiting for one if needed
+
+            Args:
+                timeout (float): Seconds to wait, None to wait forever, 0 to not wait
+            Return:
+                The message, or None if nothing arrived in time
+        """
+        with self.ready:
+            if not self.ready.wait_for(lambda: len(self.messages) > 0, timeout):
+                return None
+            return self.messages.popleft()
+
+    def wait_for(self, text, timeout=None):
+        """Waits for a message containing some text, discarding the ones before it
+
+            Args:
+                text (string): Text to look for
+                timeout (float): Seconds to wait in total, None to wait forever
+            Return:
+                The matching message, or None if it did not arrive in time
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0, deadline - time.time())
+            msg = self.receive(remaining)
+            if msg is None or msg.find(text) != -1:
+                return msg
+            print(msg)
+
+    def read_loop(self):
+        """Reader thread: reads everything the port has in one call and parses it
+
+            Args:
+                None
+            Return:
+                None
+        """
+        while self.running:
+            # Blocks for the first byte (up to the port timeout), then takes the rest
+            data = self.port.read(max(self.port.inWaiting(), 1))
+            if len(data) == 0:
+                continue
+
+            for msg in self.parser.feed(data):
+                if len(self.callbacks) > 0:
+                    for callback in list(self.callbacks):
+                        callback(msg)
+                    continue
+                with self.ready:
+                    # When the queue is full the oldest message is dropped
+                    self.messages.append(msg)
+                    self.ready.notify()
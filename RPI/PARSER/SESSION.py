@@ -0,0 +1,363 @@
+# Project Sentinel: Persistent connection to the TiM781
+# Harris M
+# March 12, 2020
+
+# Standard library imports
+import socket
+import struct
+import threading
+import time
+import queue
+import numpy as np
+
+import sentinel_reference as s
+from FRAMER import TelegramFramer, BinaryFramer
+
+def frame_binary(payload):
+    """Wraps a command payload in a binary (CoLa-B) frame
+
+        Args:
+            payload (bytes): Command without any framing, e.g. b'sRN LMPscancfg'
+        Return:
+            Four STX bytes, the payload length, the payload and its XOR checksum
+    """
+    checksum = np.bitwise_xor.reduce(np.frombuffer(payload, dtype=np.uint8))
+    return s.BINARY_STX + struct.pack('>I', len(payload)) + payload + bytes([checksum])
+
+class SensorSession:
+    """ One long-lived connection that every LIDAR command goes through """
+
+    def __init__(self, ip=s.IP_ADDRESS, binary=False, port=None):
+        """Sets up the session. Nothing is opened until the first command.
+
+            Args:
+                ip (string): IP address of the sensor
+                binary (bool): Use binary (CoLa-B) framing instead of ASCII (CoLa-A)
+                port (int): Port of the sensor. The standard port for the protocol if None.
+            Return:
+                None
+        """
+        self.ip = ip
+        self.binary = binary
+        if port is not None:
+            self.port = port
+        elif binary:
+            self.port = s.BINARY_PORT
+        else:
+            self.port = s.PORT
+
+        self.sock = None
+        self.framer = None
+        self.generation = 0
+        self.running = False
+        self.reader = None
+        self.lock = threading.RLock()
+        self.pending = []           # (reply key, waiter) in the order they were sent
+        self.subscriptions = {}     # event name -> list of callbacks
+        self.subscribing = {}       # event name -> Event set once its sEN is answered
+        self.acknowledgements = {}  # event name -> the sensor's answer to its sEN
+
+    def connect(self):
+        """Opens the connection and starts the reader thread, if not already done
+
+            Args:
+                None
+            Return:
+                None
+        """
+        with self.lock:
+            if self.sock is not None:
+                return
+
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.connect((self.ip, self.port))
+            self.sock = sock
+            if self.binary:
+                self.framer = BinaryFramer(sock)
+            else:
+                self.framer = TelegramFramer(sock)
+            self.generation += 1
+
+            # Re-subscribe after a reconnect. The acknowledgements have no waiter
+            # and are dropped by dispatch(). Events still being turned on are left
+            # to their own request.
+            for name in self.subscriptions:
+                if name not in self.subscribing:
+                    self.sock.sendall(self.event_command(name, True))
+
+            if not self.running:
+                self.running = True
+                self.reader = threading.Thread(target=self.read_loop, name='sensor_session', daemon=True)
+                self.reader.start()
+
+    def close(self):
+        """Stops the reader thread and closes the connection
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.running = False
+        with self.lock:
+            self.drop_connection()
+        if self.reader is not None and self.reader is not threading.current_thread():
+            self.reader.join()
+        self.reader = None
+
+    def drop_connection(self):
+        """Closes the current socket and fails every request still waiting on it
+
+            Args:
+                None
+            Return:
+                None
+        """
+        with self.lock:
+            if self.sock is not None:
+                try:
+                    self.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self.sock.close()
+            self.sock = None
+            self.framer = None
+
+            for key, waiter in self.pending:
+                waiter.put(None)
+            self.pending = []
+
+    def reconnect(self, generation):
+        """Replaces a broken connection, retrying until the sensor answers
+
+            Args:
+                generation (int): Generation of the connection that failed. If it
+                                  has already been replaced nothing is done.
+            Return:
+                None
+        """
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.drop_connection()
+
+        while self.running:
+            try:
+                self.connect()
+                print("Reconnected to the LIDAR")
+                return
+            except OSError:
+                time.sleep(s.RECONNECT_DELAY)
+
+    def encode(self, command):
+        """Frames a command for the protocol this session speaks
+
+            Args:
+                command (bytes): An ASCII framed command such as s.REQUEST_SINGLE_SCAN,
+                                 or an already binary framed one
+            Return:
+                The bytes to put on the wire
+        """
+        if command.startswith(s.BINARY_STX) or not self.binary:
+            return command
+        return frame_binary(command.strip(s.STX + s.ETX))
+
+    def event_command(self, name, enable):
+        """Builds the command that turns an event on or off
+
+            Args:
+                name (bytes): Event name, e.g. b'LMDscandata'
+                enable (bool): True to turn the event on, False to turn it off
+            Return:
+                The framed command
+        """
+        if self.binary:
+            return frame_binary(b'sEN ' + name + b' ' + bytes([int(enable)]))
+        return s.STX + b'sEN ' + name + b' ' + str(int(enable)).encode() + s.ETX
+
+    def reply_key(self, command):
+        """Works out which reply answers a command
+
+            Args:
+                command (bytes): The command as passed to request()
+            Return:
+                (reply type, name) tuple, or None if any reply will do
+        """
+        if command.startswith(s.BINARY_STX):
+            payload = command[8:-1]
+        else:
+            payload = command.strip(s.STX + s.ETX)
+
+        tokens = payload.split(b' ', 2)
+        reply = s.REPLY_TYPES.get(tokens[0], None)
+        if reply is None or len(tokens) < 2:
+            return None
+        return (reply, tokens[1])
+
+    def send(self, command):
+        """Sends a command, reconnecting once if the connection has gone away
+
+            Args:
+                command (bytes): The command to send
+            Return:
+                None
+        """
+        for attempt in range(2):
+            generation = self.generation
+            try:
+                self.connect()
+                self.sock.sendall(self.encode(command))
+                return
+            except OSError:
+                with self.lock:
+                    if generation == self.generation:
+                        self.drop_connection()
+        raise ConnectionError("Could not send command to the LIDAR")
+
+    def request(self, command, timeout=s.SESSION_TIMEOUT):
+        """Sends a command and waits for its reply
+
+            Args:
+                command (bytes): An ASCII framed command such as s.READ_FOR_ANGLE_FREQ
+                timeout (float): Seconds to wait for the reply
+            Return:
+                The reply payload as bytes, or None if no reply came back
+        """
+        waiter = queue.Queue(1)
+        entry = (self.reply_key(command), waiter)
+        # The reader thread cannot match the reply until the lock is released,
+        # so registering the waiter after sending is safe
+        with self.lock:
+            try:
+                self.send(command)
+            except ConnectionError:
+                print("Could not reach the LIDAR")
+                return None
+            self.pending.append(entry)
+
+        try:
+            reply = waiter.get(timeout=timeout)
+        except queue.Empty:
+            with self.lock:
+                if entry in self.pending:
+                    self.pending.remove(entry)
+            print("The LIDAR did not answer in time")
+            return None
+
+        if reply is None:
+            print("The connection to the LIDAR dropped before it answered")
+        return reply
+
+    def subscribe(self, name, callback):
+        """Turns on an event and calls back with every telegram it sends
+
+            Args:
+                name (bytes): Event name, e.g. b'LMDscandata'
+                callback (function): Called from the reader thread with a memoryview
+                                     of each event telegram. The view is only valid
+                                     until the callback returns.
+            Return:
+                The acknowledgement, or None if the sensor did not answer
+        """
+        # Registered before the event is turned on, so no telegram sent right
+        # after the acknowledgement can be missed
+        with self.lock:
+            callbacks = self.subscriptions.setdefault(name, [])
+            callbacks.append(callback)
+            done = self.subscribing.get(name)
+            first = done is None and len(callbacks) == 1
+            if first:
+                done = self.subscribing[name] = threading.Event()
+
+        if not first:
+            # The event is on already, or another caller is turning it on
+            if done is not None:
+                done.wait()
+            with self.lock:
+                return self.acknowledgements.get(name)
+
+        reply = self.request(self.event_command(name, True))
+        with self.lock:
+            del self.subscribing[name]
+            if reply is None:
+                # The event is not on, so nobody registered for it will hear anything
+                self.subscriptions.pop(name, None)
+            else:
+                self.acknowledgements[name] = reply
+        done.set()
+        return reply
+
+    def unsubscribe(self, name, callback=None):
+        """Removes a callback, turning the event off once nobody listens to it
+
+            Args:
+                name (bytes): Event name, e.g. b'LMDscandata'
+                callback (function): Callback to remove, or None to remove them all
+            Return:
+                None
+        """
+        with self.lock:
+            callbacks = self.subscriptions.get(name, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if callback is None or len(callbacks) == 0:
+                self.subscriptions.pop(name, None)
+                self.acknowledgements.pop(name, None)
+            else:
+                return
+        self.request(self.event_command(name, False))
+
+    def dispatch(self, frame):
+        """Hands a received telegram to whoever is waiting for it
+
+            Args:
+                frame (memoryview): Telegram payload without framing
+            Return:
+                None
+        """
+        tokens = bytes(frame[:s.SESSION_PEEK]).split(b' ', 2)
+
+        if tokens[0] == s.EVENT_TYPE:
+            for callback in list(self.subscriptions.get(tokens[1], [])):
+                callback(frame)
+            return
+
+        key = None
+        if len(tokens) > 1:
+            key = (tokens[0], tokens[1])
+
+        with self.lock:
+            for entry in self.pending:
+                # Errors carry no command name, so they answer the oldest request
+                if entry[0] is None or entry[0] == key or tokens[0] == s.ERROR_TYPE:
+                    self.pending.remove(entry)
+                    entry[1].put(bytes(frame))
+                    return
+
+    def read_loop(self):
+        """Reader thread: pulls telegrams off the socket for as long as the session runs
+
+            Args:
+                None
+            Return:
+                None
+        """
+        while self.running:
+            with self.lock:
+                framer = self.framer
+                generation = self.generation
+
+            if framer is None:
+                self.reconnect(generation)
+                continue
+
+            try:
+                frame = framer.read()
+            except OSError:
+                if self.running:
+                    print("Lost the connection to the LIDAR, reconnecting")
+                    self.reconnect(generation)
+                continue
+
+            self.dispatch(frame)
@@ -2,21 +2,51 @@
 # Harris M 
 # February 12, 2020
 
-# Libraries 
-import serial 
-
 # Port constants
 PORT = 2112 
 IP_ADDRESS = '169.254.100.100'
 REQUEST_SINGLE_SCAN = b'\x02sRN LMDscandata\x03'  
 REQUEST_CONT_SCAN = b'\x02sEN LMDscandata 1\x03'
 STOP_CONT_SCAN = b'\x02sEN LMDscandata 0\x03'
+STX = b'\x02'
+ETX = b'\x03'
+FRAMER_BUFFER_SIZE = 65536
+
+# Binary (CoLa-B) constants. Frames are four STX bytes, a big-endian payload
+# length, the payload and an XOR checksum of the payload.
+BINARY_PORT = 2111
+BINARY_STX = b'\x02\x02\x02\x02'
+BINARY_MAX_LENGTH = 65536
+REQUEST_SINGLE_SCAN_BINARY = b'\x02\x02\x02\x02\x00\x00\x00\x0fsRN LMDscandata\x05'
+REQUEST_CONT_SCAN_BINARY = b'\x02\x02\x02\x02\x00\x00\x00\x11sEN LMDscandata \x01\x33'
+STOP_CONT_SCAN_BINARY = b'\x02\x02\x02\x02\x00\x00\x00\x11sEN LMDscandata \x00\x32'
+
+# Configuration commands
+LOG_IN_CLIENT = b'\x02sMN SetAccessMode 03 F4724744\x03'
+LOG_OUT = b'\x02sMN Run\x03'
+READ_FOR_ANGLE_FREQ = b'\x02sRN LMPscancfg\x03'
+LOAD_FACTORY_DEFAULTS = b'\x02sMN mSCloadfacdef\x03'
+REBOOT_TEST = b'\x02sMN mSCreboot\x03'
+SAVE_PARAMETERS_PERMANENT = b'\x02sMN mEEwriteall\x03'
+
+# Session constants. Replies are matched to requests by command type and name.
+REPLY_TYPES = {b'sRN': b'sRA',
+               b'sWN': b'sWA',
+               b'sMN': b'sAN',
+               b'sEN': b'sEA'}
+EVENT_TYPE = b'sSN'
+ERROR_TYPE = b'sFA'
+SESSION_PEEK = 64
+SESSION_TIMEOUT = 5.0
+RECONNECT_DELAY = 1.0
 
 # Sensor constants
 MICROSECOND = 10**(-6)
 ANGLE_STOP = 10**(4)
 SCALE_FACTOR = {'3F800000': '1x',
                 '40000000': '2x' }
+RING_CAPACITY = 1024
+RING_BEAMS = 811
             
 # RPI CONSTANTS 
 PWR_MGMT_1 = 0x6B 
@@ -30,6 +60,19 @@ ACCEL_ZOUT_H = 0x3F
 GYRO_XOUT_H = 0x43
 GYRO_YOUT_H = 0x45
 GYRO_ZOUT_H = 0x47
+INT_STATUS = 0x3A
+USER_CTRL = 0x6A
+FIFO_EN = 0x23
+FIFO_COUNT_H = 0x72
+FIFO_R_W = 0x74
+FIFO_ACCEL_GYRO = 0x78
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+INT_STATUS_FIFO_OFLOW = 0x10
+IMU_BLOCK_SIZE = 14
+FIFO_SAMPLE_SIZE = 12
+I2C_BLOCK_MAX = 32
+GYRO_OUTPUT_RATE = 8000
 ARDUINO_PORT = '/dev/ttyACM0'
 ARDUINO_BAUD = 115200
 
@@ -38,6 +81,58 @@ ACCEL_CONSTANT = 16384.0
 GYRO_CONSTANT = 131.0
 ACCEL_ADDRESS = 0x68
 ACCEL_BUS_ADDRESS = 3
+IMU_RATE = 500
+IMU_CAPACITY = 4096
+IMU_FIFO_PERIOD = 0.01
+
+# STOP AND GO CONSTANTS
+SCHEDULER_TIMEOUT = 1.0
+SETTLE_RATE = 2.0
+SETTLE_WINDOW = 0.05
+SETTLE_TIMEOUT = 0.5
+SETTLE_POLL = 0.005
+
+# LIVE MODE CONSTANTS
+LIVE_QUEUE_SIZE = 8         # scans waiting between the reader and live_parse
+LIVE_POLICY = 'drop'        # 'drop' the oldest, 'decimate' or 'slow' the mechanism
+LIVE_DECIMATE = 2           # keep every Nth scan when decimating
+LIVE_HIGH_WATER = 6         # 'slow' pauses the mechanism at this many waiting scans
+LIVE_LOW_WATER = 2          # and starts it again once down to this many
+LIVE_TIMEOUT = 5.0
+
+# MULTI-SENSOR CONSTANTS
+# (sensor ID, IP address, 4x4 transform from the sensor's frame to the rig's).
+# The under-desk sensor's transform is the identity until its mount is measured.
+SENSORS = [('upper', IP_ADDRESS, [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]),
+           ('lower', '169.254.100.101', [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])]
+MULTI_MERGE_DELAY = 0.1     # seconds to hold a scan back for a sensor that is behind
+MULTI_SELECT_TIMEOUT = 0.05
+SENSOR_CLOCK_WRAP = 2**32   # the microsecond clocks are 32 bits wide
+SENSOR_CLOCK_SLACK = 60 * 10**6   # a backwards jump is a rollover only if the clock was this close to wrapping
+
+# LOG INGEST CONSTANTS
+INGEST_CHUNKS_PER_WORKER = 4   # more chunks than workers evens out uneven lines
+
+# ENCODER ALIGNMENT CONSTANTS
+ENCODER_TIME_SCALE = 10**(-3)   # the encoder log counts milliseconds
+ENCODER_CAPACITY = 4096
+
+# RECORDING CONSTANTS
+RECORDING_MAGIC = b'SNTLREC\x01'
+RECORDING_VERSION = 2       # 2 keeps the status bytes per scan
+RECORDING_CHUNK = 64        # scans per SCAN record
+RECORDING_COMPRESS = True   # code the ranges of new recordings with CODEC
+RECORDING_DECODED = 4       # chunks of decoded ranges a reader keeps
+
+# RANGE CODEC CONSTANTS
+CODEC_DEFLATE = True
+CODEC_LEVEL = 6
+UPLOAD_COMPRESSED = False   # upload ranges as a coded 'Ranges' binary instead of 'Measurement' text
+
+# PARSE CACHE CONSTANTS
+PARSER_VERSION = 1          # bump whenever parsing changes, to retire cached results
+CACHE_DIR = '.sentinel_cache'
+CACHE_BLOCK_SIZE = 2**20
 QK_VAL = 8.0
 RK_VAL = 1.0
 
@@ -50,3 +145,6 @@ TABLE_NAME = 'SENTINEL'
 # SERIAL BUS CONSTANTS 
 startSentinel = '<'
 endSentinel = '>'
+SERIAL_READ_TIMEOUT = 0.1
+SERIAL_POLL_TIMEOUT = 0.05
+SERIAL_QUEUE_SIZE = 256
@@ -0,0 +1,77 @@
+#Created by: Harris M
+#Project Sentinel; Beam Geometry Tables
+#Created: March 27th, 2020
+#The start angle, angle increment and beam count of the LIDAR almost never change within a session, so the angle, cosine and sine of every beam
+#only have to be worked out once per configuration. The q-angle only depends on the sum of the motor angle and the beam angle, so it is tabulated
+#over one turn and interpolated.
+import numpy as np
+from functools import lru_cache
+
+BEAM_CACHE_SIZE = 16 #number of (start, increment, count) configurations kept
+Q_GRID_SIZE = 4096 #samples of the q-angle over one turn, enough to keep the interpolation error below 1e-6 radians
+
+###################################################################################################################################################################
+#Function: BeamTable
+#Purpose: the angle, cosine and sine of every beam of a scan configuration. The most recently used configurations are kept.
+#Inputs:
+    #start, the start angle of the scan, in radians
+    #increment, the angle increment of the scan, in radians
+    #count, the number of beams
+#Outputs:
+    #angles, cos, sin, read-only numpy arrays with one entry per beam
+@lru_cache(maxsize=BEAM_CACHE_SIZE)
+def BeamTable(start, increment, count):
+    angles = start + np.arange(count)*increment
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    for table in (angles, cos, sin):
+        table.setflags(write=False)
+    return(angles, cos, sin)
+
+###################################################################################################################################################################
+#Function: BeamTables
+#Purpose: the beam tables for a batch of scans, one row per scan
+#Inputs:
+    #start, a numpy array of the start angle of each scan, in radians
+    #increment, a numpy array of the angle increment of each scan, in radians
+    #width, the number of beams per row
+#Outputs:
+    #angles, cos, sin, (scans, width) numpy arrays
+def BeamTables(start, increment, width):
+    configurations = np.stack([np.asarray(start, dtype=np.float64), np.asarray(increment, dtype=np.float64)], axis=-1).reshape(-1, 2)
+    (unique, inverse) = np.unique(configurations, axis=0, return_inverse=True)
+    tables = [BeamTable(float(first), float(step), int(width)) for (first, step) in unique]
+    inverse = inverse.reshape(-1)
+    angles = np.asarray([table[0] for table in tables]).reshape(len(unique), width)[inverse]
+    cos = np.asarray([table[1] for table in tables]).reshape(len(unique), width)[inverse]
+    sin = np.asarray([table[2] for table in tables]).reshape(len(unique), width)[inverse]
+    return(angles, cos, sin)
+
+###################################################################################################################################################################
+#Function: QTable
+#Purpose: sample a q-angle function over one turn
+#Inputs:
+    #function, a function of (theta, phi) that only depends on theta+phi, such as RANSAC.calculateQ
+    #size, the number of samples
+#Outputs:
+    #grid, values, read-only numpy arrays of the sample angles and the q-angle at each
+@lru_cache(maxsize=4)
+def QTable(function, size=Q_GRID_SIZE):
+    grid = np.linspace(0, 2*np.pi, size+1)
+    values = np.asarray(function(grid, 0), dtype=np.float64)
+    grid.setflags(write=False)
+    values.setflags(write=False)
+    return(grid, values)
+
+###################################################################################################################################################################
+#Function: InterpolateQ
+#Purpose: look up the q-angle for many beams at once from the table instead of evaluating it
+#Inputs:
+    #function, the q-angle function the table is made from, such as RANSAC.calculateQ
+    #theta, the mechanism motor's angle, in radians. Broadcasts against phi.
+    #phi, the beam angle, in radians
+#Outputs:
+    #q, a numpy array of q-angles in radians
+def InterpolateQ(function, theta, phi):
+    (grid, values) = QTable(function)
+    return(np.interp(np.mod(np.add(theta, phi), 2*np.pi), grid, values))
@@ -0,0 +1,161 @@
+#Created by: Harris M
+#Project Sentinel; Normal Estimation
+#Created: March 30th, 2020
+#Normals come from the covariance of each point's neighbourhood: the normal is the direction the neighbours spread the least in. On a range image
+#the neighbourhood is a window of scans and beams, and the sums that make up every window's covariance are read off integral images, so the
+#cost is the same for any window size. Clouds without a grid fall back to the k nearest neighbours.
+import numpy as np
+
+###################################################################################################################################################################
+#Function: IntegralImage
+#Purpose: running sums over the rows and columns of an image, padded with a leading row and column of zeros
+#Inputs:
+    #values, a (rows, columns, ...) numpy array
+#Outputs:
+    #integral, a (rows+1, columns+1, ...) numpy array where integral[r, c] is the sum of values[:r, :c]
+def IntegralImage(values):
+    integral = np.zeros((values.shape[0]+1, values.shape[1]+1) + values.shape[2:])
+    integral[1:, 1:] = np.cumsum(np.cumsum(values, axis=0), axis=1)
+    return(integral)
+
+###################################################################################################################################################################
+#Function: WindowSums
+#Purpose: the sum over the window around every pixel from an integral image, with the windows cut off at the edges
+#Inputs:
+    #integral, an integral image from IntegralImage
+    #radius, the number of rows and columns either side of each pixel in its window
+#Outputs:
+    #sums, a (rows, columns, ...) numpy array
+def WindowSums(integral, radius):
+    rows = np.arange(integral.shape[0]-1)
+    columns = np.arange(integral.shape[1]-1)
+    top = np.clip(rows-radius, 0, len(rows))[:, None]
+    bottom = np.clip(rows+radius+1, 0, len(rows))[:, None]
+    left = np.clip(columns-radius, 0, len(columns))[None, :]
+    right = np.clip(columns+radius+1, 0, len(columns))[None, :]
+    return(integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left])
+
+###################################################################################################################################################################
+#Function: CovarianceNormals
+#Purpose: the normal and curvature for a stack of neighbourhood covariances
+#Inputs:
+    #covariance, an (N, 3, 3) numpy array
+#Outputs:
+    #normals, an (N, 3) numpy array of unit normals, the eigenvector of the smallest eigenvalue
+    #curvature, an (N,) numpy array, the smallest eigenvalue over the sum of the eigenvalues. 0 on a plane, up to 1/3 for scattered points.
+def CovarianceNormals(covariance):
+    (values, vectors) = np.linalg.eigh(covariance)
+    normals = vectors[:, :, 0]
+    total = values.sum(axis=1)
+    curvature = np.where(total > 0, values[:, 0]/np.where(total > 0, total, 1), 0.0)
+    return(normals, curvature)
+
+###################################################################################################################################################################
+#Function: OrientNormals
+#Purpose: flip normals so that they all face the sensor
+#Inputs:
+    #normals, an (N, 3) numpy array
+    #points, an (N, 3) numpy array of the points the normals belong to
+    #viewpoint, an (N, 3) array or a single 3 vector, where the sensor was for each point
+#Outputs:
+    #normals, the (N, 3) numpy array with flipped rows where needed
+def OrientNormals(normals, points, viewpoint):
+    facing = np.einsum('ij,ij->i', normals, np.asarray(viewpoint, dtype=np.float64) - points)
+    return(np.where(facing[:, None] < 0, -normals, normals))
+
+###################################################################################################################################################################
+#Function: ImageNormals
+#Purpose: the normal and curvature of every valid point of a range image, from the window of scans and beams around it
+#Inputs:
+    #image, a RANGEIMAGE.RangeImage
+    #radius, the number of scans and beams either side of each point to include, 1 for a 3x3 window
+    #MIN_POINTS, the fewest valid points a window needs for a normal
+    #viewpoint, a single 3 vector the normals are turned to face. Defaults to each scan's sensor position when the image has one, else the origin.
+#Outputs:
+    #normals, an Nx3 numpy array, in the order of image.Points(). Rows are nan where the window had too few points.
+    #curvature, an (N,) numpy array, nan where normals are
+def ImageNormals(image, radius=1, MIN_POINTS=3, viewpoint=None):
+    valid = image.valid
+    centre = image.Points().mean(axis=0) if valid.any() else np.zeros(3) #keeps the sums small, so the covariances lose no precision
+    points = np.where(valid[..., None], image.points - centre, 0.0)
+
+    count = WindowSums(IntegralImage(valid.astype(np.float64)), radius)
+    first = WindowSums(IntegralImage(points), radius)
+    second = WindowSums(IntegralImage(points[..., :, None]*points[..., None, :]), radius)
+
+    enough = valid & (count >= MIN_POINTS)
+    n = count[enough][:, None, None]
+    mean = first[enough]/n[:, :, 0]
+    covariance = second[enough]/n - mean[:, :, None]*mean[:, None, :]
+    (normals, curvature) = CovarianceNormals(covariance)
+
+    if viewpoint is None:
+        if image.translation is not None:
+            viewpoint = np.broadcast_to(image.translation[:, None, :], image.points.shape)[enough]
+        else:
+            viewpoint = np.zeros(3)
+    normals = OrientNormals(normals, image.points[enough], viewpoint)
+
+    normal_image = np.full(image.points.shape, np.nan)
+    curvature_image = np.full(valid.shape, np.nan)
+    normal_image[enough] = normals
+    curvature_image[enough] = curvature
+    return(normal_image[valid], curvature_image[valid])
+
+###################################################################################################################################################################
+#Function: NearestNeighbours
+#Purpose: the indices of the k nearest neighbours of every point, with a KD-tree when scipy is installed and in blocks of brute force when it is not
+#Inputs:
+    #points, an Nx3 numpy array
+    #k, the number of neighbours, counting the point itself
+    #BLOCK, the number of points compared at once without scipy
+#Outputs:
+    #neighbours, an (N, k) numpy array of indices into points
+def NearestNeighbours(points, k, BLOCK=1024):
+    k = min(k, len(points))
+    try:
+        from scipy.spatial import cKDTree #Only needed for unorganized clouds
+    except ImportError:
+        neighbours = np.zeros((len(points), k), dtype=np.int64)
+        for start in range(0, len(points), BLOCK):
+            block = points[start:start+BLOCK]
+            distance = ((block[:, None, :] - points[None, :, :])**2).sum(axis=2)
+            neighbours[start:start+BLOCK] = np.argpartition(distance, k-1, axis=1)[:, :k]
+        return(neighbours)
+    (distance, neighbours) = cKDTree(points).query(points, k=k)
+    return(np.asarray(neighbours).reshape(len(points), k))
+
+###################################################################################################################################################################
+#Function: KNNNormals
+#Purpose: the normal and curvature of every point of a cloud without a grid, from its k nearest neighbours
+#Inputs:
+    #points, an Nx3 numpy array
+    #k, the number of neighbours, counting the point itself
+    #viewpoint, a single 3 vector or Nx3 array the normals are turned to face, the origin by default
+#Outputs:
+    #normals, an Nx3 numpy array
+    #curvature, an (N,) numpy array
+def KNNNormals(points, k=10, viewpoint=[0.0, 0.0, 0.0]):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) < 3:
+        return(np.full(points.shape, np.nan), np.full(len(points), np.nan))
+    neighbourhood = points[NearestNeighbours(points, k)]
+    centred = neighbourhood - neighbourhood.mean(axis=1, keepdims=True)
+    covariance = np.einsum('nki,nkj->nij', centred, centred)/neighbourhood.shape[1]
+    (normals, curvature) = CovarianceNormals(covariance)
+    return(OrientNormals(normals, points, viewpoint), curvature)
+
+###################################################################################################################################################################
+#Function: EstimateNormals
+#Purpose: the normal and curvature of every point, using the grid when there is one
+#Inputs:
+    #cloud, a RANGEIMAGE.RangeImage, or an Nx3 array of points
+    #radius, the window radius for range images
+    #k, the number of neighbours for other clouds
+#Outputs:
+    #normals, an Nx3 numpy array, for range images in the order of image.Points()
+    #curvature, an (N,) numpy array
+def EstimateNormals(cloud, radius=1, k=10):
+    if hasattr(cloud, 'valid') and hasattr(cloud, 'points'):
+        return(ImageNormals(cloud, radius))
+    return(KNNNormals(cloud, k))
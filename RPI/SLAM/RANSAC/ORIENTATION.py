@@ -0,0 +1,113 @@
+#Created by: Harris M
+#Project Sentinel; Batched Orientation Functions
+#Created: March 28th, 2020
+#Every function here works on a stack of K orientations at once, so a whole session can be rotated with a handful of array operations instead of
+#building each 3x3 matrix from lists. Rotation stacks are (K, 3, 3) numpy arrays and broadcast against a single (3, 3) matrix.
+import numpy as np
+
+###################################################################################################################################################################
+#Function: AxisRotations
+#Purpose: the rotation matrices for K angles about one axis. Same matrices as RANSAC.Rotate, built all at once.
+#Inputs:
+    #angles, an array of K angles in radians
+    #axis, a 3x1 unit vector, e.g. [[1],[0],[0]]
+#Outputs:
+    #rotations, a (K, 3, 3) numpy array
+def AxisRotations(angles, axis):
+    (v1, v2, v3) = np.asarray(axis, dtype=np.float64).reshape(3)
+    angles = np.asarray(angles, dtype=np.float64).reshape(-1)
+    cp = np.cos(angles)
+    sp = np.sin(angles)
+
+    rotations = np.empty((len(angles), 3, 3))
+    rotations[:, 0, 0] = v1**2+(1-v1**2)*cp
+    rotations[:, 0, 1] = (1-cp)*v1*v2-v3*sp
+    rotations[:, 0, 2] = (1-cp)*v1*v3+v2*sp
+    rotations[:, 1, 0] = (1-cp)*v1*v2+v3*sp
+    rotations[:, 1, 1] = v2**2+(1-v2**2)*cp
+    rotations[:, 1, 2] = (1-cp)*v2*v3-v1*sp
+    rotations[:, 2, 0] = (1-cp)*v1*v3-v2*sp
+    rotations[:, 2, 1] = (1-cp)*v2*v3+v1*sp
+    rotations[:, 2, 2] = v3**2+(1-v3**2)*cp
+    return(rotations)
+
+###################################################################################################################################################################
+#Function: Compose
+#Purpose: multiply rotation stacks together, left to right, one product per orientation
+#Inputs:
+    #rotations, any number of (K, 3, 3) stacks or single (3, 3) matrices
+#Outputs:
+    #rotation, a (K, 3, 3) numpy array, rotations[0] @ rotations[1] @ ...
+def Compose(*rotations):
+    rotation = np.asarray(rotations[0], dtype=np.float64)
+    for other in rotations[1:]:
+        rotation = np.einsum('...ij,...jk->...ik', rotation, np.asarray(other, dtype=np.float64))
+    return(rotation)
+
+###################################################################################################################################################################
+#Function: EulerToRotation
+#Purpose: the local to global rotation for each of K sets of euler angles, Rphi @ Rtheta @ Rpsi as ConvertToCartesianEulerAngles has always used
+#Inputs:
+    #euler, a (K, 3) array of phi, theta and psi in radians. A single 3x1 orientation state is accepted too.
+#Outputs:
+    #rotations, a (K, 3, 3) numpy array
+def EulerToRotation(euler):
+    euler = np.asarray(euler, dtype=np.float64).reshape(-1, 3)
+    Rphi = AxisRotations(euler[:, 0], [[1],[0],[0]])
+    Rtheta = AxisRotations(euler[:, 1], [[0],[1],[0]])
+    Rpsi = AxisRotations(euler[:, 2], [[0],[0],[1]])
+    return(Compose(Rphi, Rtheta, Rpsi))
+
+###################################################################################################################################################################
+#Function: QuaternionToRotation
+#Purpose: the rotation matrix for each of K quaternions
+#Inputs:
+    #quaternions, a (K, 4) array of (w, x, y, z). They do not need to be normalized.
+#Outputs:
+    #rotations, a (K, 3, 3) numpy array
+def QuaternionToRotation(quaternions):
+    quaternions = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    quaternions = quaternions/np.linalg.norm(quaternions, axis=1, keepdims=True)
+    (w, x, y, z) = quaternions.T
+
+    rotations = np.empty((len(quaternions), 3, 3))
+    rotations[:, 0, 0] = 1-2*(y*y+z*z)
+    rotations[:, 0, 1] = 2*(x*y-w*z)
+    rotations[:, 0, 2] = 2*(x*z+w*y)
+    rotations[:, 1, 0] = 2*(x*y+w*z)
+    rotations[:, 1, 1] = 1-2*(x*x+z*z)
+    rotations[:, 1, 2] = 2*(y*z-w*x)
+    rotations[:, 2, 0] = 2*(x*z-w*y)
+    rotations[:, 2, 1] = 2*(y*z+w*x)
+    rotations[:, 2, 2] = 1-2*(x*x+y*y)
+    return(rotations)
+
+###################################################################################################################################################################
+#Function: SplitTransforms
+#Purpose: split 4x4 homogeneous transforms, such as the sensor transforms in sentinel_reference.SENSORS, into rotations and translations
+#Inputs:
+    #transforms, a (K, 4, 4) array, or a single 4x4 transform
+#Outputs:
+    #rotations, a (K, 3, 3) numpy array
+    #translations, a (K, 3) numpy array
+def SplitTransforms(transforms):
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4, 4)
+    return(transforms[:, :3, :3], transforms[:, :3, 3])
+
+###################################################################################################################################################################
+#Function: TransformPoints
+#Purpose: rotate and translate every point of every scan in one batched operation
+#Inputs:
+    #rotations, a (K, 3, 3) stack, one rotation per scan
+    #points, a (K, B, 3) array of B points for each scan
+    #translations, a (K, 3) array or a single 3 vector added after rotating, optional
+#Outputs:
+    #points, a (K, B, 3) numpy array
+def TransformPoints(rotations, points, translations=None):
+    moved = np.einsum('kij,kbj->kbi', rotations, points)
+    if translations is not None:
+        translations = np.asarray(translations, dtype=np.float64)
+        if translations.ndim == 2:
+            translations = translations[:, None, :]
+        moved += translations
+    return(moved)
@@ -0,0 +1,127 @@
+#Created by: Harris M
+#Project Sentinel; Range Images
+#Created: March 29th, 2020
+#A rotating 2D lidar measures on a grid: each scan is a row and each beam is a column. A RangeImage keeps that grid instead of flattening the
+#points into dicts, so the neighbours of a point are found by index arithmetic (the beams either side, the same beam in the scans either side)
+#rather than by searching. Filtering, normals and segmentation can then run as whole-image array operations.
+import numpy as np
+try:
+    from . import RANSAC as ransac
+except ImportError: #run as a script, or imported from inside this folder
+    import RANSAC as ransac
+
+class RangeImage:
+    ###################################################################################################################################################################
+    #Function: __init__
+    #Purpose: hold a session's ranges and their coordinates as (scans, beams) images
+    #Inputs:
+        #ranges, a (scans, beams) numpy array of ranges
+        #valid, a (scans, beams) boolean numpy array, False where there is no measurement
+        #angle, q, (scans, beams) numpy arrays of the beam angle and q-angle of every beam, in radians
+        #points, a (scans, beams, 3) numpy array of the coordinates of every beam
+        #scan, a numpy array of the index of each row's scan in the session
+        #pose, a numpy array of each row's pose: the (scans, 3) euler angles, or the motor encoder angle of each scan
+        #rotation, translation, optional (scans, 3, 3) and (scans, 3) numpy arrays, each row's transform from lidar to global coordinates
+    def __init__(self, ranges, valid, angle, q, points, scan, pose, rotation=None, translation=None):
+        self.ranges = ranges
+        self.valid = valid
+        self.angle = angle
+        self.q = q
+        self.points = points
+        self.scan = scan
+        self.pose = pose
+        self.rotation = rotation
+        self.translation = translation
+
+    ###################################################################################################################################################################
+    #Function: FromScans
+    #Purpose: build the range image of a session
+    #Inputs:
+        #res, a list of dicts from the parser containing scan data
+        #x, EULER, size, MIN_RANGE, Q_TABLE, as for RANSAC.ConvertToCartesianGrid
+    #Outputs:
+        #image, a RangeImage with one row per non-empty scan
+    @classmethod
+    def FromScans(cls, res, x=[[0.0],[0.0],[0.0]], EULER=False, size=None, MIN_RANGE=None, Q_TABLE=True):
+        arrays = ransac.ScansToArrays(res, EULER)
+        grid = ransac.ConvertToCartesianGrid(arrays, x, EULER, size, MIN_RANGE, Q_TABLE)
+        if EULER:
+            pose = arrays['euler']
+        else:
+            pose = arrays['encoder']
+        return(cls(arrays['ranges'], grid['valid'], grid['angle'], grid['q'], grid['points'], arrays['scan'], pose,
+                   grid.get('rotation'), grid.get('translation')))
+
+    @property
+    def shape(self):
+        return(self.ranges.shape)
+
+    #The coordinate images are views of points, nothing is copied
+    @property
+    def X(self):
+        return(self.points[..., 0])
+
+    @property
+    def Y(self):
+        return(self.points[..., 1])
+
+    @property
+    def Z(self):
+        return(self.points[..., 2])
+
+    ###################################################################################################################################################################
+    #Function: Points
+    #Purpose: the coordinates of the valid points, in row order
+    #Inputs:
+        #none
+    #Outputs:
+        #points, an Nx3 numpy array
+    def Points(self):
+        return(self.points[self.valid])
+
+    ###################################################################################################################################################################
+    #Function: Index, RowColumn
+    #Purpose: convert between (row, column) positions and flat indices into the image, so points can be referred to by one integer
+    #Inputs:
+        #row, column, integers or numpy arrays of them
+        #index, an integer or numpy array of flat indices
+    #Outputs:
+        #the flat index, or the (row, column) pair
+    def Index(self, row, column):
+        return(np.asarray(row)*self.shape[1] + np.asarray(column))
+
+    def RowColumn(self, index):
+        return(np.divmod(index, self.shape[1]))
+
+    ###################################################################################################################################################################
+    #Function: Window
+    #Purpose: the neighbourhood around one point, cut off at the edges of the image
+    #Inputs:
+        #row, column, the position of the point
+        #radius, the number of rows and columns either side to include
+    #Outputs:
+        #points, a (rows, columns, 3) view of the neighbourhood's coordinates
+        #valid, a (rows, columns) view of which of them are measurements
+    def Window(self, row, column, radius=1):
+        rows = slice(max(row-radius, 0), row+radius+1)
+        columns = slice(max(column-radius, 0), column+radius+1)
+        return(self.points[rows, columns], self.valid[rows, columns])
+
+    ###################################################################################################################################################################
+    #Function: Neighbour
+    #Purpose: the neighbour at a fixed offset of every point at once, lined up with the image. Offsets that fall off the image are invalid.
+    #Inputs:
+        #drow, the row offset, e.g. 1 for the same beam in the next scan
+        #dcolumn, the column offset, e.g. 1 for the next beam in the same scan
+    #Outputs:
+        #points, a (scans, beams, 3) numpy array where points[r, c] is the point at (r+drow, c+dcolumn)
+        #valid, a (scans, beams) boolean numpy array, True where both the point and its neighbour are measurements
+    def Neighbour(self, drow, dcolumn):
+        (rows, columns) = self.shape
+        points = np.zeros(self.points.shape)
+        valid = np.zeros(self.valid.shape, dtype=bool)
+        target = (slice(max(-drow, 0), max(rows-max(drow, 0), 0)), slice(max(-dcolumn, 0), max(columns-max(dcolumn, 0), 0)))
+        source = (slice(max(drow, 0), max(rows-max(-drow, 0), 0)), slice(max(dcolumn, 0), max(columns-max(-dcolumn, 0), 0)))
+        points[target] = self.points[source]
+        valid[target] = self.valid[source]
+        return(points, valid & self.valid)
@@ -2,11 +2,20 @@
 #Project Sentinel; RANSAC Functions
 #Created: December 7th, 2019
 import numpy as np
+import re
 ##import scipy.ndimage as spim
 import time
 import matplotlib.pyplot as plt
 from numpy import array
 from mpl_toolkits.mplot3d import Axes3D
+try:
+    from . import GEOMETRY as geometry
+    from . import ORIENTATION as orientation
+except ImportError: #run as a script, or imported from inside this folder
+    import GEOMETRY as geometry
+    import ORIENTATION as orientation
+
+NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?') #the numbers in an euler string such as 'array([[0.1],[0.2],[0.3]])'
 
 ###################################################################################################################################################################
 #Function: calculateQ
@@ -67,6 +76,25 @@ def SampleUnassociatedPointsCartesian(values, S_LIM, S):
     #print(len(sample), trycount)
     return(sample, SKIP)
 
+###################################################################################################################################################################
+#Function: SampleUnassociatedPointsArray
+#Purpose: the same sampling as SampleUnassociatedPointsCartesian for points held in an array: a random unassociated point is chosen, then all 100*S
+# attempts are drawn at once and the first S distinct ones inside the cube of half-side S_LIM around it are kept.
+#Inputs:
+    #points, an Nx3 numpy array of every point
+    #unassociated, a numpy array of the indices of the unassociated points
+#Outputs:
+    #sample, a numpy array of the indices of the sampled points, up to S of them
+    #SKIP, a boolean used to tell RANSAC whether or not to skip the current sample of points. Only used if the sample is not large enough to calculate a plane.
+def SampleUnassociatedPointsArray(points, unassociated, S_LIM, S):
+    randPoint = points[unassociated[np.random.randint(0, len(unassociated))]]
+    attempts = unassociated[np.random.randint(0, len(unassociated), 100*S)]
+    inside = np.all((points[attempts]<randPoint+S_LIM) & (points[attempts]>randPoint-S_LIM), axis=1)
+    (distinct, first) = np.unique(attempts[inside], return_index=True)
+    sample = distinct[np.argsort(first)][:S] #in the order they were drawn
+    SKIP = len(sample)<4
+    return(sample, SKIP)
+
 ###################################################################################################################################################################
 #Function: RemovePoints
 #Purpose: Remove points that are now associated with an LSRP from the Unassociated_Points Dictionary
@@ -92,19 +120,9 @@ def RemovePoints(Unassociated, Associated):
     #Betahat, a 3x1 numpy array containing the parameters to the plane, format [[beta1],[beta2],[beta3]]
     #SingularMatrix, a boolean specifying whether or not the Singular Matrix error appeared. Used for deciding whether or not to skip the current sample of points in RANSAC.
 def ExtractLSRP(Sample):
-    A = [[]]
-    z = [[]]
-
-    for point in Sample:
-        x = np.float64(point[0])
-        y = np.float64(point[1])
-        zp = np.float64(point[2])
-        if point is Sample[0]:
-            A = [[1,x,y]]
-            z = [[zp]]
-        else:
-            A = np.append(A,[[1,x,y]],0)
-            z = np.append(z,[[zp]],0)
+    Sample = np.asarray([np.asarray(point, dtype=np.float64).reshape(-1)[:3] for point in Sample]) if not isinstance(Sample, np.ndarray) else Sample #Sample may also be an Nx3 array
+    A = np.column_stack([np.ones(len(Sample)), Sample[:, 0], Sample[:, 1]])
+    z = Sample[:, 2:3]
     Atrans = np.transpose(A)
     AtransA = np.matmul(Atrans,A)
 
@@ -130,25 +148,27 @@ def ExtractLSRP(Sample):
     #x, an int specifying how many points from Unassociated_Points passed tolerance.
     
 def TestTolerance(Unassociated_Points, LSRP, X):
-        beta1 = LSRP[0][0]
-        beta2 = LSRP[1][0]
-        beta3 = LSRP[2][0]
-        denominator = np.sqrt(beta2**2+beta3**2+1)
-        Tolerance_Bool = {}
-        x = 0
-        for key in Unassociated_Points:
-            point = Unassociated_Points[key]
-            x0 = point[0]
-            y0 = point[1]
-            z0 = point[2]
-            numerator = abs(beta1 + beta2*x0 + beta3*y0 - z0)
-            distance = numerator/denominator 
-            IN_TOLERANCE = abs(distance)<X
-##            if distance<0: print("Found a negative distance value")
-            Tolerance_Bool[key] = IN_TOLERANCE
-            if IN_TOLERANCE:
-                x += 1
+        keys = list(Unassociated_Points.keys())
+        points = np.asarray([np.asarray(point, dtype=np.float64).reshape(-1)[:3] for point in Unassociated_Points.values()]).reshape(-1, 3)
+        IN_TOLERANCE = PointDistances(points, LSRP)<X
+        Tolerance_Bool = dict(zip(keys, IN_TOLERANCE.tolist()))
+        x = int(np.count_nonzero(IN_TOLERANCE))
         return(Tolerance_Bool, x)
+
+###################################################################################################################################################################
+#Function: PointDistances
+#Purpose: the distance of every point from an LSRP, in one expression
+#Inputs:
+    #points, an Nx3 numpy array
+    #LSRP, a 3x1 numpy array containing the parameters for a plane, format [[beta1], [beta2], [beta3]]
+#Outputs:
+    #distance, an (N,) numpy array of distances
+def PointDistances(points, LSRP):
+    beta1 = LSRP[0][0]
+    beta2 = LSRP[1][0]
+    beta3 = LSRP[2][0]
+    denominator = np.sqrt(beta2**2+beta3**2+1)
+    return(np.abs(beta1 + beta2*points[:, 0] + beta3*points[:, 1] - points[:, 2])/denominator)
     
 ###################################################################################################################################################################
 #Function: LSRPtoLandmark
@@ -168,6 +188,143 @@ def LSRPtoLandmark(LSRP):
     Landmark = fixed_point + b*normalvec
     return(Landmark)
 
+###################################################################################################################################################################
+#Function: ScansToArrays
+#Purpose: gather the scans of a session into arrays, so that they can be converted all at once
+#Inputs:
+    #res, a list of dicts from the parser containing scan data. Measurement and euler may be strings, as they are stored in AWS.
+    #EULER, a boolean specifying whether or not to read each scan's euler angles
+#Outputs:
+    #arrays, a dict of numpy arrays with one row per non-empty scan:
+        #'scan', the index of the scan in res
+        #'ranges', an (n, beams) array of ranges, padded with zeros past each scan's 'count'
+        #'count', the number of ranges in each scan
+        #'start', 'increment', the start angle and angle increment of each scan, in radians
+        #'encoder', the mechanism motor's angle for each scan, in radians
+        #'euler', an (n, 3) array of each scan's phi, theta and psi (only if EULER)
+        #'transform', an (n, 4, 4) array of each scan's sensor transform, the identity for scans without one (only if EULER)
+def ScansToArrays(res, EULER=False):
+    rows = []
+    ranges = []
+    for index in range(0, len(res)):
+        range_data = res[index]['Measurement']
+        if isinstance(range_data, str):
+            try:
+                range_data = np.array(range_data.strip()[1:-1].split(','), dtype=np.float64) if range_data.strip() not in ('', '[]') else [] #much faster than eval() on a long list
+            except ValueError:
+                try:
+                    range_data=eval(range_data)
+                except:
+                    print("Error, measurements were not list or evaluatable by eval(), continuing to next scan.")
+                    continue
+        if len(range_data)!=0:
+            rows.append(index)
+            ranges.append(np.asarray(range_data, dtype=np.float64)[:int(res[index]['Quantity'])])
+
+    n = len(rows)
+    width = max([len(range_data) for range_data in ranges] + [0])
+    arrays = {'scan': np.asarray(rows, dtype=np.int64),
+              'ranges': np.zeros((n, width)),
+              'count': np.asarray([len(range_data) for range_data in ranges], dtype=np.int64),
+              'start': np.radians([float(res[index]['Start Angle']) for index in rows]),
+              'increment': np.radians([float(res[index]['Angular Increment']) for index in rows])}
+    for (row, range_data) in enumerate(ranges):
+        arrays['ranges'][row, :len(range_data)] = range_data
+    if EULER:
+        euler = []
+        for index in rows:
+            angles = res[index]['euler']
+            if isinstance(angles, str):
+                numbers = NUMBER_PATTERN.findall(angles)
+                angles = numbers if len(numbers) == 3 else eval(angles)
+            euler.append(np.asarray(angles, dtype=np.float64).reshape(3))
+        arrays['euler'] = np.asarray(euler).reshape(n, 3)
+        arrays['transform'] = np.asarray([res[index].get('Transform', np.eye(4)) for index in rows], dtype=np.float64).reshape(n, 4, 4)
+    else:
+        arrays['encoder'] = np.radians([float(res[index]['Motor encoder']) for index in rows])
+    return(arrays)
+
+###################################################################################################################################################################
+#Function: ConvertToCartesianGrid
+#Purpose: convert every beam of every scan into the global csys' cartesian coordinate system at once, keeping the scans as rows and the beams as columns.
+# Every beam is converted with array operations, using one rotation per scan instead of one per point.
+#Inputs:
+    #arrays, the scans of a session as ScansToArrays returns them. The ranges are filtered in place if size is given.
+    #x, a nx1 numpy array, the state vector for our system
+    #EULER, a boolean. If True, each scan is moved by its sensor transform, if it has one, and rotated by its euler angles (as ConvertToCartesianEulerAngles does), otherwise it is placed using the mechanism motor's angle (as ConvertToCartesian does)
+    #size, if given, the size of the median filter run along each scan's ranges first
+    #MIN_RANGE, if given, ranges below this are marked invalid
+    #Q_TABLE, a boolean. If True, q-angles are interpolated from a table instead of calculated exactly
+#Outputs:
+    #grid, a dict of numpy arrays with one row per scan and one column per beam:
+        #'points', a (scans, beams, 3) array of coordinates
+        #'valid', a boolean array, False past each scan's count and for ranges below MIN_RANGE
+        #'angle', 'q', the beam angle and q-angle of every beam, in radians
+        #'rotation', 'translation', the (scans, 3, 3) and (scans, 3) transform from lidar to global coordinates of each scan (only if EULER)
+def ConvertToCartesianGrid(arrays, x=[[0.0],[0.0],[0.0]], EULER=False, size=None, MIN_RANGE=None, Q_TABLE=True):
+    ranges = arrays['ranges']
+    if size is not None:
+        import scipy.ndimage as spim #Only needed for filtering
+        for (row, count) in enumerate(arrays['count']):
+            ranges[row, :count] = spim.median_filter(ranges[row, :count], size=size, mode='reflect')
+
+    beams = np.arange(ranges.shape[1])
+    (angle, cos_angle, sin_angle) = geometry.BeamTables(arrays['start'], arrays['increment'], ranges.shape[1])
+    valid = beams[None, :] < arrays['count'][:, None]
+    if MIN_RANGE is not None:
+        valid &= ranges >= MIN_RANGE
+
+    if EULER:
+        theta = arrays['euler'][:, 1]
+    else:
+        theta = arrays['encoder']
+    if Q_TABLE:
+        q = geometry.InterpolateQ(calculateQ, theta[:, None], angle)
+    else:
+        q = calculateQ(theta[:, None], angle)
+
+    grid = {'valid': valid, 'angle': angle, 'q': q}
+    if EULER:
+        lidar = np.stack([ranges*cos_angle, ranges*sin_angle, np.zeros(ranges.shape)], axis=-1)
+        Rlg = orientation.EulerToRotation(arrays['euler'])
+        (Rsensor, tsensor) = orientation.SplitTransforms(arrays['transform'])
+        grid['rotation'] = orientation.Compose(Rlg, Rsensor)
+        grid['translation'] = np.einsum('sij,sj->si', Rlg, tsensor) + np.asarray(x, dtype=np.float64).reshape(3)
+        grid['points'] = orientation.TransformPoints(grid['rotation'], lidar, grid['translation'])
+    else:
+        q_0 = calculateQ(theta, 0)[:, None]
+        q_90 = calculateQ(theta, np.pi/2)[:, None]
+        grid['points'] = np.stack([ranges*cos_angle*np.cos(q_0) + x[0][0],
+                                   ranges*sin_angle*np.cos(q_90) + x[1][0],
+                                   ranges*(cos_angle*np.sin(q_0) + sin_angle*np.sin(q_90))], axis=-1) #For now, we assume sentinel does not change altitude.
+    return(grid)
+
+###################################################################################################################################################################
+#Function: ConvertToCartesianBatch
+#Purpose: convert a whole session of scans into the global csys' cartesian coordinate system at once, as a flat list of points
+#Inputs:
+    #res, a list of dicts from the parser containing scan data
+    #x, EULER, size, MIN_RANGE, Q_TABLE, as for ConvertToCartesianGrid
+#Outputs:
+    #points, an Nx3 numpy array of the coordinates of every point
+    #columns, a dict of numpy arrays with one entry per point: 'scan' (index in res), 'beam', 'angle', 'q', 'rho', and 'phi', 'theta', 'psi' if EULER
+def ConvertToCartesianBatch(res, x=[[0.0],[0.0],[0.0]], EULER=False, size=None, MIN_RANGE=None, Q_TABLE=True):
+    arrays = ScansToArrays(res, EULER)
+    grid = ConvertToCartesianGrid(arrays, x, EULER, size, MIN_RANGE, Q_TABLE)
+    valid = grid['valid']
+
+    points = grid['points'][valid]
+    (rows, beams) = np.nonzero(valid)
+    columns = {'scan': arrays['scan'][rows],
+               'beam': beams,
+               'angle': grid['angle'][valid],
+               'q': grid['q'][valid],
+               'rho': arrays['ranges'][valid]}
+    if EULER:
+        for (index, key) in enumerate(['phi', 'theta', 'psi']):
+            columns[key] = arrays['euler'][rows, index]
+    return(points, columns)
+
 ###################################################################################################################################################################
 #Function: ConvertToCartesian
 #Purpose: to convert a single scan's values into the global csys' cartesian coordinate system, taking into account the robots current pose
@@ -180,47 +337,10 @@ def LSRPtoLandmark(LSRP):
 # from the LIDAR will look on the raspberry pi. For now, we assume we get a list of dictionaries for a frame.
 # In reality, we expect to get a steady stream of new dicts every few hundredths of a second.
 def ConvertToCartesian(res, x=[[0.0],[0.0],[0.0]]):
+    (points, columns) = ConvertToCartesianBatch(res, x, Q_TABLE=False) #q is part of the keys, so it is calculated exactly
     scan = {}
-    offset = 0
-##    omega = np.pi/3 #radians per second, this variable is the angular frequency of the motor from the video. for testing purposes only.
-    for index in range(0, len(res)):
-        range_data = res[index]['Measurement']
-        if type(range_data) is not list:
-            try:
-                range_data=eval(range_data)
-            except:
-                print("Error, measurements were not list or evaluatable by eval(), continuing to next scan.")
-        if len(range_data)!=0:
-##            if index==0:
-##                start = res[index]['Time of transmission']
-##            message_time = res[index]['Time of transmission']
-##            time_since_start = message_time-start
-            message_count = int(res[index]['Quantity'])
-            angle_increment = np.radians(float(res[index]['Angular Increment']))
-            start_angle = np.radians(float(res[index]['Start Angle']))
-            end_angle = start_angle + (message_count-1)*angle_increment
-##            theta = GetSensorEncoderData() #for when we have the arduino hooked up to the encoder, make sure it is in radians
-##            theta = omega*time_since_start #the assignment here is just for visualization
-            theta = np.radians(float(res[index]['Motor encoder']))
-            q_0 = calculateQ(theta, 0)
-            q_90 = calculateQ(theta, np.pi/2)
-##            print("Index is "+str(index))
-            for inc in range(0, message_count):
-                angle = start_angle + inc*angle_increment
-                rho = range_data[inc]
-##                if rho<1000: #This is an attempt to remove datapoints that are too close to the origin.
-##                    continue
-                q = calculateQ(theta, angle)
-                x_lidar = rho*np.cos(angle)*np.cos(q_0)
-                y_lidar = rho*np.sin(angle)*np.cos(q_90)
-                z_lidar = rho*(np.cos(angle)*np.sin(q_0) + np.sin(angle)*np.sin(q_90))
-                x_global = x_lidar + x[0][0]
-                y_global = y_lidar + x[1][0]
-                z_global = z_lidar #For now, we assume sentinel does not change altitude. This is also making the global origin at the same height as the LIDAR
-                scan[(angle, q, rho)] = (x_global,y_global,z_global)
-            offset += message_count
-        else:
-            continue
+    for (angle, q, rho, point) in zip(columns['angle'], columns['q'], columns['rho'], points):
+        scan[(angle, q, rho)] = (point[0], point[1], point[2])
     return(scan)
 ###############################################################################################################################################################
 #Function: Rotate
@@ -253,57 +373,10 @@ def Rotate(angle, axis):
 # from the LIDAR will look on the raspberry pi. For now, we assume we get a list of dictionaries for a frame.
 # In reality, we expect to get a steady stream of new dicts every few hundredths of a second.
 def ConvertToCartesianEulerAngles(res, x=[[0.0],[0.0],[0.0]]):
+    (points, columns) = ConvertToCartesianBatch(res, x, EULER=True, Q_TABLE=False)
     scan = {}
-    offset = 0
-##    omega = np.pi/3 #radians per second, this variable is the angular frequency of the motor from the video. for testing purposes only.
-    for index in range(0, len(res)):
-        if len(res[index]['Measurement'])!=0:
-##            if index==0:
-##                start = res[index]['Time of transmission']
-##            message_time = res[index]['Time of transmission']
-##            time_since_start = message_time-start
-            message_count = int(res[index]['Quantity'])
-            angle_increment = np.radians(float(res[index]['Angular Increment']))
-            start_angle = np.radians(float(res[index]['Start Angle']))
-            range_data = eval(res[index]['Measurement'])
-            end_angle = start_angle + (message_count-1)*angle_increment
-##            theta = GetSensorEncoderData() #for when we have the arduino hooked up to the encoder, make sure it is in radians
-##            theta = omega*time_since_start #the assignment here is just for visualization
-##            theta = np.radians(res[index]['Motor encoder'])
-##            print("Index is "+str(index))
-            euler = eval(res[index]['euler'])
-            phi = euler[0][0]
-            theta = euler[1][0]
-            psi = euler[2][0]
-
-            Rphi = Rotate(phi,[[1],[0],[0]])
-            Rtheta = Rotate(theta,[[0],[1],[0]])
-            Rpsi = Rotate(psi,[[0],[0],[1]])
-
-            Rlg = np.matmul(Rphi,np.matmul(Rtheta,Rpsi))
-            
-##            Rlg = np.transpose([[np.cos(psi)*np.cos(theta), -np.sin(psi)*np.cos(phi)+np.cos(psi)*np.sin(theta)*np.sin(phi), np.sin(psi)*np.sin(phi)+np.cos(psi)*np.sin(theta)*np.cos(phi)],
-##                               [np.sin(psi)*np.cos(theta), np.cos(psi)*np.cos(phi)+np.sin(psi)*np.sin(theta)*np.sin(phi), -np.cos(psi)*np.sin(phi)+np.sin(psi)*np.sin(theta)*np.cos(phi)],
-##                               [-np.sin(theta),              np.cos(theta)*np.sin(phi),                                     np.cos(theta)*np.cos(phi)]]) #It should be this one.
-
-
-            for inc in range(0, message_count):
-                angle = start_angle + inc*angle_increment
-                rho = range_data[inc]
-                
-                q = calculateQ(theta, angle)
-                x_lidar = rho*np.cos(angle)
-                y_lidar = rho*np.sin(angle)
-                z_lidar = 0
-                point = np.asarray([[x_lidar], [y_lidar], [z_lidar]])
-                newpoint = np.matmul(Rlg,point)+x
-
-##                x_global = x_lidar + x[0][0]
-##                y_global = y_lidar + x[1][0]
-##                z_global = z_lidar #For now, we assume sentinel does not change altitude. This is also making the global origin at the same height as the LIDAR
-                scan[(phi,theta,psi,rho,angle)] = newpoint
-        else:
-            continue
+    for (phi, theta, psi, rho, angle, point) in zip(columns['phi'], columns['theta'], columns['psi'], columns['rho'], columns['angle'], points):
+        scan[(phi,theta,psi,rho,angle)] = point.reshape(3,1)
     return(scan)
 ###################################################################################################################################################################
 #Function: ConvertToCartesianMedianFilter
@@ -318,42 +391,10 @@ def ConvertToCartesianEulerAngles(res, x=[[0.0],[0.0],[0.0]]):
 # from the LIDAR will look on the raspberry pi. For now, we assume we get a list of dictionaries for a frame.
 # In reality, we expect to get a steady stream of new dicts every few hundredths of a second.
 def ConvertToCartesianMedianFilter(res, x=[[0.0],[0.0],[0.0]], size=3):
+    (points, columns) = ConvertToCartesianBatch(res, x, size=size, MIN_RANGE=1000, Q_TABLE=False) #MIN_RANGE is an attempt to remove datapoints that are too close to the origin.
     scan = {}
-    offset = 0
-##    omega = np.pi/3 #radians per second, this variable is the angular frequency of the motor from the video. for testing purposes only.
-    for index in range(0, len(res)):
-        if len(res[index]['Measurement'])!=0:
-##            if index==0:
-##                start = res[index]['Time of transmission']
-##            message_time = res[index]['Time of transmission']
-##            time_since_start = message_time-start
-            message_count = res[index]['Quantity']
-            angle_increment = np.radians(res[index]['Angular Increment'])
-            start_angle = np.radians(res[index]['Start Angle'])
-            range_data = spim.median_filter(res[index]['Measurement'], size=size, mode='reflect')
-            end_angle = start_angle + (message_count-1)*angle_increment
-##            theta = GetSensorEncoderData() #for when we have the arduino hooked up to the encoder, make sure it is in radians
-##            theta = omega*time_since_start #the assignment here is just for visualization
-            theta = np.radians(res[index]['Motor encoder'])
-            q_0 = calculateQ(theta, 0)
-            q_90 = calculateQ(theta, np.pi/2)
-##            print("Index is "+str(index))
-            for inc in range(0, message_count):
-                angle = start_angle + inc*angle_increment
-                rho = range_data[inc]
-                if rho<1000: #This is an attempt to remove datapoints that are too close to the origin.
-                    continue
-                q = calculateQ(theta, angle)
-                x_lidar = rho*np.cos(angle)*np.cos(q_0)
-                y_lidar = rho*np.sin(angle)*np.cos(q_90)
-                z_lidar = rho*(np.cos(angle)*np.sin(q_0) + np.sin(angle)*np.sin(q_90))
-                x_global = x_lidar + x[0][0]
-                y_global = y_lidar + x[1][0]
-                z_global = z_lidar #For now, we assume sentinel does not change altitude. This is also making the global origin at the same height as the LIDAR
-                scan[(angle, q, rho)] = (x_global,y_global,z_global)
-            offset += message_count
-        else:
-            continue
+    for (angle, q, rho, point) in zip(columns['angle'], columns['q'], columns['rho'], points):
+        scan[(angle, q, rho)] = (point[0], point[1], point[2])
     return(scan)
 ###################################################################################################################################################################
 #Function: PairLandmarks
@@ -480,96 +521,87 @@ def NormalizeCartesian(Points, REVERSE=False, factor=1.0):
         Normalized_Points[key] = np.multiply(factor,Points[key])
     return(Normalized_Points,1/factor)
 ###################################################################################################################################################################
-#Function: RANSAC
-#Purpose: run the RANSAC algorithm on a point cloud to extract LSRP's
+#Function: RANSACArrays
+#Purpose: run the RANSAC algorithm on a point cloud held in an array to extract LSRP's. Which points are still unassociated is kept as a boolean mask,
+# so testing tolerance is one expression over the points and removing the inliers of a landmark is one mask update.
 #Inputs:
-    #scan, the dictionary holding the point cloud.
-    #start_angle, the starting measurement angle for the lidar
-    #end_angle, the ending measurement angle for the lidar.
+    #points, an Nx3 numpy array of the point cloud, e.g. from ConvertToCartesianBatch or RangeImage.Points()
+    #X, the maximum distance a point can be from an LSRP to be in tolerance
+    #C, the consensus, the number of points that must pass tolerance for an LSRP to become a landmark
+    #N, the maximum number of trials
+    #S, the number of points to sample
+    #S_LIM, half the length of a side of the cube to draw around the randomly sampled point
+    #VERBOSE, a boolean, whether or not to print each trial
 #Outputs:
-    #Landmark_LSRPS, a list containing the coordinates of each LSRP.
-    #LSRP_List, a list containing the parameters of the LSRP's. This is only for visualisation.
-    
-def RANSAC(scan, X, C, N, S, S_LIM):
-    
+    #Landmarks_New, a dict of the coordinates of each LSRP, keyed by the trial it was found in
+    #LSRP_list, a list containing the parameters of the LSRP's
+    #unassociated, an (N,) boolean numpy array, True for points not associated with any LSRP
+    #associated, an (N,) boolean numpy array, True for points that passed the consensus of an LSRP
+def RANSACArrays(points, X, C, N, S, S_LIM, VERBOSE=True):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
     Landmarks_New = {}
     LSRP_list = []
-    Associated_Points = {}
-##    fig = plt.figure()
-##    ax = Axes3D(fig)
-##    ax.set_xlabel('X')
-##    ax.set_ylabel('Y')
-##    ax.set_zlabel('Z')
-##    ax.set_xlim3d(-2000, 2000)
-##    ax.set_ylim3d(-2000, 2000)
-##    ax.set_zlim3d(-2000, 2000)
-##    ax.view_init(45, 45)
-    Unassociated_Points = scan #for now, we are black-boxing the function to get the frame data.
+    unassociated = np.ones(len(points), dtype=bool)
+    associated = np.zeros(len(points), dtype=bool)
     n=0
-    c = len(Unassociated_Points)
-    print("#####################################################")
+    c = len(points)
+    if VERBOSE: print("#####################################################")
     while c>C and n<N:
-        print("SAMPLE "+str(n))
-        UnassociatedKeys = list(Unassociated_Points.keys())
-        UnassociatedValues = list(Unassociated_Points.values())
-        samplestart = time.time()
-        (Sample_points, SKIP) = SampleUnassociatedPointsCartesian(UnassociatedValues, S_LIM, S) #Function to return indexes of the sample of points to calculate LSRP
-        sampleend = time.time()
-        print("It took "+str(sampleend-samplestart)+" seconds to generate a sample of "+str(len(Sample_points))+" points")
+        if VERBOSE: print("SAMPLE "+str(n))
+        remaining = np.flatnonzero(unassociated)
+        (Sample_points, SKIP) = SampleUnassociatedPointsArray(points, remaining, S_LIM, S) #Indexes of the sample of points to calculate LSRP
         if not SKIP:
-##            Sample_points = [] #collector for Sample points
-##            for key in Sample_Keys:
-##                Sample_points.append(Unassociated_Points[key])
-##            xs = []
-##            ys = []
-##            zs = []
-##            for point in Sample_points:
-##                xs.append(point[0])
-##                ys.append(point[1])
-##                zs.append(point[2])
-##            ax.scatter(xs, ys, zs, s=1, marker='o', color='r')
-##            plt.pause(1)
-##            plt.show(False)
-            start = time.time()
-            (LSRP, Error) = ExtractLSRP(Sample_points) #Function to calculate the LSRP from the sampled points
-            end = time.time()
+            (LSRP, Error) = ExtractLSRP(points[Sample_points]) #Function to calculate the LSRP from the sampled points
             if not Error:
-                print("Sample LSRP Calculated after "+str(end-start)+" seconds.")
-                start = time.time()
-                (Tolerance_Bool, x) = TestTolerance(Unassociated_Points, LSRP, X)
-                end = time.time()
-                print(str(x)+" Points were found in tolerance with the Sample LSRP after "+str(end-start)+" seconds.")
-                
+                IN_TOLERANCE = PointDistances(points[remaining], LSRP)<X
+                x = int(np.count_nonzero(IN_TOLERANCE))
+                if VERBOSE: print(str(x)+" Points were found in tolerance with the Sample LSRP.")
+
                 if x>C:
-                    print("CONSENSUS PASSED: CALCULATING LANDMARK LSRP")
-                    InTolerance_Points = []
-                    for key in UnassociatedKeys:
-                        IN_TOLERANCE = Tolerance_Bool[key]
-                        
-                        if IN_TOLERANCE:
-                            intolerance_point = Unassociated_Points[key]
-                            InTolerance_Points.append(intolerance_point)
-                            Associated_Points[key] = intolerance_point
-                    start = time.time()
-                    (LSRP, Error) = ExtractLSRP(InTolerance_Points)
-                    end = time.time()
-                    print("It took "+str(end-start)+" seconds to extract the Landmark LSRP.")
+                    if VERBOSE: print("CONSENSUS PASSED: CALCULATING LANDMARK LSRP")
+                    associated[remaining[IN_TOLERANCE]] = True
+                    (LSRP, Error) = ExtractLSRP(points[remaining[IN_TOLERANCE]])
                     if not Error:
                         LSRP_list.append(LSRP) #This line should be removed in the instantiation of SENTINEL, this is only for visualization
                         Landmark = LSRPtoLandmark(LSRP)
                         Landmarks_New[n] = Landmark #n is assigned as the key because this dict is erased from each RANSAC run
-                        RemovePoints(Unassociated_Points, Associated_Points)
-                        print("NEW LANDMARK LSRP SUCCESSFULLY STORED. CONTINUING TO NEXT SAMPLE")
-                else:
+                        unassociated &= ~associated
+                        if VERBOSE: print("NEW LANDMARK LSRP SUCCESSFULLY STORED. CONTINUING TO NEXT SAMPLE")
+                elif VERBOSE:
                     print("CONSENSUS FAILED: CONTINUING TO NEXT SAMPLE")
-            else:
-                print("Not enough points to form a plane, gathering another sample")
-        c = len(Unassociated_Points)
+        elif VERBOSE:
+            print("Not enough points to form a plane, gathering another sample")
+        c = int(np.count_nonzero(unassociated))
         n += 1
-        print("#####################################################")
-    
+        if VERBOSE: print("#####################################################")
+
     if n==N: print("Trial Limit of "+str(N)+" Reached")
     else: print(str(c) + " Unassociated Points are left. This is less than Consensus, "+str(C))
+    return(Landmarks_New, LSRP_list, unassociated, associated)
+
+###################################################################################################################################################################
+#Function: RANSAC
+#Purpose: run the RANSAC algorithm on a point cloud to extract LSRP's. The points are copied into an array and run through RANSACArrays.
+#Inputs:
+    #scan, the dictionary holding the point cloud. Associated points are removed from it.
+    #X, C, N, S, S_LIM, as for RANSACArrays
+#Outputs:
+    #Landmark_LSRPS, a list containing the coordinates of each LSRP.
+    #LSRP_List, a list containing the parameters of the LSRP's. This is only for visualisation.
+    #Unassociated_Points, scan, holding only the points not associated with an LSRP
+    #Associated_Points, a dictionary of the points associated with an LSRP
+    
+def RANSAC(scan, X, C, N, S, S_LIM):
+    keys = list(scan.keys())
+    points = np.asarray([np.asarray(point, dtype=np.float64).reshape(-1)[:3] for point in scan.values()]).reshape(-1, 3)
+    (Landmarks_New, LSRP_list, unassociated, associated) = RANSACArrays(points, X, C, N, S, S_LIM)
+
+    Associated_Points = {}
+    for index in np.flatnonzero(associated):
+        Associated_Points[keys[index]] = scan[keys[index]]
+    Unassociated_Points = scan #for now, we are black-boxing the function to get the frame data.
+    for index in np.flatnonzero(~unassociated):
+        del(Unassociated_Points[keys[index]])
     return(Landmarks_New, LSRP_list, Unassociated_Points, Associated_Points)
 ###################################################################################################################################################################
 if __name__=="__main__":
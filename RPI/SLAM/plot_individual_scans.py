@@ -10,6 +10,7 @@ from mpl_toolkits.mplot3d import Axes3D
 import time
 import RANSAC.RANSAC as RANSAC
 ##import PARSER
+import CACHE
 import EKF.EKF as EKF
 import numpy as np
 import scipy.ndimage as nim
@@ -45,11 +46,8 @@ parsed_log_file = '2020-1-9_22-28-2-DIAGNOSTIC_RUN.txt'
 
 parsed_log_file = sample_logs + parsed_log_file
 
-with open(parsed_log_file, 'r') as file:
-    stringdicts = file.readlines()
-    res = []
-    for stringdict in stringdicts:
-        res.append(ast.literal_eval(stringdict))
+# Parsed once, then loaded from the cache next to the log on later runs
+res = CACHE.load_scans(parsed_log_file)
 i=0
 lenres = len(res)
 print("Successfully parsed the scan! Now removing empty messages and sorting scans by frames...")
@@ -11,13 +11,14 @@ import ast
 from boto3.dynamodb.conditions import Key, Attr
 from subprocess import call
 import numpy as np
-import heapq
 from ast import literal_eval
 
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
 import RANSAC.RANSAC as ransac
+import RANSAC.RANGEIMAGE as rangeimage
+import RANSAC.NORMALS as normals_engine
 import KALMAN as kalman
 
 dynamodb = boto3.resource('dynamodb', region_name='us-east-2', endpoint_url='http://dynamodb.us-east-2.amazonaws.com')
@@ -52,81 +53,23 @@ curr_scan = readFromAWS(scan)
 for data in curr_scan:
     data['euler'] = kalman.Gravity([[float(data['Ax'])], [float(data['Ay'])], [float(data['Az'])]]).__repr__()
 
-curr_coordinates = ransac.ConvertToCartesianEulerAngles(curr_scan) 
+# Keep the scans as a grid, so each point's neighbours are the beams and scans around it
+image = rangeimage.RangeImage.FromScans(curr_scan, EULER=True)
 
-actual_coordinates = []
-
-for key, value in curr_coordinates.items():
-    hold = []
-    for coordinate in value:
-        hold.append(coordinate[0])
-    actual_coordinates.append(hold)
-
-# Helper function to find distance between points 
-def distPoints(p0, p1):
-    return (np.sqrt((p0[0] - p1[0])**2 + (p0[1] - p1[1])**2 + (p0[2] - p1[2])**2))
+actual_coordinates = image.Points().tolist()
 
 # Actual RANSAC stuff begins below
 
-POINTS_TO_EXPLORE = 10  # Number of points to explore 
-
-# actual_points = []
-# actual_x = []
-# actual_y = []
-# actual_z = []
+NEIGHBOUR_RADIUS = 1    # Scans and beams either side of each point, so a 3x3 window
 
 points_dict = {}
-nearest_neighbors = {}
-
-count = 0
-# Loop through all points, compute normal vector for each cluster of points 
-for coordinate in actual_coordinates:
-    # Explore the nearest n neighbors. Doing this without any optimizations as of now.
-    # if count == 100:
-    #     break
-    count = count + 1
-    actual_points = []
-    actual_x = []
-    actual_y = []
-    actual_z = []
-    n_points = []
-    heapq.heapify(n_points)
-    mod_list = actual_coordinates.copy()
-    mod_list.remove(coordinate)
-    for point in mod_list:
-        heapq.heappush(n_points, (distPoints(coordinate, point), point))
-    
-    # Find the nearest 10 points
-    for i in range(POINTS_TO_EXPLORE):
-        curr_point = heapq.heappop(n_points)[1]
-        # print(curr_point)
-        actual_points.append(curr_point)
-        actual_x.append(curr_point[0])
-        actual_y.append(curr_point[1])
-        actual_z.append(curr_point[2])
-
-        actual_coordinates.remove(curr_point)
-    
-    # Find the plane classifying the 10 points 
-    tmp_A = []
-    tmp_B = []
-    for i in range(POINTS_TO_EXPLORE):
-        tmp_A.append([actual_x[i], actual_y[i], 1])
-        tmp_B.append(actual_z[i])
-    b = np.matrix(tmp_B).T 
-    A = np.matrix(tmp_A)
-    fit = (A.T * A).I * A.T * b
-    # print("Fit: ", fit)
-    # print("a: ", fit[0,0], "b: ", fit[1,0], "c: ", fit[2,0])
-    mag = np.sqrt(fit[0,0]**2 + fit[1,0]**2 + fit[2,0]**2)
-    nearest_neighbors[str(coordinate)] = actual_points
-    normalized = []
-    normalized.append((fit[0,0] / mag))
-    normalized.append((fit[1,0] / mag))
-    normalized.append((fit[2,0] / mag))
-    # points_dict[str(coordinate)] = normalized
-    points_dict[str(normalized)] = coordinate
-    # print("Normalized: ", normalized)
+
+# Compute the normal vector for each cluster of points, all at once
+normals, curvature = normals_engine.ImageNormals(image, NEIGHBOUR_RADIUS)
+for coordinate, normal in zip(actual_coordinates, normals.tolist()):
+    if np.isnan(normal[0]):
+        continue
+    points_dict[str(normal)] = coordinate
 
 ANGLE_THRESHOLD = 80.0
 num_features = 0
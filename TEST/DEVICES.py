@@ -0,0 +1,320 @@
+# Project Sentinel: Stand-ins for the MPU-6050, the Arduino and the AWS table
+# Harris M
+# March 19, 2020
+
+# LIBRARIES - PYTHON ONLY
+import os
+import sys
+import pty
+import tty
+import time
+import struct
+import threading
+
+import numpy as np
+from boto3.dynamodb.types import TypeSerializer
+
+# EXTERNAL PATHS
+sys.path.append('../RPI/PARSER')
+
+# EXTERNAL LIBRARIES
+import sentinel_reference as s
+
+# DEVICE CONSTANTS
+MOTOR_STEP = 10.0           # degrees the mechanism turns between stops
+MOTOR_RATE = 60.0           # degrees/s while the mechanism turns
+GYRO_NOISE = 0.2            # degrees/s
+ACCEL_NOISE = 0.002         # g
+FIFO_SIZE = 1024
+READY_PERIOD = 0.2          # seconds between 'Arduino is ready' announcements
+ENCODER_PERIOD = 0.05       # seconds between encoder readings while spinning continuously
+
+# Function: still_profile
+# Description: Motion profile of a sensor sitting level and not moving
+def still_profile(stamp):
+    return (0.0, 0.0, 1.0, 0.0, 0.0, 0.0)
+
+class MotorProfile:
+    """ Motion profile that turns about the mechanism axis while a FakeArduino moves """
+
+    def __init__(self, arduino, rate=MOTOR_RATE):
+        """Couples the profile to an Arduino stand-in
+
+            Args:
+                arduino (FakeArduino): Decides when the mechanism is moving
+                rate (float): Turn rate about the y axis while moving, in degrees/s
+            Return:
+                None
+        """
+        self.arduino = arduino
+        self.rate = rate
+
+    def __call__(self, stamp):
+        """Gives Ax, Ay, Az in g and Gx, Gy, Gz in degrees/s at a time """
+        if self.arduino.moving:
+            return (0.0, 0.0, 1.0, 0.0, self.rate, 0.0)
+        return (0.0, 0.0, 1.0, 0.0, 0.0, 0.0)
+
+class RecordedProfile:
+    """ Motion profile replayed from recorded (time, sample) pairs """
+
+    def __init__(self, times, samples):
+        """Sets up the replay. Time starts counting at the first sample read.
+
+            Args:
+                times (array): Sample times in seconds, increasing
+                samples (array): (n, 6) array of Ax, Ay, Az in g and Gx, Gy, Gz in degrees/s
+            Return:
+                None
+        """
+        self.times = np.asarray(times, dtype=np.float64) - times[0]
+        self.samples = np.asarray(samples, dtype=np.float64)
+        self.start = None
+
+    def __call__(self, stamp):
+        """Gives the recorded sample at a time, looping at the end """
+        if self.start is None:
+            self.start = stamp
+        offset = (stamp - self.start) % max(self.times[-1], 1e-9)
+        return tuple(self.samples[np.searchsorted(self.times, offset, side='right') - 1].tolist())
+
+class FakeMPU6050:
+    """ Register map of an MPU-6050 on an SMBus, driven by a motion profile """
+
+    def __init__(self, profile=still_profile, noise=True):
+        """Sets up the registers
+
+            Args:
+                profile (function): Maps a time to (Ax, Ay, Az, Gx, Gy, Gz)
+                noise (bool): Add sensor noise to every sample
+            Return:
+                None
+        """
+        self.profile = profile
+        self.noise = noise
+        self.registers = bytearray(128)
+        self.fifo = bytearray()
+        self.fifo_time = None
+        self.lock = threading.Lock()
+
+    def sample(self, stamp):
+        """Raw big-endian accel, temp and gyro registers at a time """
+        Ax, Ay, Az, Gx, Gy, Gz = self.profile(stamp)
+        accel = np.array([Ax, Ay, Az])
+        gyro = np.array([Gx, Gy, Gz])
+        if self.noise:
+            accel = accel + np.random.normal(0, ACCEL_NOISE, 3)
+            gyro = gyro + np.random.normal(0, GYRO_NOISE, 3)
+        raw = np.concatenate([accel * s.ACCEL_CONSTANT, [0], gyro * s.GYRO_CONSTANT])
+        return struct.pack('>7h', *np.clip(np.round(raw), -32768, 32767).astype(int))
+
+    def fill_fifo(self):
+        """Adds the samples the FIFO would have collected since it was last read """
+        now = time.time()
+        if not self.registers[s.USER_CTRL] & s.USER_CTRL_FIFO_EN or self.fifo_time is None:
+            self.fifo_time = now
+            return
+
+        period = (self.registers[s.SMPLRT_DIV] + 1) / float(s.GYRO_OUTPUT_RATE)
+        while self.fifo_time + period <= now:
+            self.fifo_time += period
+            block = self.sample(self.fifo_time)
+            # The FIFO holds accel and gyro only
+            self.fifo += block[:6] + block[8:]
+            if len(self.fifo) > FIFO_SIZE:
+                del self.fifo[:len(self.fifo) - FIFO_SIZE]
+                self.registers[s.INT_STATUS] |= s.INT_STATUS_FIFO_OFLOW
+
+    def write_byte_data(self, address, register, value):
+        """SMBus write of one register """
+        with self.lock:
+            if register == s.USER_CTRL and value & s.USER_CTRL_FIFO_RESET:
+                del self.fifo[:]
+                self.fifo_time = time.time()
+                value &= ~s.USER_CTRL_FIFO_RESET
+            self.registers[register] = value
+
+    def read_byte_data(self, address, register):
+        """SMBus read of one register """
+        with self.lock:
+            self.fill_fifo()
+            if register == s.INT_STATUS:
+                value = self.registers[s.INT_STATUS]
+                # Reading the status clears it
+                self.registers[s.INT_STATUS] = 0
+                return value
+            return self.read_registers(register, 1)[0]
+
+    def read_i2c_block_data(self, address, register, length):
+        """SMBus block read starting at a register """
+        with self.lock:
+            self.fill_fifo()
+            return self.read_registers(register, length)
+
+    def read_registers(self, register, length):
+        """Reads consecutive registers, or the FIFO when pointed at FIFO_R_W """
+        if register == s.FIFO_R_W:
+            data = self.fifo[:length]
+            del self.fifo[:length]
+            return list(data) + [0] * (length - len(data))
+
+        registers = bytearray(self.registers)
+        registers[s.ACCEL_XOUT_H:s.ACCEL_XOUT_H + s.IMU_BLOCK_SIZE] = self.sample(time.time())
+        registers[s.FIFO_COUNT_H:s.FIFO_COUNT_H + 2] = struct.pack('>H', len(self.fifo))
+        return list(registers[register:register + length])
+
+class FakeArduino:
+    """ Arduino on the other end of a pseudo terminal, speaking the <...> protocol """
+
+    def __init__(self, move_time=None, step=MOTOR_STEP, rate=MOTOR_RATE, continuous=False):
+        """Opens the pseudo terminal and starts answering on it
+
+            Args:
+                move_time (float): Seconds each move takes. Worked out from step and
+                                   rate when None.
+                step (float): Degrees the mechanism turns per 'g'
+                rate (float): Degrees/s the mechanism turns at
+                continuous (bool): Spin from 'g' until 's', sending the encoder angle
+                                   every ENCODER_PERIOD, instead of one step per 'g'
+            Return:
+                None
+        """
+        self.step = step
+        self.rate = rate
+        self.move_time = move_time if move_time is not None else step / rate
+        self.continuous = continuous
+        self.angle = 0.0
+        self.moving = False
+        self.received = []
+
+        # Commands are read on one thread and the mechanism moves on another, so
+        # an 's' cuts a move short as soon as it arrives
+        self.steps = 0          # Moves still to make, or non-zero while spinning
+        self.wake = threading.Condition()
+
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.port_name = os.ttyname(slave)
+        self.slave = slave
+
+        self.running = True
+        threading.Thread(target=self.run, name='fake_arduino', daemon=True).start()
+        threading.Thread(target=self.motion, name='fake_arduino_motor', daemon=True).start()
+        threading.Thread(target=self.announce, name='fake_arduino_ready', daemon=True).start()
+
+    def send(self, message):
+        """Writes a message with the start and end markers """
+        os.write(self.master, (s.startSentinel + message + s.endSentinel).encode('utf-8'))
+
+    def close(self):
+        """Stops answering and closes the pseudo terminal """
+        with self.wake:
+            self.running = False
+            self.wake.notify_all()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def announce(self):
+        """Says the Arduino is ready until the first command arrives. Opening the
+        port flushes anything sent before, as the real board's reset would. """
+        while self.running and len(self.received) == 0:
+            try:
+                self.send("Arduino is ready")
+            except OSError:
+                return
+            time.sleep(READY_PERIOD)
+
+    def run(self):
+        """Reads commands from the Raspberry Pi side and acts on them """
+        buf = b''
+        while self.running:
+            try:
+                buf += os.read(self.master, 64)
+            except OSError:
+                return
+            while s.endSentinel.encode('utf-8') in buf:
+                message, buf = buf.split(s.endSentinel.encode('utf-8'), 1)
+                command = message[message.rfind(s.startSentinel.encode('utf-8')) + 1:].decode('utf-8')
+                self.received.append(command)
+                with self.wake:
+                    if command == 'g':
+                        self.steps = 1 if self.continuous else self.steps + 1
+                    elif command == 's':
+                        self.steps = 0
+                    self.wake.notify_all()
+
+    def halted(self):
+        """True once an 's' has come in or the stand-in is closing. Call with wake held. """
+        return self.steps == 0 or not self.running
+
+    def motion(self):
+        """Moves the mechanism for as long as there are moves to make """
+        while self.running:
+            with self.wake:
+                if not self.wake.wait_for(lambda: self.steps > 0 or not self.running, 0.1):
+                    continue
+            if not self.running:
+                return
+
+            self.moving = True
+            try:
+                if self.continuous:
+                    self.spin()
+                else:
+                    self.move()
+            except OSError:
+                return
+            finally:
+                self.moving = False
+
+    def move(self):
+        """Turns one step and reports the angle, unless an 's' stops it part way """
+        start = time.time()
+        with self.wake:
+            stopped = self.wake.wait_for(self.halted, self.move_time)
+            if not stopped:
+                self.steps -= 1
+        if stopped:
+            # Stopped wherever the mechanism had got to
+            fraction = min((time.time() - start) / max(self.move_time, 1e-9), 1.0)
+            self.angle = (self.angle + fraction * self.step) % 360
+            return
+        self.angle = (self.angle + self.step) % 360
+        self.send("D " + str(self.angle))
+
+    def spin(self):
+        """Turns at the motor rate, reporting the angle as it goes, until an 's' """
+        last = time.time()
+        while True:
+            with self.wake:
+                stopped = self.wake.wait_for(self.halted, ENCODER_PERIOD)
+            now = time.time()
+            self.angle = (self.angle + self.rate * (now - last)) % 360
+            last = now
+            if stopped:
+                return
+            self.send("D " + str(self.angle))
+
+class FakeTable:
+    """ Stand-in for the DynamoDB table that keeps items in memory """
+
+    def __init__(self):
+        """Starts with no items """
+        self.items = []
+
+    def put_item(self, Item):
+        """Stores an item, rejecting any value boto3 could not send """
+        serializer = TypeSerializer()
+        for key in Item:
+            # Raises on floats and other types DynamoDB does not take, like the real table
+            serializer.serialize(Item[key])
+        self.items.append(Item)
+        return {}
+
+    def query(self, **kwargs):
+        """Answers every query with an empty name list """
+        return {'Items': [{'list': []}]}
+
+    def delete_item(self, **kwargs):
+        """Deletes nothing """
+        return {}
@@ -0,0 +1,382 @@
+# Project Sentinel: Stand-in for the TiM781 that replays recorded or synthetic scans
+# Harris M
+# March 18, 2020
+
+# Usage:
+#   python SIMULATOR.py serve [log file|synthetic] [speed] [port]
+#   python SIMULATOR.py bench [log file|synthetic] [speed] [seconds]
+
+# LIBRARIES - PYTHON ONLY
+import sys
+import ast
+import time
+import queue
+import socket
+import struct
+import threading
+
+import numpy as np
+
+# EXTERNAL PATHS
+sys.path.append('../RPI/PARSER')
+
+# EXTERNAL LIBRARIES
+import sentinel_reference as s
+import DECODER as decoder
+from FRAMER import TelegramFramer, BinaryFramer
+from SESSION import frame_binary
+
+# SIMULATOR CONSTANTS
+HOST = '127.0.0.1'
+SCAN_RATE = 15.0
+SYNTHETIC_SCANS = 100
+SEND_BACKLOG = 4    # telegrams waiting for a slow client before streamed scans are dropped
+SCAN_CONFIG = b'9C4 1 D05 FFF92230 225510'
+
+# Canned replies to the configuration commands, by command name
+REPLIES = {b'SetAccessMode': b'sAN SetAccessMode 1',
+           b'Run': b'sAN Run 1',
+           b'LMPscancfg': b'sRA LMPscancfg ' + SCAN_CONFIG,
+           b'mSCloadfacdef': b'sAN mSCloadfacdef',
+           b'mSCreboot': b'sAN mSCreboot',
+           b'mEEwriteall': b'sAN mEEwriteall 1'}
+
+# Function: hex_token
+# Description: Formats an integer the way the sensor does, as two's complement hex
+def hex_token(value, bits=32):
+    return format(int(value) & (2**bits - 1), 'X').encode('ascii')
+
+# Function: encode_telegram
+# Description: Builds an ASCII LMDscandata telegram (without STX/ETX) from a parsed
+#              scan dictionary. The inverse of DECODER.decode_telegram.
+def encode_telegram(telegram, command=b'sSN'):
+    scale = {value: key for key, value in s.SCALE_FACTOR.items()}
+    tokens = [command, b'LMDscandata']
+    values = {}
+    for key, index, base, divisor in decoder.HEADER_FIELDS:
+        # Older logs leave out the status fields, which are zero on our sensor
+        if base == 'scale':
+            values[index] = scale[telegram[key]].encode('ascii')
+        elif base == 'time':
+            values[index] = hex_token(round(telegram.get(key, 0) / s.MICROSECOND))
+        elif divisor is None:
+            values[index] = hex_token(telegram.get(key, 0))
+        else:
+            values[index] = hex_token(round(telegram.get(key, 0) * divisor))
+
+    # Fixed tokens between the table's fields: the high status bytes and DIST1
+    for index in range(2, decoder.MEASUREMENT_INDEX):
+        tokens.append(values.get(index, b'0'))
+    tokens[20] = b'DIST1'
+
+    measurement = np.asarray(telegram['Measurement'], dtype=np.int64)
+    tokens.extend(hex_token(value) for value in measurement)
+    # No 8-bit channels, position, name, comment, time or event blocks
+    tokens.extend([b'0', b'0', b'0', b'0', b'0', b'0'])
+    return b' '.join(tokens)
+
+# Function: encode_binary
+# Description: Builds a binary (CoLa-B) LMDscandata payload from a parsed scan
+#              dictionary. The inverse of DECODER.decode_binary.
+def encode_binary(telegram, command=b'sSN'):
+    header = np.zeros(1, dtype=decoder.BINARY_HEADER)
+    for name in decoder.BINARY_HEADER.names:
+        header[name] = telegram.get(name, 0)
+    header['Time since start-up'] = round(telegram['Time since start-up'] / s.MICROSECOND)
+    header['Time of transmission'] = round(telegram['Time of transmission'] / s.MICROSECOND)
+    header['Amount of Encoder'] = 0
+
+    scale = {value: key for key, value in s.SCALE_FACTOR.items()}
+    channel = np.zeros(1, dtype=decoder.BINARY_CHANNEL)
+    channel['Content'] = b'DIST1'
+    channel['Scale Factor'] = int(scale[telegram['Scale Factor']], 16)
+    channel['Scale Factor Offset'] = telegram['Scale Factor Offset']
+    channel['Start Angle'] = round(telegram['Start Angle'] * s.ANGLE_STOP)
+    channel['Angular Increment'] = round(telegram['Angular Increment'] * s.ANGLE_STOP)
+    channel['Quantity'] = len(telegram['Measurement'])
+
+    measurement = np.asarray(telegram['Measurement']).astype('>u2')
+    return (command + b' LMDscandata ' + header.tobytes() + struct.pack('>H', 1) + channel.tobytes()
+            + measurement.tobytes() + bytes(12))
+
+# Function: load_log
+# Description: Reads scans from a log with one str(dict) scan per line, such as
+#              RPI/SLAM/2020-1-9_22-28-2-DIAGNOSTIC_RUN.txt
+def load_log(path):
+    telegrams = []
+    with open(path) as log:
+        for line in log:
+            try:
+                telegram = ast.literal_eval(line.strip())
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(telegram, dict) and telegram.get('Quantity', '') != '':
+                telegrams.append(telegram)
+    return telegrams
+
+# Function: synthetic_telegrams
+# Description: Makes up scans of a room-like scene for when no log is at hand
+def synthetic_telegrams(count=SYNTHETIC_SCANS, quantity=s.RING_BEAMS):
+    angles = np.deg2rad(-45.0 + np.arange(quantity) * 0.3333)
+    telegrams = []
+    for number in range(count):
+        # Distance to the walls of a 4 m x 6 m room, with a little noise
+        walls = np.minimum(2000 / np.maximum(np.abs(np.cos(angles)), 1e-3), 3000 / np.maximum(np.abs(np.sin(angles)), 1e-3))
+        ranges = np.clip(walls + np.random.normal(0, 5, quantity), 0, 65535).astype(np.uint16)
+        telegrams.append({'Version Number': 1, 'Device Number': 1, 'Serial Number': 19121634,
+                          'Device Status': 0, 'Telegram Counter': number, 'Scan Counter': number,
+                          'Time since start-up': number / SCAN_RATE, 'Time of transmission': number / SCAN_RATE,
+                          'Status of digital inputs': 0, 'Status of digital outputs': 0, 'Layer Angle': 0,
+                          'Scan Frequency': 1500, 'Measurement Frequency': 162, 'Amount of Encoder': 0,
+                          '16-bit Channels': 1, 'Scale Factor': '1x', 'Scale Factor Offset': 0,
+                          'Start Angle': -45.0, 'Angular Increment': 0.3333, 'Quantity': quantity,
+                          'Measurement': ranges.tolist()})
+    return telegrams
+
+class TiMSimulator:
+    """ TCP server that answers the CoLa commands Sentinel uses and streams scans """
+
+    def __init__(self, telegrams, port=s.PORT, speed=1.0, binary=False, host=HOST):
+        """Sets up the simulator
+
+            Args:
+                telegrams (list): Scan dictionaries to replay, in a loop
+                port (int): Port to listen on, 0 for any free port
+                speed (float): Multiple of the sensor's real 15 Hz scan rate
+                binary (bool): Speak binary (CoLa-B) instead of ASCII (CoLa-A)
+                host (string): Address to listen on
+            Return:
+                None
+        """
+        self.telegrams = telegrams
+        self.speed = speed
+        self.binary = binary
+        self.running = False
+        self.counter = 0
+        self.sent = 0           # Scans handed to clients
+        self.dropped = 0        # Scans skipped because a client could not keep up
+        self.lock = threading.Lock()
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.port = self.server.getsockname()[1]
+
+    def start(self):
+        """Starts accepting clients on a background thread
+
+            Args:
+                None
+            Return:
+                The port the simulator listens on
+        """
+        self.server.listen(5)
+        self.running = True
+        threading.Thread(target=self.accept_loop, name='tim_simulator', daemon=True).start()
+        return self.port
+
+    def stop(self):
+        """Stops the simulator. Connected clients see the connection close.
+
+            Args:
+                None
+            Return:
+                None
+        """
+        self.running = False
+        self.server.close()
+
+    def frame(self, payload):
+        """Wraps a payload in the framing of the selected protocol """
+        if self.binary:
+            return frame_binary(payload)
+        return s.STX + payload + s.ETX
+
+    def next_scan(self, command):
+        """Encodes the next scan of the replay, with fresh counters
+
+            Args:
+                command (bytes): b'sRA' for a requested scan, b'sSN' for a streamed one
+            Return:
+                The framed telegram
+        """
+        with self.lock:
+            telegram = dict(self.telegrams[self.counter % len(self.telegrams)])
+            # Running counters let clients spot telegrams they missed
+            telegram['Telegram Counter'] = self.counter % 2**16
+            telegram['Scan Counter'] = self.counter % 2**16
+            self.counter += 1
+
+        if self.binary:
+            return self.frame(encode_binary(telegram, command))
+        return self.frame(encode_telegram(telegram, command))
+
+    def accept_loop(self):
+        """Accepts clients until the simulator is stopped """
+        while self.running:
+            try:
+                client, address = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve, args=(client,), daemon=True).start()
+
+    def serve(self, client):
+        """Answers one client's commands until it disconnects
+
+            Args:
+                client (socket): Connected client
+            Return:
+                None
+        """
+        streaming = threading.Event()
+        # Replies and streamed scans share the socket, so only the writer thread
+        # sends and telegrams can never be interleaved
+        outbox = queue.Queue(SEND_BACKLOG)
+        if self.binary:
+            framer = BinaryFramer(client)
+        else:
+            framer = TelegramFramer(client)
+        threading.Thread(target=self.write, args=(client, outbox), daemon=True).start()
+        threading.Thread(target=self.stream, args=(client, streaming, outbox), daemon=True).start()
+
+        try:
+            for frame in framer:
+                tokens = bytes(frame).split(b' ')
+                name = tokens[1] if len(tokens) > 1 else b''
+
+                if tokens[0] == b'sRN' and name == b'LMDscandata':
+                    outbox.put(self.next_scan(b'sRA'))
+                elif tokens[0] == b'sEN' and name == b'LMDscandata' and len(tokens) > 2:
+                    enable = tokens[2] in (b'1', b'\x01')
+                    outbox.put(self.frame(b'sEA LMDscandata ' + tokens[2]))
+                    if enable:
+                        streaming.set()
+                    else:
+                        streaming.clear()
+                elif name in REPLIES:
+                    outbox.put(self.frame(REPLIES[name]))
+                else:
+                    outbox.put(self.frame(b'sFA 1'))
+        except OSError:
+            pass
+        finally:
+            streaming.clear()
+            client.close()
+
+    def write(self, client, outbox):
+        """Sends everything queued for one client, a whole telegram at a time
+
+            Args:
+                client (socket): Connected client
+                outbox (Queue): Framed telegrams to send, in order
+            Return:
+                None
+        """
+        while self.running and client.fileno() != -1:
+            try:
+                telegram = outbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                client.sendall(telegram)
+            except OSError:
+                return
+
+    def stream(self, client, streaming, outbox):
+        """Queues scans at the configured rate while the client has them turned on
+
+            Args:
+                client (socket): Connected client
+                streaming (Event): Set while the client wants scans
+                outbox (Queue): The client's writer queue
+            Return:
+                None
+        """
+        period = 1.0 / (SCAN_RATE * self.speed)
+        deadline = time.time()
+        while self.running and client.fileno() != -1:
+            if not streaming.wait(0.1):
+                deadline = time.time()
+                continue
+
+            telegram = self.next_scan(b'sSN')
+            try:
+                # The sensor does not wait for slow clients, so neither do we
+                outbox.put_nowait(telegram)
+                self.sent += 1
+            except queue.Full:
+                self.dropped += 1
+
+            deadline += period
+            delay = deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+# Function: bench
+# Description: Streams from a simulator for a while and reports how fast the shared
+#              decoder keeps up and how many telegrams went missing
+def bench(port, seconds, binary=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect((HOST, port))
+    if binary:
+        framer = BinaryFramer(sock)
+        sock.send(s.REQUEST_CONT_SCAN_BINARY)
+    else:
+        framer = TelegramFramer(sock)
+        sock.send(s.REQUEST_CONT_SCAN)
+
+    received = 0
+    missed = 0
+    last = None
+    decoding = 0.0
+    start = time.time()
+    while time.time() - start < seconds:
+        frame = framer.read()
+        if not decoder.is_scan(frame):
+            continue
+        before = time.time()
+        if binary:
+            telegram = decoder.decode_binary(frame)
+        else:
+            telegram = decoder.decode_telegram(frame)
+        decoding += time.time() - before
+
+        counter = telegram['Telegram Counter']
+        if last is not None:
+            missed += (counter - last - 1) % 2**16
+        last = counter
+        received += 1
+
+    elapsed = time.time() - start
+    sock.send(s.STOP_CONT_SCAN_BINARY if binary else s.STOP_CONT_SCAN)
+    sock.close()
+
+    print("Received " + str(received) + " telegrams in " + str(round(elapsed, 2)) + " s (" + str(round(received / elapsed, 1)) + " Hz)")
+    print("Missed " + str(missed) + " telegrams (" + str(round(100.0 * missed / max(received + missed, 1), 2)) + "%)")
+    if received > 0:
+        print("Decoding took " + str(round(1e6 * decoding / received, 1)) + " us per telegram")
+    return received, missed
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'serve'
+    source = sys.argv[2] if len(sys.argv) > 2 else 'synthetic'
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+    if source == 'synthetic':
+        telegrams = synthetic_telegrams()
+    else:
+        telegrams = load_log(source)
+    print("Replaying " + str(len(telegrams)) + " scans at " + str(speed) + "x")
+
+    if mode == 'bench':
+        seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 10.0
+        simulator = TiMSimulator(telegrams, port=0, speed=speed)
+        bench(simulator.start(), seconds)
+        simulator.stop()
+    else:
+        port = int(sys.argv[4]) if len(sys.argv) > 4 else s.PORT
+        simulator = TiMSimulator(telegrams, port=port, speed=speed)
+        simulator.start()
+        print("Listening on " + HOST + ":" + str(port))
+        while True:
+            time.sleep(1)
@@ -0,0 +1,60 @@
+# Project Sentinel: Runs the full SENTINEL loop against simulated hardware
+# Harris M
+# March 19, 2020
+
+# Usage:
+#   python sentinel-bench.py [stopAndGo|contbutnot|acquire] [count] [log file|synthetic]
+
+# LIBRARIES - PYTHON ONLY
+import sys
+import time
+
+# EXTERNAL PATHS
+sys.path.append('../RPI/PARSER')
+sys.path.append('../RPI/SLAM')
+
+# EXTERNAL LIBRARIES
+import DEVICES as devices
+import SIMULATOR as simulator
+from SENTINEL import SENTINEL
+
+# Function: bench
+# Description: Runs one acquisition mode of SENTINEL on the simulator, a fake
+#              MPU-6050 and a fake Arduino, and reports how fast it went
+def bench(mode, count, telegrams):
+    lidar = simulator.TiMSimulator(telegrams, port=0)
+    port = lidar.start()
+    # Stop and go moves a step per 'g', the other modes keep the mechanism spinning
+    arduino = devices.FakeArduino(continuous=(mode != 'stopAndGo'))
+    mpu = devices.FakeMPU6050(devices.MotorProfile(arduino))
+    table = devices.FakeTable()
+
+    sentinel = SENTINEL(bus=mpu, serialPortName=arduino.port_name, ip=simulator.HOST, port=port, table=table)
+
+    start = time.time()
+    scans = getattr(sentinel, mode)(count, 'bench')
+    elapsed = time.time() - start
+
+    uploaded = len([item for item in table.items if item['Name'] == 'bench'])
+    print(mode + ": " + str(len(scans)) + " scans in " + str(round(elapsed, 2)) + " s")
+    print("  " + str(round(len(scans) / elapsed, 2)) + " scans/s, " + str(round(1000 * elapsed / max(len(scans), 1), 1)) + " ms per scan")
+    print("  " + str(uploaded) + " scans uploaded, " + str(lidar.dropped) + " telegrams dropped by the simulator")
+
+    sentinel.imu.stop()
+    sentinel.session.close()
+    sentinel.link.close()
+    lidar.stop()
+    arduino.close()
+    return scans
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'stopAndGo'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    source = sys.argv[3] if len(sys.argv) > 3 else 'synthetic'
+
+    if source == 'synthetic':
+        telegrams = simulator.synthetic_telegrams()
+    else:
+        telegrams = simulator.load_log(source)
+
+    bench(mode, count, telegrams)